@@ -10,4 +10,6 @@
   value: {{ .Values.assets.storageRoot | quote }}
 - name: ASSETS_STORAGE_PROTOCOL
   value: {{ .Values.assets.storageProtocol | quote }}
+- name: ASSETS_THUMBNAIL_MAX_SIZE
+  value: {{ .Values.assets.thumbnailMaxSize | quote }}
 {{- end -}}
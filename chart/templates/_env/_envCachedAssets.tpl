@@ -10,4 +10,24 @@
   value: {{ .Values.cachedAssets.storageRoot | quote }}
 - name: CACHED_ASSETS_STORAGE_PROTOCOL
   value: {{ .Values.cachedAssets.storageProtocol | quote }}
+- name: CACHED_ASSETS_MANIFEST_MAX_KEYS
+  value: {{ .Values.cachedAssets.manifestMaxKeys | quote }}
+- name: CACHED_ASSETS_MANIFEST_TTL_SECONDS
+  value: {{ .Values.cachedAssets.manifestTtlSeconds | quote }}
+- name: CACHED_ASSETS_UPLOAD_IN_BACKGROUND
+  value: {{ .Values.cachedAssets.uploadInBackground | quote }}
+- name: CACHED_ASSETS_THUMBNAIL_MAX_SIZE
+  value: {{ .Values.cachedAssets.thumbnailMaxSize | quote }}
+- name: CACHED_ASSETS_ON_DEMAND_URL
+  value: {{ .Values.cachedAssets.onDemandUrl | quote }}
+- name: CACHED_ASSETS_URL_SIGNING_KEY
+  {{- if .Values.secrets.cachedAssetsUrlSigningKey.fromSecret }}
+  valueFrom:
+    secretKeyRef:
+      name: {{ .Values.secrets.cachedAssetsUrlSigningKey.secretName | quote }}
+      key: CACHED_ASSETS_URL_SIGNING_KEY
+      optional: false
+  {{- else }}
+  value: {{ .Values.secrets.cachedAssetsUrlSigningKey.value | quote }}
+  {{- end }}
 {{- end -}}
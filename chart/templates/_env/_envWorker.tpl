@@ -107,6 +107,8 @@
   value: {{ .Values.duckDBIndex.urlTemplate | quote }}
 - name: DUCKDB_INDEX_MAX_DATASET_SIZE_BYTES
   value: {{ .Values.duckDBIndex.maxDatasetSizeBytes | quote }}
+- name: DUCKDB_INDEX_MAX_CONCURRENT_DOWNLOADS
+  value: {{ .Values.duckDBIndex.maxConcurrentDownloads | quote }}
 - name: DUCKDB_INDEX_CACHE_DIRECTORY
   value: {{ .Values.duckDBIndex.cacheDirectory | quote }}
 - name: DUCKDB_INDEX_EXTENSIONS_DIRECTORY
@@ -0,0 +1,9 @@
+# SPDX-License-Identifier: Apache-2.0
+# Copyright 2023 The HuggingFace Authors.
+
+{{- define "volumeMountParquetBlocksCacheRW" -}}
+- mountPath: {{ .Values.rowsIndex.blocksCacheDirectory | quote }}
+  mountPropagation: None
+  name: volume-parquet-blocks-cache
+  readOnly: false
+{{- end -}}
@@ -0,0 +1,8 @@
+# SPDX-License-Identifier: Apache-2.0
+# Copyright 2023 The HuggingFace Authors.
+
+{{- define "volumeParquetBlocksCache" -}}
+- name: volume-parquet-blocks-cache
+  emptyDir:
+    sizeLimit: {{ .Values.rowsIndex.blocksCacheVolumeSizeLimit | quote }}
+{{- end -}}
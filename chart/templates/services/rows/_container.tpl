@@ -30,10 +30,23 @@
     value: {{ .Values.rows.uvicornNumWorkers | quote }}
   - name: API_UVICORN_PORT
     value: {{ .Values.rows.uvicornPort | quote }}
+  - name: ROWS_INDEX_BLOCKS_CACHE_BLOCK_SIZE
+    value: {{ .Values.rowsIndex.blocksCacheBlockSize | quote }}
+  - name: ROWS_INDEX_BLOCKS_CACHE_DIRECTORY
+    value: {{ .Values.rowsIndex.blocksCacheDirectory | quote }}
+  - name: ROWS_INDEX_BLOCKS_CACHE_MAX_BYTES
+    value: {{ .Values.rowsIndex.blocksCacheMaxBytes | quote }}
+  - name: ROWS_INDEX_INDEXES_CACHE_MAX_BYTES
+    value: {{ .Values.rowsIndex.indexesCacheMaxBytes | quote }}
   - name: ROWS_INDEX_MAX_ARROW_DATA_IN_MEMORY
     value: {{ .Values.rowsIndex.maxArrowDataInMemory | quote }}
+  - name: ROWS_INDEX_READAHEAD_MAX_MEMORY_PERCENT
+    value: {{ .Values.rowsIndex.readaheadMaxMemoryPercent | quote }}
+  - name: ROWS_INDEX_ROW_GROUPS_CACHE_MAX_BYTES
+    value: {{ .Values.rowsIndex.rowGroupsCacheMaxBytes | quote }}
   volumeMounts:
   {{ include "volumeMountParquetMetadataRO" . | nindent 2 }}
+  {{ include "volumeMountParquetBlocksCacheRW" . | nindent 2 }}
   securityContext:
     allowPrivilegeEscalation: false
   readinessProbe:
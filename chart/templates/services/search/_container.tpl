@@ -33,6 +33,26 @@
     value: {{ .Values.duckDBIndex.targetRevision | quote }}
   - name: DUCKDB_INDEX_CACHE_DIRECTORY
     value: {{ .Values.duckDBIndex.cacheDirectory | quote }}
+  - name: DUCKDB_INDEX_CACHE_MAX_BYTES
+    value: {{ .Values.search.duckdbIndexCacheMaxBytes | quote }}
+  - name: DUCKDB_INDEX_CONNECTIONS_MAX_OPEN
+    value: {{ .Values.search.duckdbConnectionsMaxOpen | quote }}
+  - name: DUCKDB_INDEX_CONNECTIONS_IDLE_TIMEOUT_SECONDS
+    value: {{ .Values.search.duckdbConnectionsIdleTimeoutSeconds | quote }}
+  - name: DUCKDB_INDEX_NUM_ROWS_TOTAL_CACHE_MAX_ENTRIES
+    value: {{ .Values.search.numRowsTotalCacheMaxEntries | quote }}
+  - name: DUCKDB_INDEX_RANKED_RESULTS_CACHE_MAX_BYTES
+    value: {{ .Values.search.rankedResultsCacheMaxBytes | quote }}
+  - name: DUCKDB_INDEX_MAX_CONCURRENT_QUERIES
+    value: {{ .Values.search.duckdbMaxConcurrentQueries | quote }}
+  - name: DUCKDB_INDEX_QUERIES_QUEUE_TIMEOUT_SECONDS
+    value: {{ .Values.search.duckdbQueriesQueueTimeoutSeconds | quote }}
+  - name: DUCKDB_INDEX_QUERY_TIMEOUT_SECONDS
+    value: {{ .Values.search.duckdbQueryTimeoutSeconds | quote }}
+  - name: DUCKDB_INDEX_CONNECTION_THREADS
+    value: {{ .Values.search.duckdbConnectionThreads | quote }}
+  - name: DUCKDB_INDEX_CONNECTION_MEMORY_LIMIT
+    value: {{ .Values.search.duckdbConnectionMemoryLimit | quote }}
   volumeMounts:
   {{ include "volumeMountDuckDBIndexRW" . | nindent 2 }}
   securityContext:
@@ -0,0 +1,102 @@
+# SPDX-License-Identifier: Apache-2.0
+# Copyright 2023 The HuggingFace Authors.
+
+"""Compare the conversion of a page of rows to JSON, cell by cell and column by column.
+
+    poetry run python benchmarks/to_rows_list.py [--num-rows 100] [--num-columns 10 100 1000] [--repeat 20]
+"""
+
+import argparse
+import tempfile
+import time
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+import anyio
+import pyarrow as pa
+from datasets import ClassLabel, Features, Sequence, Value
+from libcommon.public_assets_storage import PublicAssetsStorage
+from libcommon.storage_client import StorageClient
+from libcommon.utils import orjson_dumps
+
+from libapi.rows_utils import transform_pa_table, transform_rows
+
+
+def get_wide_table(num_rows: int, num_columns: int) -> tuple[pa.Table, Features]:
+    # a mix of the most common features of the text and tabular datasets
+    features_cycle = [
+        Value("string"),
+        Value("int64"),
+        Value("float64"),
+        ClassLabel(names=["negative", "positive"]),
+        Sequence(Value("string")),
+    ]
+    values_cycle: list[Callable[[int], Any]] = [
+        lambda i: f"some text for the row {i}" * 4,
+        lambda i: i,
+        lambda i: i / 3,
+        lambda i: i % 2,
+        lambda i: [f"token_{j}" for j in range(i % 10)],
+    ]
+    features = Features(
+        {f"column_{idx}": features_cycle[idx % len(features_cycle)] for idx in range(num_columns)}
+    )
+    pa_table = pa.table(
+        {
+            f"column_{idx}": [values_cycle[idx % len(values_cycle)](i) for i in range(num_rows)]
+            for idx in range(num_columns)
+        },
+        schema=features.arrow_schema,
+    )
+    return pa_table, features
+
+
+async def benchmark(
+    name: str, to_rows: Callable[[], Awaitable[list[Any]]], repeat: int
+) -> float:
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        orjson_dumps(await to_rows())
+        durations.append(time.perf_counter() - start)
+    best = min(durations)
+    print(f"  {name:<12} {best * 1000:8.2f} ms")
+    return best
+
+
+async def main(num_rows: int, num_columns_list: list[int], repeat: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        public_assets_storage = PublicAssetsStorage(
+            assets_base_url="http://localhost/cached-assets",
+            overwrite=False,
+            storage_client=StorageClient(protocol="file", root=tmp_dir, folder="cached-assets"),
+        )
+        for num_columns in num_columns_list:
+            pa_table, features = get_wide_table(num_rows=num_rows, num_columns=num_columns)
+            kwargs: dict[str, Any] = {
+                "dataset": "dataset",
+                "revision": "revision",
+                "config": "default",
+                "split": "train",
+                "features": features,
+                "public_assets_storage": public_assets_storage,
+                "offset": 0,
+                "row_idx_column": None,
+            }
+            print(f"{num_rows} rows x {num_columns} columns:")
+            per_cell = await benchmark(
+                "per cell", lambda: transform_rows(rows=pa_table.to_pylist(), **kwargs), repeat=repeat
+            )
+            per_column = await benchmark(
+                "per column", lambda: transform_pa_table(pa_table=pa_table, **kwargs), repeat=repeat
+            )
+            print(f"  speedup      {per_cell / per_column:8.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--num-rows", type=int, default=100)
+    parser.add_argument("--num-columns", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    anyio.run(main, args.num_rows, args.num_columns, args.repeat)
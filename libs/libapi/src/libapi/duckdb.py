@@ -1,26 +1,189 @@
 # SPDX-License-Identifier: Apache-2.0
 # Copyright 2023 The HuggingFace Authors.
 
+import fcntl
 import json
 import logging
 import os
 import re
+import shutil
+import sqlite3
+import tempfile
+import time
+from collections.abc import Iterator
+from contextlib import closing, contextmanager
 from hashlib import sha1
 from typing import Optional
 
 import anyio
 from anyio import Path
+from filelock import FileLock, Timeout
 from huggingface_hub import hf_hub_download
 from libcommon.constants import DUCKDB_INDEX_DOWNLOADS_SUBDIRECTORY
 from libcommon.processing_graph import ProcessingGraph
-from libcommon.prometheus import StepProfiler
+from libcommon.prometheus import DISK_CACHE_BYTES_TOTAL, DISK_CACHE_EVENTS_TOTAL, StepProfiler
 from libcommon.simple_cache import CacheEntry
 from libcommon.storage import StrPath, init_dir
 
+from libapi.exceptions import ResponseNotReadyError
 from libapi.utils import get_cache_entry_from_steps
 
 REPO_TYPE = "dataset"
 HUB_DOWNLOAD_CACHE_FOLDER = "cache"
+DOWNLOAD_TMP_FOLDER_PREFIX = ".tmp-"
+# maximum time a request waits for the download of the index file by another request
+DOWNLOAD_LOCK_TIMEOUT_SECONDS = 60
+# outside of the downloads subdirectory, which is cleaned by the clean_directory job
+INDEX_FILES_CACHE_INDEX_FILENAME = "downloads_index.sqlite"
+INDEX_FILES_CACHE_LOCK_FILENAME = "downloads_index.lock"
+# the files accessed more recently are never evicted, since the request that accessed them might not have pinned
+# them yet
+INDEX_FILES_CACHE_MIN_IDLE_SECONDS = 60
+INDEX_FILES_CACHE_SQLITE_TIMEOUT_SECONDS = 30
+
+
+class DuckDBIndexFilesCache:
+    """
+    A manager of the duckdb index files downloaded by the API, bounded by their total size, and shared by all the
+    processes that use the same directory.
+
+    The index of the downloaded files, with their size and last access time, is persisted in a sqlite database in
+    `directory`. When the total size of the files exceeds `max_bytes` after a download, the least recently used files
+    are deleted, except the pinned ones. A file is pinned, with a shared lock on the file, while a request reads it.
+
+    The files deleted by another mean (e.g. by the clean_directory job) are removed from the index on the next
+    eviction, and the files downloaded before the index existed are added to it on their next access.
+
+    Args:
+        directory (StrPath): The directory where the index files are downloaded (the downloads subdirectory is
+          managed).
+        max_bytes (int): The maximum total size of the downloaded index files, in bytes.
+        min_idle_seconds (float, optional): The files accessed more recently than this are never evicted.
+        name (str, optional): The name of the cache, used as a label in the metrics.
+    """
+
+    def __init__(
+        self,
+        directory: StrPath,
+        max_bytes: int,
+        min_idle_seconds: float = INDEX_FILES_CACHE_MIN_IDLE_SECONDS,
+        name: str = "duckdb_index_files",
+    ):
+        self.directory = str(directory)
+        self.max_bytes = max_bytes
+        self.min_idle_seconds = min_idle_seconds
+        self.name = name
+        init_dir(self.directory)
+        with closing(self._connect()) as con, con:
+            con.execute(
+                "CREATE TABLE IF NOT EXISTS index_files (path TEXT PRIMARY KEY, size INTEGER NOT NULL, last_access"
+                " REAL NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        # one connection per call, since the methods are called from several threads
+        return sqlite3.connect(
+            os.path.join(self.directory, INDEX_FILES_CACHE_INDEX_FILENAME),
+            timeout=INDEX_FILES_CACHE_SQLITE_TIMEOUT_SECONDS,
+        )
+
+    def _record_access(self, path: str, size: int) -> None:
+        with closing(self._connect()) as con, con:
+            con.execute(
+                "INSERT OR REPLACE INTO index_files (path, size, last_access) VALUES (?, ?, ?)",
+                (path, size, time.time()),
+            )
+
+    def _report(self, event: str, size: int) -> None:
+        DISK_CACHE_EVENTS_TOTAL.labels(cache=self.name, event=event).inc()
+        DISK_CACHE_BYTES_TOTAL.labels(cache=self.name, event=event).inc(size)
+
+    def get(self, path: str) -> bool:
+        """Return True, and record the access, if the index file has already been downloaded."""
+        try:
+            size = os.stat(path).st_size
+        except FileNotFoundError:
+            DISK_CACHE_EVENTS_TOTAL.labels(cache=self.name, event="miss").inc()
+            return False
+        self._record_access(path=path, size=size)
+        self._report("hit", size)
+        return True
+
+    def add(self, path: str) -> None:
+        """Record a downloaded index file, then evict the least recently used files if needed."""
+        size = os.stat(path).st_size
+        # the miss has already been counted by get()
+        DISK_CACHE_BYTES_TOTAL.labels(cache=self.name, event="miss").inc(size)
+        self._record_access(path=path, size=size)
+        self.evict()
+
+    def add_downloaded_by_other(self, path: str) -> None:
+        """Record an index file downloaded by another process while waiting for its download lock.
+
+        The miss has already been counted by get(), so it is not counted as a hit, but as downloaded_by_other.
+        """
+        size = os.stat(path).st_size
+        self._record_access(path=path, size=size)
+        self._report("downloaded_by_other", size)
+
+    @contextmanager
+    def pin(self, path: str) -> Iterator[None]:
+        """Prevent the eviction of the index file, by any process, while it is used."""
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_SH)
+            yield
+        finally:
+            # also releases the lock
+            os.close(fd)
+
+    def _remove_if_not_pinned(self, path: str) -> bool:
+        """Delete the file if it is not pinned. Return True if the file is not on the disk anymore."""
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except FileNotFoundError:
+            return True
+        try:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False
+            os.remove(path)
+            return True
+        finally:
+            os.close(fd)
+
+    def evict(self) -> None:
+        """Delete the least recently used files, that are not pinned, until the total size is below the maximum size.
+
+        Only one process evicts at a time; the others skip the eviction.
+        """
+        try:
+            with FileLock(os.path.join(self.directory, INDEX_FILES_CACHE_LOCK_FILENAME), timeout=0):
+                with closing(self._connect()) as con:
+                    index_files = con.execute(
+                        "SELECT path, size, last_access FROM index_files ORDER BY last_access"
+                    ).fetchall()
+                total_size = sum(size for _, size, _ in index_files)
+                max_last_access = time.time() - self.min_idle_seconds
+                removed_index_files = []
+                for path, size, last_access in index_files:
+                    if total_size <= self.max_bytes or last_access > max_last_access:
+                        break
+                    exists = os.path.isfile(path)
+                    if not self._remove_if_not_pinned(path):
+                        logging.debug(f"The index file {path} is pinned, skipping its eviction.")
+                        continue
+                    if exists:
+                        logging.info(f"Evicted the index file {path} ({size} bytes).")
+                        self._report("eviction", size)
+                    total_size -= size
+                    removed_index_files.append((path, last_access))
+                with closing(self._connect()) as con, con:
+                    # the files accessed in the meantime have been downloaded again
+                    con.executemany("DELETE FROM index_files WHERE path = ? AND last_access = ?", removed_index_files)
+        except Timeout:
+            logging.debug(f"Another process is evicting index files from {self.directory}, skipping.")
 
 
 async def get_index_file_location_and_download_if_missing(
@@ -33,6 +196,8 @@ async def get_index_file_location_and_download_if_missing(
     url: str,
     target_revision: str,
     hf_token: Optional[str],
+    index_files_cache: Optional[DuckDBIndexFilesCache] = None,
+    download_lock_timeout_seconds: float = DOWNLOAD_LOCK_TIMEOUT_SECONDS,
 ) -> str:
     with StepProfiler(method="get_index_file_location_and_download_if_missing", step="all"):
         index_folder = get_download_folder(duckdb_index_file_directory, dataset, config, split, revision)
@@ -43,10 +208,15 @@ async def get_index_file_location_and_download_if_missing(
         repo_file_location = f"{config}/{split_directory}/{filename}"
         index_file_location = f"{index_folder}/{repo_file_location}"
         index_path = Path(index_file_location)
-        if not await index_path.is_file():
+        is_downloaded = (
+            await index_path.is_file()
+            if index_files_cache is None
+            else await anyio.to_thread.run_sync(index_files_cache.get, index_file_location)
+        )
+        if not is_downloaded:
             with StepProfiler(method="get_index_file_location_and_download_if_missing", step="download index file"):
                 cache_folder = f"{duckdb_index_file_directory}/{HUB_DOWNLOAD_CACHE_FOLDER}"
-                await anyio.to_thread.run_sync(
+                is_downloaded_by_this_request = await anyio.to_thread.run_sync(
                     download_index_file,
                     cache_folder,
                     index_folder,
@@ -54,7 +224,17 @@ async def get_index_file_location_and_download_if_missing(
                     dataset,
                     repo_file_location,
                     hf_token,
+                    download_lock_timeout_seconds,
                 )
+                if index_files_cache is not None:
+                    await anyio.to_thread.run_sync(
+                        (
+                            index_files_cache.add
+                            if is_downloaded_by_this_request
+                            else index_files_cache.add_downloaded_by_other
+                        ),
+                        index_file_location,
+                    )
         # Update its modification time
         await index_path.touch()
         return index_file_location
@@ -74,22 +254,50 @@ def download_index_file(
     dataset: str,
     repo_file_location: str,
     hf_token: Optional[str] = None,
-) -> None:
+    lock_timeout_seconds: float = DOWNLOAD_LOCK_TIMEOUT_SECONDS,
+) -> bool:
+    """Download the index file, only once even if several processes (or pods sharing the directory) need it.
+
+    One process takes the lock on the file, downloads it to a temporary folder and renames it, so that the file is
+    never read while it is partially written. The others wait for the lock, then find the downloaded file.
+
+    Returns:
+        `bool`: True if the file has been downloaded by this call, False if it had been downloaded by another one.
+
+    Raises:
+        [~`libapi.exceptions.ResponseNotReadyError`]: if the file is still being downloaded by another process after
+          `lock_timeout_seconds`.
+    """
     logging.info(f"init_dir {index_folder}")
     init_dir(index_folder)
-
-    # see https://pypi.org/project/hf-transfer/ for more details about how to enable hf_transfer
-    os.environ["HF_HUB_ENABLE_HF_TRANSFER"] = "1"
-    hf_hub_download(
-        repo_type=REPO_TYPE,
-        revision=target_revision,
-        repo_id=dataset,
-        filename=repo_file_location,
-        local_dir=index_folder,
-        local_dir_use_symlinks=False,
-        token=hf_token,
-        cache_dir=cache_folder,
-    )
+    index_file_location = os.path.join(index_folder, repo_file_location)
+    lock_path = os.path.join(index_folder, f".{repo_file_location.replace('/', '--')}.lock")
+    try:
+        with FileLock(lock_path, timeout=lock_timeout_seconds):
+            if os.path.isfile(index_file_location):
+                logging.info(f"{index_file_location} has been downloaded by another request")
+                return False
+            tmp_folder = tempfile.mkdtemp(prefix=DOWNLOAD_TMP_FOLDER_PREFIX, dir=index_folder)
+            try:
+                # see https://pypi.org/project/hf-transfer/ for more details about how to enable hf_transfer
+                os.environ["HF_HUB_ENABLE_HF_TRANSFER"] = "1"
+                hf_hub_download(
+                    repo_type=REPO_TYPE,
+                    revision=target_revision,
+                    repo_id=dataset,
+                    filename=repo_file_location,
+                    local_dir=tmp_folder,
+                    local_dir_use_symlinks=False,
+                    token=hf_token,
+                    cache_dir=cache_folder,
+                )
+                os.makedirs(os.path.dirname(index_file_location), exist_ok=True)
+                os.replace(os.path.join(tmp_folder, repo_file_location), index_file_location)
+            finally:
+                shutil.rmtree(tmp_folder, ignore_errors=True)
+            return True
+    except Timeout as err:
+        raise ResponseNotReadyError("The index file is being downloaded, please retry later.") from err
 
 
 def get_cache_entry_from_duckdb_index_job(
@@ -11,6 +11,7 @@ ApiErrorCode = Literal[
     "AuthCheckHubRequestError",
     "ExternalAuthenticatedError",
     "ExternalUnauthenticatedError",
+    "InvalidAssetSignature",
     "InvalidParameter",
     "JWTExpiredSignature",
     "JWTInvalidClaimRead",
@@ -21,9 +22,11 @@ ApiErrorCode = Literal[
     "JWTMissingRequiredClaim",
     "MissingProcessingStepsError",
     "MissingRequiredParameter",
+    "QueryTimeout",
     "ResponseNotFound",
     "ResponseNotReady",
     "SearchFeatureNotAvailableError",
+    "TooManyQueries",
     "TransformRowsProcessingError",
     "UnexpectedApiError",
 ]
@@ -74,6 +77,13 @@ class ExternalUnauthenticatedError(ApiError):
         super().__init__(message, HTTPStatus.UNAUTHORIZED, "ExternalUnauthenticatedError")
 
 
+class InvalidAssetSignatureError(ApiError):
+    """The signature of the URL of an on-demand asset is invalid."""
+
+    def __init__(self, message: str):
+        super().__init__(message, HTTPStatus.FORBIDDEN, "InvalidAssetSignature")
+
+
 class InvalidParameterError(ApiError):
     """A parameter has an invalid value."""
 
@@ -95,6 +105,13 @@ class MissingRequiredParameterError(ApiError):
         super().__init__(message, HTTPStatus.UNPROCESSABLE_ENTITY, "MissingRequiredParameter")
 
 
+class QueryTimeoutError(ApiError):
+    """The query took too long and has been interrupted."""
+
+    def __init__(self, message: str, cause: Optional[BaseException] = None):
+        super().__init__(message, HTTPStatus.GATEWAY_TIMEOUT, "QueryTimeout", cause, False)
+
+
 class ResponseNotFoundError(ApiError):
     """The response has not been found."""
 
@@ -116,6 +133,13 @@ class SearchFeatureNotAvailableError(ApiError):
         super().__init__(message, HTTPStatus.BAD_REQUEST, "SearchFeatureNotAvailableError", cause, True)
 
 
+class TooManyQueriesError(ApiError):
+    """Too many queries are already running or waiting: the query could not be run in time."""
+
+    def __init__(self, message: str):
+        super().__init__(message, HTTPStatus.SERVICE_UNAVAILABLE, "TooManyQueries")
+
+
 class TooBigContentError(ApiError):
     """The content size in bytes is bigger than the supported value."""
 
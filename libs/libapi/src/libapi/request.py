@@ -1,10 +1,13 @@
 # SPDX-License-Identifier: Apache-2.0
 # Copyright 2023 The HuggingFace Authors.
+from typing import Any, Literal, Optional
+
+from datasets import Features
 from libcommon.utils import MAX_NUM_ROWS_PER_PAGE
 from starlette.requests import Request
 
 from libapi.exceptions import InvalidParameterError, MissingRequiredParameterError
-from libapi.utils import is_non_empty_string
+from libapi.utils import TABLE_FORMAT_MEDIA_TYPES, decode_cursor, is_non_empty_string
 
 
 def get_request_parameter_length(request: Request) -> int:
@@ -29,9 +32,77 @@ def get_request_parameter_offset(request: Request) -> int:
     return offset
 
 
+def get_request_parameter_cursor(request: Request) -> Optional[dict[str, Any]]:
+    """Return the decoded cursor, or None if the parameter is missing (the offset is used)."""
+    cursor = request.query_params.get("cursor")
+    if not cursor:
+        return None
+    try:
+        return decode_cursor(cursor)
+    except ValueError:
+        raise InvalidParameterError("Parameter 'cursor' is invalid")
+
+
 def get_request_parameter(request: Request, parameter_name: str, required: bool = False, default: str = "") -> str:
     parameter = request.query_params.get(parameter_name, default)
     if required:
         if not parameter or not is_non_empty_string(parameter):
             raise MissingRequiredParameterError(f"Parameter '{parameter_name}' is required")
     return parameter
+
+
+def get_request_parameter_columns(request: Request) -> Optional[list[str]]:
+    """Get the list of requested columns, passed as repeated 'columns' parameters (e.g. `columns=a&columns=b`).
+
+    Returns:
+        Optional[list[str]]: The requested columns, without duplicates, or None if all the columns are requested.
+    """
+    columns = [column for column in request.query_params.getlist("columns") if is_non_empty_string(column)]
+    return list(dict.fromkeys(columns)) or None
+
+
+def select_columns(features: Features, columns: Optional[list[str]]) -> Features:
+    """Keep only the requested columns in the features, in the order of the features.
+
+    Args:
+        features (Features): The features of the split.
+        columns (Optional[list[str]]): The requested columns. If None, all the features are returned.
+
+    Raises:
+        InvalidParameterError: if a requested column does not exist in the features.
+
+    Returns:
+        Features: The features of the requested columns.
+    """
+    if columns is None:
+        return features
+    unknown_columns = [column for column in columns if column not in features]
+    if unknown_columns:
+        raise InvalidParameterError(f"Parameter 'columns' contains unknown columns: {', '.join(unknown_columns)}")
+    return Features({column: feature for column, feature in features.items() if column in columns})
+
+
+def get_request_parameter_format(request: Request) -> Literal["json", "arrow", "parquet"]:
+    """Get the format of the response, from the 'format' parameter or else from the 'Accept' header.
+
+    Returns:
+        Literal["json", "arrow", "parquet"]: The format of the response. Defaults to "json".
+
+    Raises:
+        InvalidParameterError: if the 'format' parameter is not one of "json", "arrow" or "parquet".
+    """
+    format = request.query_params.get("format")
+    if format is not None:
+        if format == "json" or format in TABLE_FORMAT_MEDIA_TYPES:
+            return format  # type: ignore
+        raise InvalidParameterError("Parameter 'format' must be one of: json, arrow, parquet")
+    accepted_media_types = [
+        media_type.split(";")[0].strip() for media_type in request.headers.get("accept", "").split(",")
+    ]
+    for media_type in accepted_media_types:
+        if media_type == "application/json":
+            return "json"
+        for table_format, table_media_type in TABLE_FORMAT_MEDIA_TYPES.items():
+            if media_type == table_media_type:
+                return table_format
+    return "json"
@@ -1,8 +1,9 @@
 import logging
+from typing import Optional
 
 import pyarrow as pa
 from datasets import Features
-from libcommon.public_assets_storage import PublicAssetsStorage
+from libcommon.public_assets_storage import AssetsManifest, OnDemandAssets, PublicAssetsStorage
 from libcommon.storage_client import StorageClient
 from libcommon.utils import (
     MAX_NUM_ROWS_PER_PAGE,
@@ -10,6 +11,8 @@ from libcommon.utils import (
 )
 from libcommon.viewer_utils.features import to_features_list
 
+from libapi.exceptions import TransformRowsProcessingError
+from libapi.rows_utils import transform_pa_table_assets
 from libapi.utils import to_rows_list
 
 ROW_IDX_COLUMN = "__hf_index_id"
@@ -29,6 +32,10 @@ async def create_response(
     num_rows_total: int,
     partial: bool,
     use_row_idx_column: bool = False,
+    assets_manifest: Optional[AssetsManifest] = None,
+    upload_assets_in_background: bool = False,
+    thumbnail_max_size: int = 0,
+    on_demand_assets: Optional[OnDemandAssets] = None,
 ) -> PaginatedResponse:
     if set(pa_table.column_names).intersection(set(unsupported_columns)):
         raise RuntimeError(
@@ -39,6 +46,11 @@ async def create_response(
         assets_base_url=cached_assets_base_url,
         overwrite=False,
         storage_client=storage_client,
+        manifest=assets_manifest,
+        concurrent_uploads=True,
+        upload_in_background=upload_assets_in_background,
+        thumbnail_max_size=thumbnail_max_size,
+        on_demand_assets=on_demand_assets,
     )
     return {
         "features": to_features_list(features),
@@ -58,3 +70,71 @@ async def create_response(
         "num_rows_per_page": MAX_NUM_ROWS_PER_PAGE,
         "partial": partial,
     }
+
+
+async def create_table(
+    dataset: str,
+    revision: str,
+    config: str,
+    split: str,
+    cached_assets_base_url: str,
+    storage_client: StorageClient,
+    pa_table: pa.Table,
+    offset: int,
+    features: Features,
+    unsupported_columns: list[str],
+    use_row_idx_column: bool = False,
+    assets_manifest: Optional[AssetsManifest] = None,
+    upload_assets_in_background: bool = False,
+    thumbnail_max_size: int = 0,
+    on_demand_assets: Optional[OnDemandAssets] = None,
+) -> pa.Table:
+    """Create the table returned in the binary formats (Arrow IPC stream and Parquet), instead of the JSON rows.
+
+    The columns are the features, followed by the ROW_IDX_COLUMN column with the index of the rows in the split. As in
+    the JSON rows, the unsupported columns are null, and the images and audio are replaced by the URLs of the assets.
+    """
+    if set(pa_table.column_names).intersection(set(unsupported_columns)):
+        raise RuntimeError(
+            "The pyarrow table contains unsupported columns. They should have been ignored in the row group reader."
+        )
+    logging.debug(f"create table for {dataset=} {config=} {split=}")
+    public_assets_storage = PublicAssetsStorage(
+        assets_base_url=cached_assets_base_url,
+        overwrite=False,
+        storage_client=storage_client,
+        manifest=assets_manifest,
+        concurrent_uploads=True,
+        upload_in_background=upload_assets_in_background,
+        thumbnail_max_size=thumbnail_max_size,
+        on_demand_assets=on_demand_assets,
+    )
+    num_rows = pa_table.num_rows
+    row_idx = (
+        pa_table.column(ROW_IDX_COLUMN)
+        if use_row_idx_column
+        else pa.array(range(offset, offset + num_rows), type=pa.int64())
+    )
+    pa_table = pa.table(
+        {
+            column: pa.nulls(num_rows) if column in unsupported_columns else pa_table.column(column)
+            for column in features
+        }
+        | {ROW_IDX_COLUMN: row_idx}
+    )
+    try:
+        return await transform_pa_table_assets(
+            dataset=dataset,
+            revision=revision,
+            config=config,
+            split=split,
+            pa_table=pa_table,
+            features=features,
+            public_assets_storage=public_assets_storage,
+            offset=offset,
+            row_idx_column=ROW_IDX_COLUMN,
+        )
+    except Exception as err:
+        raise TransformRowsProcessingError(
+            "Server error while post-processing the split rows. Please report the issue."
+        ) from err
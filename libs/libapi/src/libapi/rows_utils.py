@@ -6,39 +6,33 @@ from functools import partial
 from typing import Any, Optional
 
 import anyio
+import pyarrow as pa
 from datasets import Features
 from libcommon.public_assets_storage import PublicAssetsStorage
 from libcommon.utils import Row
-from libcommon.viewer_utils.features import get_cell_value
+from libcommon.viewer_utils.features import (
+    CellContext,
+    FeaturesTransformPlan,
+    get_features_transform_plan,
+)
 from tqdm.contrib.concurrent import thread_map
 
 
 def _transform_row(
     row_idx_and_row: tuple[int, Row],
-    dataset: str,
-    revision: str,
-    config: str,
-    split: str,
     features: Features,
-    public_assets_storage: PublicAssetsStorage,
+    plan: FeaturesTransformPlan,
+    context: CellContext,
     offset: int,
     row_idx_column: Optional[str],
 ) -> Row:
     row_idx, row = row_idx_and_row
-    transformed_row = {
-        featureName: get_cell_value(
-            dataset=dataset,
-            revision=revision,
-            config=config,
-            split=split,
-            row_idx=offset + row_idx if row_idx_column is None else row[row_idx_column],
-            cell=row[featureName] if featureName in row else None,
-            featureName=featureName,
-            fieldType=fieldType,
-            public_assets_storage=public_assets_storage,
-        )
-        for (featureName, fieldType) in features.items()
-    }
+    transformed_row = plan.transform_row(
+        features=features,
+        row=row,
+        row_idx=offset + row_idx if row_idx_column is None else row[row_idx_column],
+        context=context,
+    )
     if row_idx_column and row_idx_column not in transformed_row:
         transformed_row |= {row_idx_column: row[row_idx_column]}
     return transformed_row
@@ -55,27 +49,188 @@ async def transform_rows(
     offset: int,
     row_idx_column: Optional[str],
 ) -> list[Row]:
+    plan = get_features_transform_plan(features)
     fn = partial(
         _transform_row,
-        dataset=dataset,
-        revision=revision,
-        config=config,
-        split=split,
         features=features,
-        public_assets_storage=public_assets_storage,
+        plan=plan,
+        context=CellContext(
+            dataset=dataset,
+            revision=revision,
+            config=config,
+            split=split,
+            public_assets_storage=public_assets_storage,
+        ),
         offset=offset,
         row_idx_column=row_idx_column,
     )
-    if "Audio(" in str(features) or "Image(" in str(features):
+    if plan.has_assets:
         # Use multithreading to parallelize image/audio files uploads.
         # Also multithreading is ok to convert audio data
         # (we use pydub which might spawn one ffmpeg process per conversion, which releases the GIL)
         desc = f"_transform_row for {dataset}"
         _thread_map = partial(thread_map, desc=desc, total=len(rows))
-        return await anyio.to_thread.run_sync(_thread_map, fn, enumerate(rows))
+        transformed_rows: list[Row] = await anyio.to_thread.run_sync(_thread_map, fn, enumerate(rows))
+        if public_assets_storage.concurrent_uploads and not public_assets_storage.upload_in_background:
+            # the URLs are known, but the assets might not be uploaded yet
+            await anyio.to_thread.run_sync(public_assets_storage.wait_for_uploads)
+        return transformed_rows
     else:
 
         def _map(func: Callable[[Any], Any], *iterables: Any) -> list[Row]:
             return list(map(func, *iterables))
 
         return await anyio.to_thread.run_sync(_map, fn, enumerate(rows))
+
+
+def array_to_pylist(pa_array: pa.Array) -> list[Any]:
+    """Convert an arrow array to a list of Python objects, like `pa_array.to_pylist()`, but faster when possible.
+
+    to_pylist() creates an arrow scalar for every value. The strings, and the numbers and booleans without null
+    values, are converted by numpy instead, and the lists and structs are converted from the lists of their children
+    values, which gives the same Python objects.
+    """
+    pa_type = pa_array.type
+    if pa.types.is_string(pa_type) or pa.types.is_large_string(pa_type):
+        return pa_array.to_numpy(zero_copy_only=False).tolist()  # type: ignore
+    if (
+        pa.types.is_integer(pa_type)
+        or (pa.types.is_floating(pa_type) and not pa.types.is_float16(pa_type))
+        or pa.types.is_boolean(pa_type)
+    ) and pa_array.null_count == 0:
+        return pa_array.to_numpy(zero_copy_only=False).tolist()  # type: ignore
+    if pa.types.is_list(pa_type) or pa.types.is_large_list(pa_type):
+        offsets = pa_array.offsets.to_numpy()
+        values = array_to_pylist(pa_array.values.slice(offsets[0], offsets[-1] - offsets[0]))
+        offsets = (offsets - offsets[0]).tolist()
+        return [
+            values[start:stop] if is_valid else None
+            for start, stop, is_valid in zip(offsets, offsets[1:], _get_validity(pa_array))
+        ]
+    if pa.types.is_struct(pa_type):
+        names = [pa_type.field(i).name for i in range(pa_type.num_fields)]
+        # flatten() takes care of the offset of the array, and of its null values
+        fields_values = [array_to_pylist(field_array) for field_array in pa_array.flatten()]
+        return [
+            dict(zip(names, values)) if is_valid else None
+            for values, is_valid in zip(
+                zip(*fields_values) if fields_values else [()] * len(pa_array), _get_validity(pa_array)
+            )
+        ]
+    return pa_array.to_pylist()  # type: ignore
+
+
+def _get_validity(pa_array: pa.Array) -> list[bool]:
+    if pa_array.null_count == 0:
+        return [True] * len(pa_array)
+    return pa_array.is_valid().to_pylist()  # type: ignore
+
+
+def column_to_pylist(pa_column: pa.ChunkedArray) -> list[Any]:
+    return [value for chunk in pa_column.chunks for value in array_to_pylist(chunk)]
+
+
+def _get_columns(pa_table: pa.Table, column_names: list[str]) -> dict[str, list[Any]]:
+    pa_columns = dict(zip(pa_table.column_names, pa_table.columns))
+    return {
+        column: column_to_pylist(pa_columns[column]) if column in pa_columns else [None] * pa_table.num_rows
+        for column in column_names
+    }
+
+
+def _get_rows(columns: dict[str, list[Any]], column_names: list[str], num_rows: int) -> list[Row]:
+    if not column_names:
+        return [{} for _ in range(num_rows)]
+    return [dict(zip(column_names, values)) for values in zip(*(columns[column] for column in column_names))]
+
+
+async def transform_pa_table(
+    dataset: str,
+    revision: str,
+    config: str,
+    split: str,
+    pa_table: pa.Table,
+    features: Features,
+    public_assets_storage: PublicAssetsStorage,
+    offset: int,
+    row_idx_column: Optional[str],
+) -> list[Row]:
+    """Convert the arrow table to rows, and transform the cells that need it (e.g. images and audio).
+
+    The cells of the other features (Value, ClassLabel, Sequence, etc.) are returned as is: these columns are converted
+    to Python one column at a time, which is much faster than one cell at a time on wide tables. Only the columns with
+    images or audio (see FeaturesTransformPlan) go through transform_rows.
+
+    Returns:
+        list[Row]: The rows, with the columns in the order of the features, and the row_idx_column at the end if it
+          is not a feature.
+    """
+    column_names = list(features)
+    if row_idx_column and row_idx_column not in features:
+        column_names.append(row_idx_column)
+    columns = await anyio.to_thread.run_sync(_get_columns, pa_table, column_names)
+    cell_transforms = get_features_transform_plan(features).cell_transforms
+    transformed_features = Features(
+        {column: fieldType for column, fieldType in features.items() if column in cell_transforms}
+    )
+    if transformed_features:
+        transformed_column_names = list(transformed_features)
+        if row_idx_column and row_idx_column not in transformed_features:
+            transformed_column_names.append(row_idx_column)
+        transformed_rows = await transform_rows(
+            dataset=dataset,
+            revision=revision,
+            config=config,
+            split=split,
+            rows=_get_rows(columns, transformed_column_names, pa_table.num_rows),
+            features=transformed_features,
+            public_assets_storage=public_assets_storage,
+            offset=offset,
+            row_idx_column=row_idx_column,
+        )
+        for column in transformed_features:
+            columns[column] = [row[column] for row in transformed_rows]
+    return await anyio.to_thread.run_sync(_get_rows, columns, column_names, pa_table.num_rows)
+
+
+async def transform_pa_table_assets(
+    dataset: str,
+    revision: str,
+    config: str,
+    split: str,
+    pa_table: pa.Table,
+    features: Features,
+    public_assets_storage: PublicAssetsStorage,
+    offset: int,
+    row_idx_column: Optional[str],
+) -> pa.Table:
+    """Replace the cells of the columns with images or audio by the URLs of the assets, as in the JSON rows.
+
+    The other columns are kept as is.
+    """
+    cell_transforms = get_features_transform_plan(features).cell_transforms
+    transformed_features = Features(
+        {
+            column: fieldType
+            for column, fieldType in features.items()
+            if column in cell_transforms and column in pa_table.column_names
+        }
+    )
+    if not transformed_features:
+        return pa_table
+    transformed_rows = await transform_pa_table(
+        dataset=dataset,
+        revision=revision,
+        config=config,
+        split=split,
+        pa_table=pa_table,
+        features=transformed_features,
+        public_assets_storage=public_assets_storage,
+        offset=offset,
+        row_idx_column=row_idx_column,
+    )
+    for column in transformed_features:
+        pa_table = pa_table.set_column(
+            pa_table.column_names.index(column), column, pa.array([row[column] for row in transformed_rows])
+        )
+    return pa_table
@@ -0,0 +1,57 @@
+# SPDX-License-Identifier: Apache-2.0
+# Copyright 2023 The HuggingFace Authors.
+
+import asyncio
+from collections.abc import Awaitable, Callable, Hashable
+from typing import Any, TypeVar
+
+from libcommon.prometheus import SINGLE_FLIGHT_CALLS_TOTAL
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Coalesce the identical computations that run concurrently.
+
+    The first call for a key (the leader) starts the computation, and the calls for the same key that arrive while it
+    is in flight (the followers) await the same result, or the same exception, instead of computing it again. Once the
+    computation is done, the next call for the key starts a new computation: nothing is cached.
+
+    The computation runs in its own task, so that cancelling a request (e.g. the client disconnected) does not cancel
+    it for the other requests.
+
+    The number of leaders and followers is reported to Prometheus, using the endpoint name as a label.
+
+    Example:
+        >>> single_flight = SingleFlight(endpoint="rows")
+        >>> rows = await single_flight.run(key=("dataset", 0, 100), fn=lambda: get_rows("dataset", 0, 100))
+
+    Args:
+        endpoint (str): The name of the endpoint, used as a label in the metrics.
+    """
+
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self._in_flight: dict[Hashable, asyncio.Task[Any]] = {}
+
+    def __len__(self) -> int:
+        return len(self._in_flight)
+
+    async def run(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        task = self._in_flight.get(key)
+        if task is None:
+            SINGLE_FLIGHT_CALLS_TOTAL.labels(endpoint=self.endpoint, role="leader").inc()
+            task = asyncio.ensure_future(fn())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done_task: self._remove(key, done_task))
+        else:
+            SINGLE_FLIGHT_CALLS_TOTAL.labels(endpoint=self.endpoint, role="follower").inc()
+        return await asyncio.shield(task)  # type: ignore
+
+    def _remove(self, key: Hashable, task: "asyncio.Task[Any]") -> None:
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        # if all the callers have been cancelled, nobody retrieved the exception: avoid the asyncio warning
+        if not task.cancelled():
+            task.exception()
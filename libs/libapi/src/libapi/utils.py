@@ -1,12 +1,16 @@
 # SPDX-License-Identifier: Apache-2.0
 # Copyright 2022 The HuggingFace Authors.
 
+import base64
+import io
 import logging
-from collections.abc import Callable, Coroutine
+from collections.abc import Callable, Coroutine, Iterator
 from http import HTTPStatus
-from typing import Any, Optional
+from typing import Any, Literal, Optional
 
+import orjson
 import pyarrow as pa
+import pyarrow.parquet as pq
 from datasets import Features
 from libcommon.dataset import get_dataset_git_revision
 from libcommon.exceptions import CustomError
@@ -20,14 +24,14 @@ from libcommon.simple_cache import (
 )
 from libcommon.utils import Priority, RowItem, orjson_dumps
 from starlette.requests import Request
-from starlette.responses import JSONResponse, Response
+from starlette.responses import JSONResponse, RedirectResponse, Response, StreamingResponse
 
 from libapi.exceptions import (
     ResponseNotFoundError,
     ResponseNotReadyError,
     TransformRowsProcessingError,
 )
-from libapi.rows_utils import transform_rows
+from libapi.rows_utils import transform_pa_table
 
 
 class OrjsonResponse(JSONResponse):
@@ -48,8 +52,7 @@ def get_json_response(
     revision: Optional[str] = None,
     headers: Optional[dict[str, str]] = None,
 ) -> Response:
-    if not headers:
-        headers = {}
+    headers = {} if headers is None else dict(headers)
     headers["Cache-Control"] = f"max-age={max_age}" if max_age > 0 else "no-store"
     if error_code is not None:
         headers["X-Error-Code"] = error_code
@@ -58,9 +61,21 @@ def get_json_response(
     return OrjsonResponse(content=content, status_code=status_code.value, headers=headers)
 
 
+def get_redirect_response(url: str, max_age: int = 0) -> Response:
+    headers = {"Cache-Control": f"max-age={max_age}" if max_age > 0 else "no-store"}
+    return RedirectResponse(url=url, status_code=HTTPStatus.FOUND.value, headers=headers)
+
+
+# the endpoints whose format depends on the 'Accept' header (see get_request_parameter_format) set this header on all
+# their responses, so that the caches (browser, CDN) don't serve a response in the wrong format
+VARY_ACCEPT_HEADERS = {"Vary": "Accept"}
+
 # these headers are exposed to the client (browser)
 EXPOSED_HEADERS = [
     "X-Error-Code",
+    "X-Next-Cursor",
+    "X-Num-Rows-Total",
+    "X-Partial",
     "X-Revision",
 ]
 
@@ -71,25 +86,109 @@ def get_json_ok_response(
     return get_json_response(content=content, max_age=max_age, revision=revision, headers=headers)
 
 
+TableFormat = Literal["arrow", "parquet"]
+TABLE_FORMAT_MEDIA_TYPES: dict[TableFormat, str] = {
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+}
+# maximum number of rows per record batch (arrow) or row group (parquet) in the streamed responses
+TABLE_RESPONSE_BATCH_SIZE = 1_000
+
+
+class _StreamingSink(io.RawIOBase):
+    """A write-only file that keeps the written bytes until they are popped, to stream them in the response.
+
+    Contrary to io.BytesIO, the position is not reset when the bytes are popped: the parquet writer uses it to
+    compute the offsets in the footer.
+    """
+
+    def __init__(self) -> None:
+        self._chunks: list[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b: Any) -> int:
+        data = bytes(b)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def pop(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def iter_table_bytes(pa_table: pa.Table, format: TableFormat) -> Iterator[bytes]:
+    """Serialize the table as an Arrow IPC stream or a Parquet file, one record batch (or row group) at a time."""
+    sink = _StreamingSink()
+    batches = pa_table.to_batches(max_chunksize=TABLE_RESPONSE_BATCH_SIZE)
+    if format == "arrow":
+        with pa.ipc.new_stream(sink, pa_table.schema) as writer:
+            for batch in batches:
+                writer.write_batch(batch)
+                yield sink.pop()
+    else:
+        with pq.ParquetWriter(sink, pa_table.schema) as writer:
+            for batch in batches:
+                writer.write_batch(batch)
+                yield sink.pop()
+    yield sink.pop()
+
+
+def get_table_ok_response(
+    pa_table: pa.Table,
+    format: TableFormat,
+    max_age: int = 0,
+    revision: Optional[str] = None,
+    headers: Optional[dict[str, str]] = None,
+) -> Response:
+    headers = {} if headers is None else dict(headers)
+    headers["Cache-Control"] = f"max-age={max_age}" if max_age > 0 else "no-store"
+    if revision is not None:
+        headers["X-Revision"] = revision
+    headers.update(VARY_ACCEPT_HEADERS)
+    # the content is serialized in a thread by starlette, while it is being sent
+    return StreamingResponse(
+        content=iter_table_bytes(pa_table=pa_table, format=format),
+        media_type=TABLE_FORMAT_MEDIA_TYPES[format],
+        headers=headers,
+    )
+
+
 def get_json_error_response(
     content: Any,
     status_code: HTTPStatus = HTTPStatus.OK,
     max_age: int = 0,
     error_code: Optional[str] = None,
     revision: Optional[str] = None,
+    headers: Optional[dict[str, str]] = None,
 ) -> Response:
     return get_json_response(
-        content=content, status_code=status_code, max_age=max_age, error_code=error_code, revision=revision
+        content=content,
+        status_code=status_code,
+        max_age=max_age,
+        error_code=error_code,
+        revision=revision,
+        headers=headers,
     )
 
 
-def get_json_api_error_response(error: CustomError, max_age: int = 0, revision: Optional[str] = None) -> Response:
+def get_json_api_error_response(
+    error: CustomError, max_age: int = 0, revision: Optional[str] = None, headers: Optional[dict[str, str]] = None
+) -> Response:
     return get_json_error_response(
         content=error.as_response(),
         status_code=error.status_code,
         max_age=max_age,
         error_code=error.code,
         revision=revision,
+        headers=headers,
     )
 
 
@@ -101,6 +200,22 @@ def are_valid_parameters(parameters: list[Any]) -> bool:
     return all(is_non_empty_string(s) for s in parameters)
 
 
+def encode_cursor(cursor: dict[str, Any]) -> str:
+    """Encode the position of the last returned row as an opaque token, to get the next page of results."""
+    return base64.urlsafe_b64encode(orjson.dumps(cursor)).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> dict[str, Any]:
+    """Decode a token created by encode_cursor. Raise ValueError if the token is invalid."""
+    try:
+        cursor = orjson.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+    except (ValueError, TypeError) as err:
+        raise ValueError("Invalid cursor") from err
+    if not isinstance(cursor, dict):
+        raise ValueError("Invalid cursor")
+    return cursor
+
+
 def try_backfill_dataset_then_raise(
     processing_steps: list[ProcessingStep],
     dataset: str,
@@ -216,12 +331,12 @@ async def to_rows_list(
             pa_table = pa_table.add_column(idx, column, pa.array([None] * num_rows))
     # transform the rows, if needed (e.g. save the images or audio to the assets, and return their URL)
     try:
-        transformed_rows = await transform_rows(
+        transformed_rows = await transform_pa_table(
             dataset=dataset,
             revision=revision,
             config=config,
             split=split,
-            rows=pa_table.to_pylist(),
+            pa_table=pa_table,
             features=features,
             public_assets_storage=public_assets_storage,
             offset=offset,
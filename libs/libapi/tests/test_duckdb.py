@@ -1,11 +1,21 @@
+import os
+import time
 from pathlib import Path
-from typing import Optional
+from threading import Event, Thread
+from typing import Any, Optional
 from unittest.mock import patch
 
 import pytest
+from libcommon.constants import DUCKDB_INDEX_DOWNLOADS_SUBDIRECTORY
+from prometheus_client import REGISTRY
 from pytest import TempPathFactory
 
-from libapi.duckdb import get_index_file_location_and_download_if_missing
+from libapi.duckdb import (
+    DuckDBIndexFilesCache,
+    download_index_file,
+    get_index_file_location_and_download_if_missing,
+)
+from libapi.exceptions import ResponseNotReadyError
 
 
 @pytest.mark.parametrize("partial_index", [False, True])
@@ -35,9 +45,11 @@ async def test_get_index_file_location_and_download_if_missing(
         dataset: str,
         repo_file_location: str,
         hf_token: Optional[str] = None,
-    ) -> None:
+        lock_timeout_seconds: float = 0,
+    ) -> bool:
         Path(index_folder, repo_file_location).parent.mkdir(parents=True, exist_ok=True)
         Path(index_folder, repo_file_location).touch()
+        return True
 
     expected_repo_file_location = f"{config}/{split_directory}/{filename}"
     with patch("libapi.duckdb.download_index_file", side_effect=download_index_file) as download_mock:
@@ -56,3 +68,146 @@ async def test_get_index_file_location_and_download_if_missing(
         args, kwargs = download_mock.call_args
         assert not args
         assert kwargs["repo_file_location"] == expected_repo_file_location
+
+
+def create_index_file(directory: Path, name: str, size: int) -> str:
+    path = directory / DUCKDB_INDEX_DOWNLOADS_SUBDIRECTORY / name
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"0" * size)
+    return str(path)
+
+
+def test_duckdb_index_files_cache(tmp_path: Path) -> None:
+    index_files_cache = DuckDBIndexFilesCache(directory=tmp_path, max_bytes=250, min_idle_seconds=0)
+    first = str(tmp_path / DUCKDB_INDEX_DOWNLOADS_SUBDIRECTORY / "first")
+    assert not index_files_cache.get(first)
+    create_index_file(tmp_path, "first", 100)
+    index_files_cache.add(first)
+    second, third = (create_index_file(tmp_path, name, 100) for name in ["second", "third"])
+    index_files_cache.add(second)
+    assert index_files_cache.get(first)
+    # the least recently used file is evicted
+    index_files_cache.add(third)
+    assert Path(first).is_file()
+    assert not Path(second).is_file()
+    assert not index_files_cache.get(second)
+    # the pinned files are not evicted
+    fourth = create_index_file(tmp_path, "fourth", 100)
+    with index_files_cache.pin(first):
+        index_files_cache.add(fourth)
+        assert Path(first).is_file()
+        assert not Path(third).is_file()
+    # the index is persisted
+    index_files_cache = DuckDBIndexFilesCache(directory=tmp_path, max_bytes=150, min_idle_seconds=0)
+    index_files_cache.evict()
+    assert not Path(first).is_file()
+    assert Path(fourth).is_file()
+
+
+def test_duckdb_index_files_cache_recently_accessed(tmp_path: Path) -> None:
+    index_files_cache = DuckDBIndexFilesCache(directory=tmp_path, max_bytes=150)
+    first, second = (create_index_file(tmp_path, name, 100) for name in ["first", "second"])
+    index_files_cache.add(first)
+    index_files_cache.add(second)
+    # the files have just been downloaded, and are not pinned yet by the requests
+    assert Path(first).is_file()
+    assert Path(second).is_file()
+
+
+def test_duckdb_index_files_cache_deleted_file(tmp_path: Path) -> None:
+    index_files_cache = DuckDBIndexFilesCache(directory=tmp_path, max_bytes=150, min_idle_seconds=0)
+    first, second = (create_index_file(tmp_path, name, 100) for name in ["first", "second"])
+    index_files_cache.add(first)
+    # e.g. deleted by the clean_directory job
+    os.remove(first)
+    index_files_cache.add(second)
+    assert Path(second).is_file()
+    assert not index_files_cache.get(first)
+
+
+def get_disk_cache_events_total(event: str) -> float:
+    return REGISTRY.get_sample_value("disk_cache_events_total", {"cache": "duckdb_index_files", "event": event}) or 0
+
+
+def test_duckdb_index_files_cache_downloaded_by_other(tmp_path: Path) -> None:
+    index_files_cache = DuckDBIndexFilesCache(directory=tmp_path, max_bytes=250, min_idle_seconds=0)
+    first = str(tmp_path / DUCKDB_INDEX_DOWNLOADS_SUBDIRECTORY / "first")
+    num_events = {event: get_disk_cache_events_total(event) for event in ["hit", "miss", "downloaded_by_other"]}
+    assert not index_files_cache.get(first)
+    # downloaded by another process while this one was waiting for the download lock
+    create_index_file(tmp_path, "first", 100)
+    index_files_cache.add_downloaded_by_other(first)
+    # the request is only counted once
+    assert get_disk_cache_events_total("miss") == num_events["miss"] + 1
+    assert get_disk_cache_events_total("hit") == num_events["hit"]
+    assert get_disk_cache_events_total("downloaded_by_other") == num_events["downloaded_by_other"] + 1
+
+
+def test_download_index_file_once(tmp_path: Path) -> None:
+    index_folder, repo_file_location = str(tmp_path / "index"), "config/split/index.duckdb"
+
+    def hf_hub_download(filename: str, local_dir: str, **kwargs: Any) -> str:
+        time.sleep(0.1)
+        path = Path(local_dir, filename)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"index")
+        return str(path)
+
+    results: list[bool] = []
+
+    def download() -> None:
+        results.append(
+            download_index_file(
+                cache_folder=str(tmp_path / "cache"),
+                index_folder=index_folder,
+                target_revision="refs/convert/parquet",
+                dataset="dataset",
+                repo_file_location=repo_file_location,
+            )
+        )
+
+    with patch("libapi.duckdb.hf_hub_download", side_effect=hf_hub_download) as download_mock:
+        threads = [Thread(target=download) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        download_mock.assert_called_once()
+    assert sorted(results) == [False, False, False, True]
+    assert Path(index_folder, repo_file_location).read_bytes() == b"index"
+    # the temporary download folder has been removed
+    assert [path.name for path in Path(index_folder).iterdir() if not path.name.endswith(".lock")] == ["config"]
+
+
+def test_download_index_file_lock_timeout(tmp_path: Path) -> None:
+    index_folder, repo_file_location = str(tmp_path / "index"), "config/split/index.duckdb"
+    started, finish = Event(), Event()
+
+    def hf_hub_download(filename: str, local_dir: str, **kwargs: Any) -> str:
+        started.set()
+        finish.wait(timeout=5)
+        path = Path(local_dir, filename)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"index")
+        return str(path)
+
+    def download(lock_timeout_seconds: float) -> bool:
+        return download_index_file(
+            cache_folder=str(tmp_path / "cache"),
+            index_folder=index_folder,
+            target_revision="refs/convert/parquet",
+            dataset="dataset",
+            repo_file_location=repo_file_location,
+            lock_timeout_seconds=lock_timeout_seconds,
+        )
+
+    with patch("libapi.duckdb.hf_hub_download", side_effect=hf_hub_download):
+        thread = Thread(target=download, args=(5,))
+        thread.start()
+        started.wait(timeout=5)
+        # the file is being downloaded by another request
+        with pytest.raises(ResponseNotReadyError):
+            download(0.1)
+        finish.set()
+        thread.join()
+        assert not download(0.1)
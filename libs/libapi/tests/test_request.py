@@ -6,13 +6,17 @@ from contextlib import nullcontext as does_not_raise
 from typing import Optional
 
 import pytest
+from datasets import Features, Image, Value
 from starlette.requests import Request
 
 from libapi.exceptions import InvalidParameterError, MissingRequiredParameterError
 from libapi.request import (
     get_request_parameter,
+    get_request_parameter_columns,
+    get_request_parameter_format,
     get_request_parameter_length,
     get_request_parameter_offset,
+    select_columns,
 )
 
 
@@ -83,3 +87,51 @@ def test_get_request_parameter_offset_raises(
     request = build_request(query_string=f"offset={offset}")
     with pytest.raises(InvalidParameterError, match=expected_error_message):
         _ = get_request_parameter_offset(request)
+
+
+@pytest.mark.parametrize(
+    "query_string, expected_value",
+    [
+        ("", None),
+        ("columns=", None),
+        ("columns=text", ["text"]),
+        ("columns=text&columns=image&columns=text", ["text", "image"]),
+        ("columns=a%2Cb", ["a,b"]),
+    ],
+)
+def test_get_request_parameter_columns(
+    query_string: str, expected_value: Optional[list[str]], build_request: Callable[..., Request]
+) -> None:
+    request = build_request(query_string=query_string)
+    assert get_request_parameter_columns(request) == expected_value
+
+
+def test_select_columns() -> None:
+    features = Features({"text": Value("string"), "image": Image(), "label": Value("int64")})
+    assert select_columns(features, None) == features
+    assert list(select_columns(features, ["label", "text"])) == ["text", "label"]
+    with pytest.raises(InvalidParameterError, match="Parameter 'columns' contains unknown columns: unknown"):
+        select_columns(features, ["text", "unknown"])
+
+
+@pytest.mark.parametrize(
+    "query_string,accept,expected_value",
+    [
+        ("", "", "json"),
+        ("format=arrow", "", "arrow"),
+        ("format=parquet", "application/json", "parquet"),
+        ("format=json", "application/vnd.apache.arrow.stream", "json"),
+        ("", "application/vnd.apache.arrow.stream", "arrow"),
+        ("", "text/html, application/vnd.apache.parquet;q=0.9", "parquet"),
+        ("", "application/json, application/vnd.apache.arrow.stream", "json"),
+        ("", "*/*", "json"),
+    ],
+)
+def test_get_request_parameter_format(query_string: str, accept: str, expected_value: str) -> None:
+    scope = {"type": "http", "query_string": query_string, "headers": [(b"accept", accept.encode())]}
+    assert get_request_parameter_format(Request(scope)) == expected_value
+
+
+def test_get_request_parameter_format_invalid(build_request: Callable[..., Request]) -> None:
+    with pytest.raises(InvalidParameterError):
+        get_request_parameter_format(build_request(query_string="format=csv"))
@@ -3,13 +3,14 @@
 
 from pathlib import Path
 
+import pyarrow as pa
 import pytest
 from datasets import Dataset, Image
 from datasets.table import embed_table_storage
 from libcommon.storage_client import StorageClient
 from PIL import Image as PILImage  # type: ignore
 
-from libapi.response import create_response
+from libapi.response import ROW_IDX_COLUMN, create_response, create_table
 
 pytestmark = pytest.mark.anyio
 
@@ -88,3 +89,31 @@ async def test_create_response_with_image(image_path: str, storage_client: Stora
     assert storage_client.exists(image_key)
     image = PILImage.open(f"{storage_client.get_base_directory()}/{image_key}")
     assert image is not None
+
+
+async def test_create_table(image_path: str, storage_client: StorageClient) -> None:
+    ds = Dataset.from_dict({"text": ["Hello there"], "image": [image_path]}).cast_column("image", Image())
+    ds_image = Dataset(embed_table_storage(ds.data))
+    image_key = "ds_image/--/revision/--/default/train/10/image/image.jpg"
+    pa_table = await create_table(
+        dataset="ds_image",
+        revision="revision",
+        config="default",
+        split="train",
+        cached_assets_base_url="http://localhost/cached-assets",
+        storage_client=storage_client,
+        pa_table=ds_image.data.drop(["text"]),
+        offset=10,
+        features=ds_image.features,
+        unsupported_columns=["text"],
+    )
+    assert pa_table.column_names == ["text", "image", ROW_IDX_COLUMN]
+    assert pa_table.column("text").type == pa.null()
+    assert pa_table.to_pylist() == [
+        {
+            "text": None,
+            "image": {"src": f"http://localhost/cached-assets/{image_key}", "height": 480, "width": 640},
+            ROW_IDX_COLUMN: 10,
+        }
+    ]
+    assert storage_client.exists(image_key)
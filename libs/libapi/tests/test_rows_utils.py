@@ -0,0 +1,106 @@
+# SPDX-License-Identifier: Apache-2.0
+# Copyright 2023 The HuggingFace Authors.
+
+import datetime
+from pathlib import Path
+from typing import Any, Optional
+
+import pyarrow as pa
+import pytest
+from datasets import ClassLabel, Dataset, Features, Image, Sequence, Value
+from datasets.table import embed_table_storage
+from libcommon.public_assets_storage import PublicAssetsStorage
+from libcommon.storage_client import StorageClient
+
+from libapi.rows_utils import (
+    column_to_pylist,
+    transform_pa_table,
+    transform_rows,
+)
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def public_assets_storage(tmp_path: Path) -> PublicAssetsStorage:
+    return PublicAssetsStorage(
+        assets_base_url="http://localhost/cached-assets",
+        overwrite=False,
+        storage_client=StorageClient(protocol="file", root=str(tmp_path), folder="cached-assets"),
+    )
+
+
+@pytest.mark.parametrize(
+    "pa_column",
+    [
+        pa.chunked_array([["a", None], ["b"]]),
+        pa.chunked_array([[1, 2], [3]]),
+        pa.chunked_array([[1, None]]),
+        pa.chunked_array([[1.5, 2.0]]),
+        pa.chunked_array([[True, False]]),
+        pa.chunked_array([[2**63]], type=pa.uint64()),
+        pa.chunked_array([], type=pa.string()),
+        pa.chunked_array([[[1, 2], None, []], [[3]]]),
+        pa.chunked_array([pa.array([[1, 2], [3, None], [4]]).slice(1)]),
+        # a null list backed by non-empty values
+        pa.chunked_array(
+            [
+                pa.ListArray.from_arrays(
+                    pa.array([0, 2, 4, 5]), pa.array([1, 2, 3, 4, 5]), mask=pa.array([False, True, False])
+                )
+            ]
+        ),
+        pa.chunked_array([pa.array([{"a": 1, "b": ["x"]}, None, {"a": None, "b": None}]).slice(1)]),
+        pa.chunked_array(
+            [pa.array([[{"a": 1}], [], None, [{"a": 2}, None]], type=pa.large_list(pa.struct([("a", pa.int8())])))]
+        ),
+        pa.chunked_array([[datetime.datetime(2020, 1, 1), None]]),
+    ],
+)
+def test_column_to_pylist(pa_column: pa.ChunkedArray) -> None:
+    assert column_to_pylist(pa_column) == pa_column.to_pylist()
+
+
+@pytest.mark.parametrize("row_idx_column", [None, "__hf_index_id"])
+async def test_transform_pa_table(
+    image_path: str, public_assets_storage: PublicAssetsStorage, row_idx_column: Optional[str]
+) -> None:
+    data: dict[str, Any] = {
+        "text": ["Hello there", None],
+        "label": [0, 1],
+        "image": [image_path, None],
+        "sequence": [[1, 2], []],
+        "dict": [{"a": "b", "c": [1]}, {"a": None, "c": []}],
+    }
+    features = Features(
+        {
+            "text": Value("string"),
+            "label": ClassLabel(names=["a", "b"]),
+            "image": Image(),
+            "sequence": Sequence(Value("int32")),
+            "dict": {"a": Value("string"), "c": [Value("int32")]},
+        }
+    )
+    ds_features = features.copy()
+    if row_idx_column:
+        data[row_idx_column] = [10, 20]
+        ds_features[row_idx_column] = Value("int64")
+    ds = Dataset.from_dict(data, features=ds_features)
+    pa_table = embed_table_storage(ds.data)
+    kwargs: dict[str, Any] = {
+        "dataset": "ds",
+        "revision": "revision",
+        "config": "default",
+        "split": "train",
+        "features": features,
+        "public_assets_storage": public_assets_storage,
+        "offset": 5,
+        "row_idx_column": row_idx_column,
+    }
+    rows = await transform_pa_table(pa_table=pa_table, **kwargs)
+    # same rows, and same order of the columns, as with the per-cell transformation
+    expected_rows = await transform_rows(rows=pa_table.to_pylist(), **kwargs)
+    assert rows == expected_rows
+    assert [list(row) for row in rows] == [list(row) for row in expected_rows]
+    assert rows[0]["image"]["src"].endswith(f"/{10 if row_idx_column else 5}/image/image.jpg")
+    assert rows[1]["image"] is None
@@ -0,0 +1,81 @@
+# SPDX-License-Identifier: Apache-2.0
+# Copyright 2023 The HuggingFace Authors.
+
+import asyncio
+
+import pytest
+from libcommon.prometheus import REGISTRY
+
+from libapi.single_flight import SingleFlight
+
+pytestmark = pytest.mark.anyio
+
+
+def get_calls(endpoint: str, role: str) -> float:
+    return REGISTRY.get_sample_value("single_flight_calls_total", {"endpoint": endpoint, "role": role}) or 0
+
+
+async def test_single_flight_coalesces_concurrent_calls() -> None:
+    single_flight = SingleFlight(endpoint="test_coalesce")
+    num_computations = 0
+    release = asyncio.Event()
+
+    async def compute() -> list[int]:
+        nonlocal num_computations
+        num_computations += 1
+        await release.wait()
+        return [1, 2, 3]
+
+    tasks = [asyncio.ensure_future(single_flight.run(key="key", fn=compute)) for _ in range(5)]
+    other_task = asyncio.ensure_future(single_flight.run(key="other_key", fn=compute))
+    await asyncio.sleep(0)
+    assert len(single_flight) == 2
+    release.set()
+    results = await asyncio.gather(*tasks, other_task)
+
+    assert results == [[1, 2, 3]] * 6
+    assert results[0] is results[1]
+    assert num_computations == 2
+    assert len(single_flight) == 0
+    assert get_calls("test_coalesce", "leader") == 2
+    assert get_calls("test_coalesce", "follower") == 4
+
+    # the result is not cached: a new call computes again
+    assert await single_flight.run(key="key", fn=compute) == [1, 2, 3]
+    assert num_computations == 3
+
+
+async def test_single_flight_shares_the_exception() -> None:
+    single_flight = SingleFlight(endpoint="test_exception")
+    release = asyncio.Event()
+
+    async def compute() -> int:
+        await release.wait()
+        raise ValueError("error")
+
+    tasks = [asyncio.ensure_future(single_flight.run(key="key", fn=compute)) for _ in range(3)]
+    await asyncio.sleep(0)
+    release.set()
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+
+    assert all(isinstance(result, ValueError) for result in results)
+    assert len(single_flight) == 0
+
+
+async def test_single_flight_cancelling_a_caller_does_not_cancel_the_others() -> None:
+    single_flight = SingleFlight(endpoint="test_cancel")
+    release = asyncio.Event()
+
+    async def compute() -> str:
+        await release.wait()
+        return "done"
+
+    leader = asyncio.ensure_future(single_flight.run(key="key", fn=compute))
+    follower = asyncio.ensure_future(single_flight.run(key="key", fn=compute))
+    await asyncio.sleep(0)
+    leader.cancel()
+    await asyncio.sleep(0)
+    release.set()
+
+    assert await follower == "done"
+    assert leader.cancelled()
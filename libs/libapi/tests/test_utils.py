@@ -0,0 +1,64 @@
+# SPDX-License-Identifier: Apache-2.0
+# Copyright 2023 The HuggingFace Authors.
+
+import io
+from typing import Any
+from unittest.mock import patch
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from libapi.utils import (
+    VARY_ACCEPT_HEADERS,
+    TableFormat,
+    decode_cursor,
+    encode_cursor,
+    get_json_ok_response,
+    get_table_ok_response,
+    iter_table_bytes,
+)
+
+
+@pytest.mark.parametrize("format", ["arrow", "parquet"])
+@pytest.mark.parametrize("num_rows", [0, 10])
+def test_iter_table_bytes(format: TableFormat, num_rows: int) -> None:
+    pa_table = pa.table({"idx": list(range(num_rows)), "text": [str(i) for i in range(num_rows)]})
+    with patch("libapi.utils.TABLE_RESPONSE_BATCH_SIZE", 3):
+        chunks = list(iter_table_bytes(pa_table, format=format))
+    data = b"".join(chunks)
+    if format == "arrow":
+        assert pa.ipc.open_stream(data).read_all().equals(pa_table)
+    else:
+        assert pq.read_table(io.BytesIO(data)).equals(pa_table)
+    # the table is streamed one batch at a time
+    assert len(chunks) >= num_rows // 3
+
+
+@pytest.mark.parametrize("format", ["arrow", "parquet"])
+def test_get_table_ok_response_varies_on_accept(format: TableFormat) -> None:
+    response = get_table_ok_response(pa.table({"idx": [0]}), format=format, headers={"X-Num-Rows-Total": "1"})
+    assert response.headers["Vary"] == "Accept"
+    assert response.headers["X-Num-Rows-Total"] == "1"
+
+
+def test_get_json_ok_response_does_not_modify_the_headers() -> None:
+    response = get_json_ok_response(content={}, max_age=10, headers=VARY_ACCEPT_HEADERS)
+    assert response.headers["Vary"] == "Accept"
+    assert response.headers["Cache-Control"] == "max-age=10"
+    # the shared headers are not modified
+    assert VARY_ACCEPT_HEADERS == {"Vary": "Accept"}
+
+
+@pytest.mark.parametrize("cursor", [{"row_idx": 12}, {"score": 1.25, "row_idx": 0}, {}])
+def test_encode_decode_cursor(cursor: dict[str, Any]) -> None:
+    token = encode_cursor(cursor)
+    # the token can be used in a URL as is
+    assert "=" not in token
+    assert decode_cursor(token) == cursor
+
+
+@pytest.mark.parametrize("token", ["", "not base64!", "bm90IGpzb24", "WzEsMl0"])
+def test_decode_cursor_raises(token: str) -> None:
+    with pytest.raises(ValueError):
+        decode_cursor(token)
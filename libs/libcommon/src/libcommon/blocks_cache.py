@@ -0,0 +1,209 @@
+# SPDX-License-Identifier: Apache-2.0
+# Copyright 2023 The HuggingFace Authors.
+
+import logging
+import os
+from collections.abc import Iterator
+from hashlib import sha1
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+from threading import Lock
+from typing import Any, Optional
+
+from filelock import FileLock, Timeout
+from fsspec.caching import BaseCache, register_cache
+
+from libcommon.prometheus import DISK_CACHE_BYTES_TOTAL
+from libcommon.storage import StrPath
+
+BLOCKS_CACHE_LOCK_FILENAME = ".lock"
+BLOCKS_CACHE_TMP_SUFFIX = ".tmp"
+# fraction of the cache emptied at each eviction, to avoid evicting on every write
+BLOCKS_CACHE_EVICTION_MARGIN = 0.1
+
+
+class DiskBlocksCache:
+    """
+    An on-disk cache of fixed-size blocks of remote files, shared by all the processes of the node.
+
+    The blocks are stored in `directory`, one file per block, under a subdirectory per (revision, url). The blocks
+    are written to a temporary file and then atomically renamed, so that concurrent processes never read a partial
+    block. Reading a block updates its modification time, which is used as the last access time.
+
+    When the size of the blocks written by the process exceeds a fraction of `max_size`, the process takes an
+    exclusive lock on the directory (or skips if another process has it), and deletes the least recently used
+    blocks until the total size is below `max_size`.
+
+    Args:
+        directory (StrPath): The local directory where the blocks are stored.
+        max_size (int): The maximum total size of the blocks in the directory, in bytes.
+        block_size (int): The size of the blocks, in bytes.
+        name (str, optional): The name of the cache, used as a label in the metrics.
+    """
+
+    def __init__(self, directory: StrPath, max_size: int, block_size: int, name: str = "parquet_blocks"):
+        self.directory = Path(directory)
+        self.max_size = max_size
+        self.block_size = block_size
+        self.name = name
+        self._written_since_eviction = 0
+        self._lock = Lock()
+
+    def get_block_path(self, url: str, revision: str, block_idx: int) -> Path:
+        file_key = sha1(f"{revision}\n{url}".encode(), usedforsecurity=False).hexdigest()
+        return self.directory / file_key[:2] / file_key / str(block_idx)
+
+    def get_block(self, url: str, revision: str, block_idx: int, expected_size: int) -> Optional[bytes]:
+        block_path = self.get_block_path(url=url, revision=revision, block_idx=block_idx)
+        try:
+            with open(block_path, "rb") as f:
+                block = f.read()
+            os.utime(block_path)
+        except OSError:
+            # not cached yet, or evicted by another process in the meantime
+            return None
+        if len(block) != expected_size:
+            logging.warning(f"Ignore the corrupted block {block_path}: {len(block)} bytes instead of {expected_size}")
+            return None
+        DISK_CACHE_BYTES_TOTAL.labels(cache=self.name, event="hit").inc(len(block))
+        return block
+
+    def put_block(self, url: str, revision: str, block_idx: int, block: bytes) -> None:
+        DISK_CACHE_BYTES_TOTAL.labels(cache=self.name, event="miss").inc(len(block))
+        block_path = self.get_block_path(url=url, revision=revision, block_idx=block_idx)
+        try:
+            block_path.parent.mkdir(parents=True, exist_ok=True)
+            with NamedTemporaryFile(dir=block_path.parent, suffix=BLOCKS_CACHE_TMP_SUFFIX, delete=False) as f:
+                f.write(block)
+            os.replace(f.name, block_path)
+        except OSError as err:
+            # the cache is an optimization: never fail the query because of it
+            logging.warning(f"Could not write the block {block_path} in the cache: {err}")
+            return
+        with self._lock:
+            self._written_since_eviction += len(block)
+            must_evict = self._written_since_eviction > self.max_size * BLOCKS_CACHE_EVICTION_MARGIN
+            if must_evict:
+                self._written_since_eviction = 0
+        if must_evict:
+            self.evict()
+
+    def _iter_blocks(self) -> Iterator[os.DirEntry[str]]:
+        for prefix_dir in os.scandir(self.directory):
+            if not prefix_dir.is_dir():
+                continue
+            for file_dir in os.scandir(prefix_dir.path):
+                for block_entry in os.scandir(file_dir.path):
+                    if not block_entry.name.endswith(BLOCKS_CACHE_TMP_SUFFIX):
+                        yield block_entry
+
+    def evict(self) -> None:
+        """Delete the least recently used blocks until the total size is below the maximum size.
+
+        Only one process evicts at a time; the others skip the eviction.
+        """
+        try:
+            with FileLock(self.directory / BLOCKS_CACHE_LOCK_FILENAME, timeout=0):
+                blocks = []
+                for block_entry in self._iter_blocks():
+                    try:
+                        stat = block_entry.stat()
+                    except OSError:
+                        continue
+                    blocks.append((stat.st_mtime, stat.st_size, block_entry.path))
+                total_size = sum(size for _, size, _ in blocks)
+                if total_size <= self.max_size:
+                    return
+                target_size = self.max_size * (1 - BLOCKS_CACHE_EVICTION_MARGIN)
+                for _, size, path in sorted(blocks):
+                    if total_size <= target_size:
+                        break
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        continue
+                    total_size -= size
+                    DISK_CACHE_BYTES_TOTAL.labels(cache=self.name, event="eviction").inc(size)
+        except Timeout:
+            logging.debug(f"Another process is evicting blocks from {self.directory}, skipping.")
+
+
+class FsspecDiskBlocksCache(BaseCache):  # type: ignore[misc]
+    """
+    A fsspec file cache that reads the blocks of the file from a DiskBlocksCache, and only fetches the missing ones.
+
+    The contiguous missing blocks are fetched in a single request.
+
+    Pass it to fsspec files with `cache_type=FsspecDiskBlocksCache.name` and
+    `cache_options={"disk_blocks_cache": ..., "url": ..., "revision": ...}`.
+    """
+
+    name = "datasets_server_disk_blocks"
+
+    def __init__(
+        self,
+        blocksize: int,
+        fetcher: Any,
+        size: int,
+        disk_blocks_cache: DiskBlocksCache,
+        url: str,
+        revision: str,
+    ) -> None:
+        super().__init__(blocksize=blocksize, fetcher=fetcher, size=size)
+        # the blocks are aligned on the blocks of the disk cache, whatever the block size of the fsspec file
+        self.blocksize = disk_blocks_cache.block_size
+        self.disk_blocks_cache = disk_blocks_cache
+        self.url = url
+        self.revision = revision
+
+    def _get_block_size(self, block_idx: int) -> int:
+        return min(self.blocksize, self.size - block_idx * self.blocksize)
+
+    def _fetch(self, start: Optional[int], stop: Optional[int]) -> bytes:
+        if start is None:
+            start = 0
+        if stop is None:
+            stop = self.size
+        stop = min(stop, self.size)
+        if start >= self.size or start >= stop:
+            return b""
+        first_block_idx, last_block_idx = start // self.blocksize, (stop - 1) // self.blocksize
+        blocks: dict[int, bytes] = {}
+        missing_blocks_idx: list[int] = []
+        for block_idx in range(first_block_idx, last_block_idx + 1):
+            block = self.disk_blocks_cache.get_block(
+                url=self.url,
+                revision=self.revision,
+                block_idx=block_idx,
+                expected_size=self._get_block_size(block_idx),
+            )
+            if block is None:
+                missing_blocks_idx.append(block_idx)
+            else:
+                blocks[block_idx] = block
+        for run in _get_contiguous_runs(missing_blocks_idx):
+            run_start = run[0] * self.blocksize
+            data = self.fetcher(run_start, min((run[-1] + 1) * self.blocksize, self.size))
+            for block_idx in run:
+                block_start = block_idx * self.blocksize - run_start
+                block = data[block_start : block_start + self.blocksize]  # noqa: E203
+                blocks[block_idx] = block
+                self.disk_blocks_cache.put_block(
+                    url=self.url, revision=self.revision, block_idx=block_idx, block=block
+                )
+        offset = first_block_idx * self.blocksize
+        data = b"".join(blocks[block_idx] for block_idx in range(first_block_idx, last_block_idx + 1))
+        return data[start - offset : stop - offset]  # noqa: E203
+
+
+def _get_contiguous_runs(indices: list[int]) -> list[list[int]]:
+    runs: list[list[int]] = []
+    for idx in indices:
+        if runs and runs[-1][-1] == idx - 1:
+            runs[-1].append(idx)
+        else:
+            runs.append([idx])
+    return runs
+
+
+register_cache(FsspecDiskBlocksCache, clobber=True)
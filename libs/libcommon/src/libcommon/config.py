@@ -46,6 +46,7 @@ ASSETS_BASE_URL = "http://localhost/assets"
 ASSETS_FOLDER_NAME = "assets"
 ASSETS_STORAGE_ROOT = "/storage"
 ASSETS_STORAGE_PROTOCOL = "file"
+ASSETS_THUMBNAIL_MAX_SIZE = 0
 
 
 @dataclass(frozen=True)
@@ -54,6 +55,7 @@ class AssetsConfig:
     folder_name: str = ASSETS_FOLDER_NAME
     storage_protocol: str = ASSETS_STORAGE_PROTOCOL
     storage_root: str = ASSETS_STORAGE_ROOT
+    thumbnail_max_size: int = ASSETS_THUMBNAIL_MAX_SIZE
 
     @classmethod
     def from_env(cls) -> "AssetsConfig":
@@ -64,6 +66,7 @@ class AssetsConfig:
                 folder_name=env.str(name="FOLDER_NAME", default=ASSETS_FOLDER_NAME),
                 storage_protocol=env.str(name="STORAGE_PROTOCOL", default=ASSETS_STORAGE_PROTOCOL),
                 storage_root=env.str(name="STORAGE_ROOT", default=ASSETS_STORAGE_ROOT),
+                thumbnail_max_size=env.int(name="THUMBNAIL_MAX_SIZE", default=ASSETS_THUMBNAIL_MAX_SIZE),
             )
 
 
@@ -93,6 +96,12 @@ CACHED_ASSETS_BASE_URL = "http://localhost/cached-assets"
 CACHED_ASSETS_FOLDER_NAME = "cached-assets"
 CACHED_ASSETS_STORAGE_ROOT = "/storage"
 CACHED_ASSETS_STORAGE_PROTOCOL = "file"
+CACHED_ASSETS_MANIFEST_MAX_KEYS = 100_000
+CACHED_ASSETS_MANIFEST_TTL_SECONDS = 300
+CACHED_ASSETS_UPLOAD_IN_BACKGROUND = False
+CACHED_ASSETS_THUMBNAIL_MAX_SIZE = 0
+CACHED_ASSETS_ON_DEMAND_URL = None
+CACHED_ASSETS_URL_SIGNING_KEY = None
 
 
 @dataclass(frozen=True)
@@ -101,6 +110,12 @@ class CachedAssetsConfig:
     folder_name: str = CACHED_ASSETS_FOLDER_NAME
     storage_protocol: str = CACHED_ASSETS_STORAGE_PROTOCOL
     storage_root: str = CACHED_ASSETS_STORAGE_ROOT
+    manifest_max_keys: int = CACHED_ASSETS_MANIFEST_MAX_KEYS
+    manifest_ttl_seconds: int = CACHED_ASSETS_MANIFEST_TTL_SECONDS
+    upload_in_background: bool = CACHED_ASSETS_UPLOAD_IN_BACKGROUND
+    thumbnail_max_size: int = CACHED_ASSETS_THUMBNAIL_MAX_SIZE
+    on_demand_url: Optional[str] = CACHED_ASSETS_ON_DEMAND_URL
+    url_signing_key: Optional[str] = CACHED_ASSETS_URL_SIGNING_KEY
 
     @classmethod
     def from_env(cls) -> "CachedAssetsConfig":
@@ -111,6 +126,12 @@ class CachedAssetsConfig:
                 folder_name=env.str(name="FOLDER_NAME", default=CACHED_ASSETS_FOLDER_NAME),
                 storage_protocol=env.str(name="STORAGE_PROTOCOL", default=CACHED_ASSETS_STORAGE_PROTOCOL),
                 storage_root=env.str(name="STORAGE_ROOT", default=CACHED_ASSETS_STORAGE_ROOT),
+                manifest_max_keys=env.int(name="MANIFEST_MAX_KEYS", default=CACHED_ASSETS_MANIFEST_MAX_KEYS),
+                manifest_ttl_seconds=env.int(name="MANIFEST_TTL_SECONDS", default=CACHED_ASSETS_MANIFEST_TTL_SECONDS),
+                upload_in_background=env.bool(name="UPLOAD_IN_BACKGROUND", default=CACHED_ASSETS_UPLOAD_IN_BACKGROUND),
+                thumbnail_max_size=env.int(name="THUMBNAIL_MAX_SIZE", default=CACHED_ASSETS_THUMBNAIL_MAX_SIZE),
+                on_demand_url=env.str(name="ON_DEMAND_URL", default=CACHED_ASSETS_ON_DEMAND_URL),
+                url_signing_key=env.str(name="URL_SIGNING_KEY", default=CACHED_ASSETS_URL_SIGNING_KEY),
             )
 
 
@@ -130,21 +151,51 @@ class ParquetMetadataConfig:
             )
 
 
+ROWS_INDEX_BLOCKS_CACHE_BLOCK_SIZE = 1_000_000
+ROWS_INDEX_BLOCKS_CACHE_DIRECTORY = None
+ROWS_INDEX_BLOCKS_CACHE_MAX_BYTES = 10_000_000_000
+ROWS_INDEX_INDEXES_CACHE_MAX_BYTES = 100_000_000
 ROWS_INDEX_MAX_ARROW_DATA_IN_MEMORY = 300_000_000
+ROWS_INDEX_READAHEAD_MAX_MEMORY_PERCENT = 80
+ROWS_INDEX_ROW_GROUPS_CACHE_MAX_BYTES = ROWS_INDEX_MAX_ARROW_DATA_IN_MEMORY
 
 
 @dataclass(frozen=True)
 class RowsIndexConfig:
+    blocks_cache_block_size: int = ROWS_INDEX_BLOCKS_CACHE_BLOCK_SIZE
+    blocks_cache_directory: Optional[str] = ROWS_INDEX_BLOCKS_CACHE_DIRECTORY
+    blocks_cache_max_bytes: int = ROWS_INDEX_BLOCKS_CACHE_MAX_BYTES
+    indexes_cache_max_bytes: int = ROWS_INDEX_INDEXES_CACHE_MAX_BYTES
     max_arrow_data_in_memory: int = ROWS_INDEX_MAX_ARROW_DATA_IN_MEMORY
+    readahead_max_memory_percent: int = ROWS_INDEX_READAHEAD_MAX_MEMORY_PERCENT
+    row_groups_cache_max_bytes: int = ROWS_INDEX_ROW_GROUPS_CACHE_MAX_BYTES
 
     @classmethod
     def from_env(cls) -> "RowsIndexConfig":
         env = Env(expand_vars=True)
         with env.prefixed("ROWS_INDEX_"):
             return cls(
+                blocks_cache_block_size=env.int(
+                    name="BLOCKS_CACHE_BLOCK_SIZE", default=ROWS_INDEX_BLOCKS_CACHE_BLOCK_SIZE
+                ),
+                blocks_cache_directory=env.str(
+                    name="BLOCKS_CACHE_DIRECTORY", default=ROWS_INDEX_BLOCKS_CACHE_DIRECTORY
+                ),
+                blocks_cache_max_bytes=env.int(
+                    name="BLOCKS_CACHE_MAX_BYTES", default=ROWS_INDEX_BLOCKS_CACHE_MAX_BYTES
+                ),
+                indexes_cache_max_bytes=env.int(
+                    name="INDEXES_CACHE_MAX_BYTES", default=ROWS_INDEX_INDEXES_CACHE_MAX_BYTES
+                ),
                 max_arrow_data_in_memory=env.int(
                     name="MAX_ARROW_DATA_IN_MEMORY", default=ROWS_INDEX_MAX_ARROW_DATA_IN_MEMORY
                 ),
+                readahead_max_memory_percent=env.int(
+                    name="READAHEAD_MAX_MEMORY_PERCENT", default=ROWS_INDEX_READAHEAD_MAX_MEMORY_PERCENT
+                ),
+                row_groups_cache_max_bytes=env.int(
+                    name="ROW_GROUPS_CACHE_MAX_BYTES", default=ROWS_INDEX_ROW_GROUPS_CACHE_MAX_BYTES
+                ),
             )
 
 
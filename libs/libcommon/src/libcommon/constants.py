@@ -5,6 +5,7 @@ CACHE_COLLECTION_RESPONSES = "cachedResponsesBlue"
 CACHE_MONGOENGINE_ALIAS = "cache"
 HF_DATASETS_CACHE_APPNAME = "hf_datasets_cache"
 PARQUET_METADATA_CACHE_APPNAME = "datasets_server_parquet_metadata"
+PARQUET_BLOCKS_CACHE_APPNAME = "datasets_server_parquet_blocks"
 DESCRIPTIVE_STATISTICS_CACHE_APPNAME = "datasets_server_descriptive_statistics"
 DUCKDB_INDEX_CACHE_APPNAME = "datasets_server_duckdb_index"
 DUCKDB_INDEX_DOWNLOADS_SUBDIRECTORY = "downloads"
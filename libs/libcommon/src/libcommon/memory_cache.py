@@ -0,0 +1,109 @@
+# SPDX-License-Identifier: Apache-2.0
+# Copyright 2023 The HuggingFace Authors.
+
+import logging
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from threading import Lock
+from typing import Generic, Optional, TypeVar
+
+from libcommon.prometheus import MEMORY_CACHE_EVENTS_TOTAL, MEMORY_CACHE_SIZE_BYTES
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class SizedLRUCache(Generic[K, V]):
+    """
+    A thread-safe in-memory LRU cache, bounded by the total size of its values.
+
+    The size of each value is computed once, when it is inserted, with the `get_size` function. When the total size
+    exceeds `max_size`, the least recently used entries are evicted. A value bigger than `max_size` is never cached.
+
+    The hits, misses, evictions and invalidations are reported to Prometheus, as well as the current total size,
+    using the cache name as a label.
+
+    Example:
+        >>> cache: SizedLRUCache[str, bytes] = SizedLRUCache(name="example", max_size=10, get_size=len)
+        >>> cache.put("a", b"12345")
+        >>> cache.get("a")
+        b'12345'
+
+    Args:
+        name (str): The name of the cache, used as a label in the metrics.
+        max_size (int): The maximum total size of the cached values. If 0 or negative, nothing is cached.
+        get_size (Callable[[V], int], optional): A function that returns the size of a value. Defaults to 1 for all
+          the values, which means that `max_size` is the maximum number of entries.
+    """
+
+    def __init__(self, name: str, max_size: int, get_size: Callable[[V], int] = lambda _: 1):
+        self.name = name
+        self.max_size = max_size
+        self.get_size = get_size
+        self._entries: OrderedDict[K, tuple[V, int]] = OrderedDict()
+        self._size = 0
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: K) -> bool:
+        return key in self._entries
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def get(self, key: K) -> Optional[V]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._report("miss")
+                return None
+            self._entries.move_to_end(key)
+            self._report("hit")
+            return entry[0]
+
+    def put(self, key: K, value: V) -> None:
+        size = self.get_size(value)
+        with self._lock:
+            self._remove(key)
+            if size > self.max_size:
+                logging.debug(f"Value for {key=} is too big ({size}) to be stored in the {self.name} cache.")
+                return
+            self._entries[key] = (value, size)
+            self._size += size
+            while self._size > self.max_size:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._size -= evicted_size
+                self._report("eviction")
+            MEMORY_CACHE_SIZE_BYTES.labels(cache=self.name).set(self._size)
+
+    def invalidate(self, key: K) -> None:
+        with self._lock:
+            if self._remove(key):
+                self._report("invalidation")
+            MEMORY_CACHE_SIZE_BYTES.labels(cache=self.name).set(self._size)
+
+    def invalidate_if(self, predicate: Callable[[K], bool]) -> None:
+        with self._lock:
+            for key in [key for key in self._entries if predicate(key)]:
+                self._remove(key)
+                self._report("invalidation")
+            MEMORY_CACHE_SIZE_BYTES.labels(cache=self.name).set(self._size)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+            MEMORY_CACHE_SIZE_BYTES.labels(cache=self.name).set(self._size)
+
+    def _remove(self, key: K) -> bool:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        self._size -= entry[1]
+        return True
+
+    def _report(self, event: str) -> None:
+        MEMORY_CACHE_EVENTS_TOTAL.labels(cache=self.name, event=event).inc()
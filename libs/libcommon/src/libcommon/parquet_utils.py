@@ -1,9 +1,13 @@
 import asyncio
 import logging
 import os
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field
-from functools import lru_cache
-from typing import Literal, Optional, TypedDict, Union
+from http import HTTPStatus
+from itertools import groupby
+from multiprocessing.pool import ThreadPool
+from threading import BoundedSemaphore, Lock
+from typing import Any, Literal, Optional, TypedDict, Union
 
 import numpy as np
 import pyarrow as pa
@@ -13,11 +17,23 @@ from datasets.features.features import FeatureType
 from datasets.utils.py_utils import size_str
 from fsspec.implementations.http import HTTPFile, HTTPFileSystem
 from huggingface_hub import HfFileSystem
+from psutil import virtual_memory
 from pyarrow.lib import ArrowInvalid
 
+from libcommon.blocks_cache import DiskBlocksCache, FsspecDiskBlocksCache
+from libcommon.config import (
+    ROWS_INDEX_INDEXES_CACHE_MAX_BYTES,
+    ROWS_INDEX_READAHEAD_MAX_MEMORY_PERCENT,
+    ROWS_INDEX_ROW_GROUPS_CACHE_MAX_BYTES,
+)
+from libcommon.memory_cache import SizedLRUCache
 from libcommon.processing_graph import ProcessingGraph
-from libcommon.prometheus import StepProfiler
-from libcommon.simple_cache import get_previous_step_or_raise
+from libcommon.prometheus import ROWS_READAHEAD_EVENTS_TOTAL, StepProfiler
+from libcommon.simple_cache import (
+    CacheEntryDoesNotExistError,
+    get_previous_step_or_raise,
+    get_response_without_content,
+)
 from libcommon.storage import StrPath
 from libcommon.viewer_utils.features import get_supported_unsupported_columns
 
@@ -25,6 +41,21 @@ from libcommon.viewer_utils.features import get_supported_unsupported_columns
 # "-" is not allowed is split names so we use it in the prefix to avoid collisions.
 # We also use this prefix for the DuckDB index file name
 PARTIAL_PREFIX = "partial-"
+# maximum number of parquet files read in parallel, by all the queries of the process
+PARQUET_FILES_READ_MAX_WORKERS = 16
+# the row groups bigger than this are only read up to the last requested row, instead of entirely
+PARTIAL_READ_MIN_ROW_GROUP_BYTES = 10_000_000
+# size of the reads from the remote parquet files, and number of rows decoded at a time, when reading part of a row group
+PARTIAL_READ_BUFFER_SIZE = 1_000_000
+PARTIAL_READ_BATCH_SIZE = 100
+# number of pages prefetched in parallel by the readahead, and number of splits whose last page is remembered
+READAHEAD_MAX_WORKERS = 2
+READAHEAD_MAX_SPLITS = 10_000
+# memory limit and usage of the container: cgroup v2, then cgroup v1
+CGROUP_MEMORY_FILES = [
+    ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory.current"),
+    ("/sys/fs/cgroup/memory/memory.limit_in_bytes", "/sys/fs/cgroup/memory/memory.usage_in_bytes"),
+]
 
 
 class EmptyParquetMetadataError(Exception):
@@ -82,16 +113,150 @@ def parquet_export_is_partial(parquet_file_url: str) -> bool:
     return split_directory_name_for_parquet_export.startswith(PARTIAL_PREFIX)
 
 
+# (revision, parquet file url, row group id, columns)
+RowGroupsCacheKey = tuple[str, str, int, tuple[str, ...]]
+RowGroupsCache = SizedLRUCache[RowGroupsCacheKey, pa.Table]
+
+
+def create_row_groups_cache(max_size: int) -> RowGroupsCache:
+    return SizedLRUCache(name="row_groups", max_size=max_size, get_size=lambda pa_table: pa_table.nbytes)
+
+
 @dataclass
 class RowGroupReader:
     parquet_file: pq.ParquetFile
     group_id: int
+    url: str = ""
+    revision: Optional[str] = None
+    row_groups_cache: Optional[RowGroupsCache] = None
+    # same file, opened without pre-buffering the whole column chunks, to read only part of the row group
+    streaming_parquet_file: Optional[pq.ParquetFile] = None
+    # if set, only the rows in [start, stop) of the row group are read, see read_rows()
+    rows_range: Optional[tuple[int, int]] = None
+
+    @property
+    def num_rows(self) -> int:
+        return self.parquet_file.metadata.row_group(self.group_id).num_rows  # type: ignore
+
+    def get_cache_key(self, columns: list[str]) -> Optional[RowGroupsCacheKey]:
+        if self.row_groups_cache is None or self.revision is None:
+            return None
+        return (self.revision, self.url, self.group_id, tuple(columns))
+
+    def is_cached(self, columns: list[str]) -> bool:
+        key = self.get_cache_key(columns)
+        return key is not None and self.row_groups_cache is not None and key in self.row_groups_cache
 
     def read(self, columns: list[str]) -> pa.Table:
-        return self.parquet_file.read_row_group(i=self.group_id, columns=columns)
+        key = self.get_cache_key(columns)
+        # the decoded row groups are shared between the queries: consecutive pages often fall in the same row group
+        pa_table = None if key is None or self.row_groups_cache is None else self.row_groups_cache.get(key)
+        if pa_table is not None:
+            return pa_table if self.rows_range is None else pa_table.slice(*self.get_slice())
+        if self.rows_range is not None:
+            return self.read_rows(columns)
+        pa_table = self.parquet_file.read_row_group(i=self.group_id, columns=columns)
+        if key is not None and self.row_groups_cache is not None:
+            self.row_groups_cache.put(key, pa_table)
+        return pa_table
+
+    def get_slice(self) -> tuple[int, int]:
+        if self.rows_range is None:
+            return 0, self.num_rows
+        start, stop = self.rows_range
+        return start, stop - start
+
+    def read_rows(self, columns: list[str]) -> pa.Table:
+        """Read the rows in `rows_range` without reading the rest of the row group.
+
+        The data pages are read and decoded one after the other, and the read stops after the last requested row: the
+        following pages are not downloaded. The rows before the requested ones are decoded but not kept in memory.
+        """
+        if self.rows_range is None or self.streaming_parquet_file is None:
+            return self.parquet_file.read_row_group(i=self.group_id, columns=columns).slice(*self.get_slice())
+        start, stop = self.rows_range
+        batches = []
+        batch_start = 0
+        for batch in self.streaming_parquet_file.iter_batches(
+            batch_size=PARTIAL_READ_BATCH_SIZE, row_groups=[self.group_id], columns=columns, use_threads=False
+        ):
+            batch_stop = batch_start + batch.num_rows
+            if batch_stop > start:
+                batches.append(batch.slice(max(start - batch_start, 0), stop - max(start, batch_start)))
+            if batch_stop >= stop:
+                break
+            batch_start = batch_stop
+        return pa.Table.from_batches(batches)
+
+    def read_size(self, columns: Optional[list[str]] = None) -> int:
+        row_group_metadata = self.parquet_file.metadata.row_group(self.group_id)
+        if columns is None:
+            size = row_group_metadata.total_byte_size
+        else:
+            # only count the column chunks of the requested columns (the nested columns have one chunk per leaf)
+            column_chunks_metadata = (row_group_metadata.column(i) for i in range(row_group_metadata.num_columns))
+            size = sum(
+                column_chunk_metadata.total_uncompressed_size
+                for column_chunk_metadata in column_chunks_metadata
+                if any(
+                    column_chunk_metadata.path_in_schema == column
+                    or column_chunk_metadata.path_in_schema.startswith(f"{column}.")
+                    for column in columns
+                )
+            )
+        if self.rows_range is None or self.num_rows == 0:
+            return size  # type: ignore
+        # only the requested rows are kept in memory: estimate their size
+        start, stop = self.rows_range
+        return size * (stop - start) // self.num_rows  # type: ignore
+
+
+_parquet_files_read_executor: Optional[ThreadPoolExecutor] = None
+_parquet_files_read_executor_lock = Lock()
 
-    def read_size(self) -> int:
-        return self.parquet_file.metadata.row_group(self.group_id).total_byte_size  # type: ignore
+
+def _get_parquet_files_read_executor() -> ThreadPoolExecutor:
+    global _parquet_files_read_executor
+    with _parquet_files_read_executor_lock:
+        if _parquet_files_read_executor is None:
+            _parquet_files_read_executor = ThreadPoolExecutor(
+                max_workers=PARQUET_FILES_READ_MAX_WORKERS, thread_name_prefix="parquet_files_read"
+            )
+        return _parquet_files_read_executor
+
+
+def read_row_groups(row_group_readers: list[RowGroupReader], columns: list[str]) -> list[pa.Table]:
+    """Read the row groups, in order.
+
+    The row groups of a parquet file are read one after the other, since they share the same remote file, but the
+    parquet files are read in parallel, so that the latency of the remote reads does not add up.
+
+    Args:
+        row_group_readers (list[RowGroupReader]): The readers of the row groups.
+        columns (list[str]): The columns to read.
+
+    Returns:
+        list[pa.Table]: The row groups, in the same order as the readers.
+    """
+
+    def _read_file_row_groups(file_row_group_readers: list[RowGroupReader]) -> list[pa.Table]:
+        return [row_group_reader.read(columns) for row_group_reader in file_row_group_readers]
+
+    row_group_readers_by_file = [
+        list(file_row_group_readers)
+        for _, file_row_group_readers in groupby(
+            row_group_readers, key=lambda row_group_reader: id(row_group_reader.parquet_file)
+        )
+    ]
+    if len(row_group_readers_by_file) <= 1:
+        return _read_file_row_groups(row_group_readers)
+    # the threads are shared by the queries, instead of being started for every query
+    executor = _get_parquet_files_read_executor()
+    return [
+        pa_table
+        for file_pa_tables in executor.map(_read_file_row_groups, row_group_readers_by_file)
+        for pa_table in file_pa_tables
+    ]
 
 
 @dataclass
@@ -107,8 +272,12 @@ class ParquetIndexWithMetadata:
     hf_token: Optional[str]
     max_arrow_data_in_memory: int
     partial: bool
+    revision: Optional[str] = None
+    row_groups_cache: Optional[RowGroupsCache] = None
+    blocks_cache: Optional[DiskBlocksCache] = None
 
     num_rows_total: int = field(init=False)
+    parquet_files_metadata: dict[str, pq.FileMetaData] = field(init=False, default_factory=dict)
 
     def __post_init__(self) -> None:
         if self.httpfs._session is None:
@@ -117,7 +286,55 @@ class ParquetIndexWithMetadata:
             self.httpfs_session = self.httpfs._session
         self.num_rows_total = sum(self.num_rows)
 
-    def query(self, offset: int, length: int) -> pa.Table:
+    @property
+    def estimated_size(self) -> int:
+        """Estimate the memory used by the index, once all the parquet metadata have been loaded.
+
+        The parsed metadata are roughly the size of the metadata files on disk, which is all we need to compare the
+        indexes between them in the indexes cache.
+
+        Returns:
+            int: The estimated size in bytes.
+        """
+        return sum(os.path.getsize(metadata_path) for metadata_path in self.metadata_paths) + sum(
+            len(url) for url in self.parquet_files_urls
+        )
+
+    def get_parquet_file_metadata(self, metadata_path: str) -> pq.FileMetaData:
+        # the metadata files never change for a given revision: read them once
+        if metadata_path not in self.parquet_files_metadata:
+            self.parquet_files_metadata[metadata_path] = pq.read_metadata(metadata_path)
+        return self.parquet_files_metadata[metadata_path]
+
+    def get_http_file_cache_kwargs(self, url: str) -> dict[str, Any]:
+        # the parquet files never change for a given revision: read their blocks from the local disk when possible
+        if self.blocks_cache is None or self.revision is None:
+            return {"cache_type": None}
+        return {
+            "cache_type": FsspecDiskBlocksCache.name,
+            "cache_options": {"disk_blocks_cache": self.blocks_cache, "url": url, "revision": self.revision},
+        }
+
+    def open_parquet_file(self, url: str, metadata_path: str, size: int, streaming: bool = False) -> pq.ParquetFile:
+        # By default, the column chunks of the row groups are pre-buffered in a few concurrent requests, which is the
+        # fastest way to read entire row groups. To read only the beginning of a row group, they are instead streamed
+        # through buffers of PARTIAL_READ_BUFFER_SIZE bytes.
+        return pq.ParquetFile(
+            HTTPFile(
+                self.httpfs,
+                url,
+                session=self.httpfs_session,
+                size=size,
+                loop=self.httpfs.loop,
+                **self.get_http_file_cache_kwargs(url),
+                **self.httpfs.kwargs,
+            ),
+            metadata=self.get_parquet_file_metadata(metadata_path),
+            pre_buffer=not streaming,
+            buffer_size=PARTIAL_READ_BUFFER_SIZE if streaming else 0,
+        )
+
+    def query(self, offset: int, length: int, columns: Optional[list[str]] = None) -> pa.Table:
         """Query the parquet files
 
         Note that this implementation will always read at least one row group, to get the list of columns and always
@@ -126,6 +343,8 @@ class ParquetIndexWithMetadata:
         Args:
             offset (int): The first row to read.
             length (int): The number of rows to read.
+            columns (Optional[list[str]]): The columns to read, among the supported columns. If None, all the
+              supported columns are read.
 
         Returns:
             pa.Table: The requested rows.
@@ -136,6 +355,11 @@ class ParquetIndexWithMetadata:
         with StepProfiler(
             method="parquet_index_with_metadata.query", step="get the parquet files than contain the requested rows"
         ):
+            columns_to_read = (
+                self.supported_columns
+                if columns is None
+                else [column for column in self.supported_columns if column in columns]
+            )
             parquet_file_offsets = np.cumsum(self.num_rows)
 
             last_row_in_parquet = parquet_file_offsets[-1] - 1
@@ -155,19 +379,7 @@ class ParquetIndexWithMetadata:
             method="parquet_index_with_metadata.query", step="load the remote parquet files using metadata from disk"
         ):
             parquet_files = [
-                pq.ParquetFile(
-                    HTTPFile(
-                        self.httpfs,
-                        url,
-                        session=self.httpfs_session,
-                        size=size,
-                        loop=self.httpfs.loop,
-                        cache_type=None,
-                        **self.httpfs.kwargs,
-                    ),
-                    metadata=pq.read_metadata(metadata_path),
-                    pre_buffer=True,
-                )
+                self.open_parquet_file(url=url, metadata_path=metadata_path, size=size)
                 for url, metadata_path, size in zip(urls, metadata_paths, num_bytes)
             ]
 
@@ -182,15 +394,21 @@ class ParquetIndexWithMetadata:
                 ]
             )
             row_group_readers = [
-                RowGroupReader(parquet_file=parquet_file, group_id=group_id)
-                for parquet_file in parquet_files
+                RowGroupReader(
+                    parquet_file=parquet_file,
+                    group_id=group_id,
+                    url=url,
+                    revision=self.revision,
+                    row_groups_cache=self.row_groups_cache,
+                )
+                for url, parquet_file in zip(urls, parquet_files)
                 for group_id in range(parquet_file.metadata.num_row_groups)
             ]
 
             if len(row_group_offsets) == 0 or row_group_offsets[-1] == 0:  # if the dataset is empty
                 if offset < 0:
                     raise IndexError("Offset must be non-negative")
-                return parquet_files[0].read()
+                return parquet_files[0].read() if columns is None else parquet_files[0].read(columns=columns_to_read)
 
             last_row_in_parquet = row_group_offsets[-1] - 1
             first_row = min(parquet_offset, last_row_in_parquet)
@@ -200,11 +418,39 @@ class ParquetIndexWithMetadata:
                 row_group_offsets, [first_row, last_row], side="right"
             )
 
+        with StepProfiler(
+            method="parquet_index_with_metadata.query", step="only read the requested rows of the big row groups"
+        ):
+            # the row groups in between are entirely requested: only the first and last ones can be read partially
+            for row_group_id in {first_row_group_id, last_row_group_id}:
+                row_group_reader = row_group_readers[row_group_id]
+                row_group_first_row = row_group_offsets[row_group_id - 1] if row_group_id > 0 else 0
+                start = max(parquet_offset - row_group_first_row, 0)
+                stop = min(parquet_offset + length - row_group_first_row, row_group_reader.num_rows)
+                if (
+                    start < stop
+                    and (start > 0 or stop < row_group_reader.num_rows)
+                    and row_group_reader.read_size(columns=None if columns is None else columns_to_read)
+                    > PARTIAL_READ_MIN_ROW_GROUP_BYTES
+                    and not row_group_reader.is_cached(columns_to_read)
+                ):
+                    url_idx = urls.index(row_group_reader.url)
+                    row_group_reader.rows_range = (start, stop)
+                    row_group_reader.streaming_parquet_file = self.open_parquet_file(
+                        url=row_group_reader.url,
+                        metadata_path=metadata_paths[url_idx],
+                        size=num_bytes[url_idx],
+                        streaming=True,
+                    )
+
         with StepProfiler(
             method="parquet_index_with_metadata.row_groups_size_check", step="check if the rows can fit in memory"
         ):
             row_groups_size = sum(
-                [row_group_readers[i].read_size() for i in range(first_row_group_id, last_row_group_id + 1)]
+                [
+                    row_group_readers[i].read_size(columns=None if columns is None else columns_to_read)
+                    for i in range(first_row_group_id, last_row_group_id + 1)
+                ]
             )
             if row_groups_size > self.max_arrow_data_in_memory:
                 raise TooBigRows(
@@ -215,14 +461,15 @@ class ParquetIndexWithMetadata:
         with StepProfiler(method="parquet_index_with_metadata.query", step="read the row groups"):
             try:
                 pa_table = pa.concat_tables(
-                    [
-                        row_group_readers[i].read(self.supported_columns)
-                        for i in range(first_row_group_id, last_row_group_id + 1)
-                    ]
+                    read_row_groups(
+                        row_group_readers[first_row_group_id : last_row_group_id + 1],  # noqa: E203
+                        columns=columns_to_read,
+                    )
                 )
             except ArrowInvalid as err:
                 raise SchemaMismatchError("Parquet files have different schema.", err)
             first_row_in_pa_table = row_group_offsets[first_row_group_id - 1] if first_row_group_id > 0 else 0
+            first_row_in_pa_table += row_group_readers[first_row_group_id].get_slice()[0]
             return pa_table.slice(parquet_offset - first_row_in_pa_table, length)
 
     @staticmethod
@@ -234,6 +481,9 @@ class ParquetIndexWithMetadata:
         hf_token: Optional[str],
         max_arrow_data_in_memory: int,
         unsupported_features: list[FeatureType] = [],
+        revision: Optional[str] = None,
+        row_groups_cache: Optional[RowGroupsCache] = None,
+        blocks_cache: Optional[DiskBlocksCache] = None,
     ) -> "ParquetIndexWithMetadata":
         if not parquet_file_metadata_items:
             raise EmptyParquetMetadataError("No parquet files found.")
@@ -279,6 +529,9 @@ class ParquetIndexWithMetadata:
             hf_token=hf_token,
             max_arrow_data_in_memory=max_arrow_data_in_memory,
             partial=partial,
+            revision=revision,
+            row_groups_cache=row_groups_cache,
+            blocks_cache=blocks_cache,
         )
 
 
@@ -294,17 +547,23 @@ class RowsIndex:
         parquet_metadata_directory: StrPath,
         max_arrow_data_in_memory: int,
         unsupported_features: list[FeatureType] = [],
+        row_groups_cache: Optional[RowGroupsCache] = None,
+        blocks_cache: Optional[DiskBlocksCache] = None,
+        readahead: Optional["Readahead"] = None,
     ):
         self.dataset = dataset
         self.config = config
         self.split = split
         self.processing_graph = processing_graph
         self.httpfs = httpfs
+        self.readahead = readahead
         self.parquet_index = self._init_parquet_index(
             hf_token=hf_token,
             parquet_metadata_directory=parquet_metadata_directory,
             max_arrow_data_in_memory=max_arrow_data_in_memory,
             unsupported_features=unsupported_features,
+            row_groups_cache=row_groups_cache,
+            blocks_cache=blocks_cache,
         )
 
     def _init_parquet_index(
@@ -313,6 +572,8 @@ class RowsIndex:
         parquet_metadata_directory: StrPath,
         max_arrow_data_in_memory: int,
         unsupported_features: list[FeatureType] = [],
+        row_groups_cache: Optional[RowGroupsCache] = None,
+        blocks_cache: Optional[DiskBlocksCache] = None,
     ) -> ParquetIndexWithMetadata:
         with StepProfiler(method="rows_index._init_parquet_index", step="all"):
             # get the list of parquet files
@@ -348,11 +609,12 @@ class RowsIndex:
                 hf_token=hf_token,
                 max_arrow_data_in_memory=max_arrow_data_in_memory,
                 unsupported_features=unsupported_features,
+                revision=self.revision,
+                row_groups_cache=row_groups_cache,
+                blocks_cache=blocks_cache,
             )
 
-    # note that this cache size is global for the class, not per instance
-    @lru_cache(maxsize=1)
-    def query(self, offset: int, length: int) -> pa.Table:
+    def query(self, offset: int, length: int, columns: Optional[list[str]] = None) -> pa.Table:
         """Query the parquet files
 
         Note that this implementation will always read at least one row group, to get the list of columns and always
@@ -361,18 +623,154 @@ class RowsIndex:
         Args:
             offset (int): The first row to read.
             length (int): The number of rows to read.
+            columns (Optional[list[str]]): The columns to read. If None, all the supported columns are read.
 
         Returns:
             pa.Table: The requested rows.
         """
         logging.info(
             f"Query {type(self.parquet_index).__name__} for dataset={self.dataset}, config={self.config},"
-            f" split={self.split}, offset={offset}, length={length}"
+            f" split={self.split}, offset={offset}, length={length}, columns={columns}"
         )
-        return self.parquet_index.query(offset=offset, length=length)
+        pa_table = self.parquet_index.query(offset=offset, length=length, columns=columns)
+        if self.readahead is not None:
+            self.readahead.on_query(rows_index=self, offset=offset, length=length, columns=columns)
+        return pa_table
+
+
+def _read_int_file(path: str) -> Optional[int]:
+    try:
+        with open(path) as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        # the file does not exist, or the value is "max" (no limit)
+        return None
+
+
+def get_memory_used_percent() -> float:
+    """Get the percentage of the memory used by the container.
+
+    The limit and the usage of the memory are read from the cgroup (v2, or v1) of the process, since the memory of the
+    machine can be much larger than the memory limit of the pod. If the cgroup has no memory limit, or cannot be read,
+    the percentage of the memory used on the machine is returned.
+
+    Returns:
+        float: The percentage of the memory used, between 0 and 100.
+    """
+    total = virtual_memory().total
+    for limit_path, usage_path in CGROUP_MEMORY_FILES:
+        limit = _read_int_file(limit_path)
+        usage = _read_int_file(usage_path)
+        # cgroup v1 reports a huge limit when there is no limit
+        if limit is not None and usage is not None and 0 < limit < total:
+            return 100 * usage / limit
+    return virtual_memory().percent
+
+
+# (dataset, config, split, revision)
+ReadaheadKey = tuple[str, str, str, str]
+# (offset, length, columns)
+ReadaheadPage = tuple[int, int, Optional[tuple[str, ...]]]
+
+
+class Readahead:
+    """Prefetch the next page of the splits that are paginated sequentially.
+
+    When a query starts where the previous query of the same split ended (e.g. offset=100 after offset=0 and
+    length=100), the next page of the same length is queried in a background thread. It loads the row groups in the
+    row groups cache (or the blocks of the big row groups in the blocks cache), so that the next page is usually served
+    without any remote read.
+
+    The prefetch is skipped when the memory used by the container exceeds `max_memory_percent`, since the prefetched row
+    groups would evict the ones being used, and when `max_workers` pages are already being prefetched, so that the
+    prefetches never queue up behind each other. The memory is checked again when the prefetch starts. The prefetched
+    pages that are then requested (hit) or not (waste) are reported to Prometheus.
+
+    Args:
+        max_memory_percent (int): The maximum percentage of the memory used by the container to prefetch a page.
+        max_workers (int, optional): The maximum number of pages prefetched in parallel.
+    """
+
+    def __init__(self, max_memory_percent: int, max_workers: int = READAHEAD_MAX_WORKERS):
+        self.max_memory_percent = max_memory_percent
+        self.max_workers = max_workers
+        # the end of the last page requested, and the prefetched page, of the most recently queried splits
+        self.last_page_ends: SizedLRUCache[ReadaheadKey, int] = SizedLRUCache(
+            name="readahead_last_page_ends", max_size=READAHEAD_MAX_SPLITS
+        )
+        self.prefetched_pages: SizedLRUCache[ReadaheadKey, ReadaheadPage] = SizedLRUCache(
+            name="readahead_prefetched_pages", max_size=READAHEAD_MAX_SPLITS
+        )
+        self._pool: Optional[ThreadPool] = None
+        self._in_progress: set[ReadaheadKey] = set()
+        self._lock = Lock()
+        self._workers = BoundedSemaphore(max_workers)
+
+    def on_query(self, rows_index: RowsIndex, offset: int, length: int, columns: Optional[list[str]]) -> None:
+        key = (rows_index.dataset, rows_index.config, rows_index.split, rows_index.revision)
+        page = (offset, length, None if columns is None else tuple(columns))
+        prefetched_page = self.prefetched_pages.get(key)
+        if prefetched_page is not None:
+            self.prefetched_pages.invalidate(key)
+            ROWS_READAHEAD_EVENTS_TOTAL.labels(event="hit" if prefetched_page == page else "waste").inc()
+        previous_page_end = self.last_page_ends.get(key)
+        self.last_page_ends.put(key, offset + length)
+        next_offset = offset + length
+        if previous_page_end != offset or length <= 0 or next_offset >= rows_index.parquet_index.num_rows_total:
+            return
+        if get_memory_used_percent() > self.max_memory_percent:
+            ROWS_READAHEAD_EVENTS_TOTAL.labels(event="skip").inc()
+            return
+        with self._lock:
+            if key in self._in_progress:
+                return
+            # never wait for a worker: the pool queue is unbounded, and a late prefetch is useless
+            if not self._workers.acquire(blocking=False):
+                ROWS_READAHEAD_EVENTS_TOTAL.labels(event="busy").inc()
+                return
+            self._in_progress.add(key)
+            if self._pool is None:
+                self._pool = ThreadPool(self.max_workers)
+        self.prefetched_pages.put(key, (next_offset, length, page[2]))
+        self._pool.apply_async(self._prefetch, (rows_index, key, next_offset, length, columns))
+
+    def _prefetch(
+        self, rows_index: RowsIndex, key: ReadaheadKey, offset: int, length: int, columns: Optional[list[str]]
+    ) -> None:
+        try:
+            # the memory may have grown since the prefetch was requested
+            if get_memory_used_percent() > self.max_memory_percent:
+                self.prefetched_pages.invalidate(key)
+                ROWS_READAHEAD_EVENTS_TOTAL.labels(event="skip").inc()
+                return
+            ROWS_READAHEAD_EVENTS_TOTAL.labels(event="prefetch").inc()
+            with StepProfiler(method="readahead.prefetch", step="all"):
+                rows_index.parquet_index.query(offset=offset, length=length, columns=columns)
+        except Exception as err:
+            # the prefetch is an optimization: the error, if any, will be raised again by the real query
+            logging.debug(f"Could not prefetch the page {offset=} {length=} of {key}: {err}")
+        finally:
+            with self._lock:
+                self._in_progress.discard(key)
+                self._workers.release()
 
 
 class Indexer:
+    """Build the rows indexes of the splits, and keep the most recently used ones in memory.
+
+    The indexes are cached by (dataset, config, split, revision), and evicted when their total estimated size exceeds
+    `indexes_cache_max_bytes`. When the dataset revision changes, the indexes of the previous revision are invalidated.
+
+    The decoded row groups read by the queries are cached by (revision, parquet file url, row group id, columns), and
+    evicted when their total size exceeds `row_groups_cache_max_bytes`.
+
+    If `blocks_cache` is set, the blocks of the remote parquet files are read through this on-disk cache, shared by all
+    the processes of the node.
+
+    If `readahead_max_memory_percent` is positive, the next page of the splits that are paginated sequentially is
+    prefetched in the background, as long as the memory used by the container is below this percentage. See Readahead.
+    """
+
     def __init__(
         self,
         processing_graph: ProcessingGraph,
@@ -382,6 +780,10 @@ class Indexer:
         unsupported_features: list[FeatureType] = [],
         all_columns_supported_datasets_allow_list: Union[Literal["all"], list[str]] = "all",
         hf_token: Optional[str] = None,
+        indexes_cache_max_bytes: int = ROWS_INDEX_INDEXES_CACHE_MAX_BYTES,
+        row_groups_cache_max_bytes: int = ROWS_INDEX_ROW_GROUPS_CACHE_MAX_BYTES,
+        blocks_cache: Optional[DiskBlocksCache] = None,
+        readahead_max_memory_percent: int = ROWS_INDEX_READAHEAD_MAX_MEMORY_PERCENT,
     ):
         self.processing_graph = processing_graph
         self.parquet_metadata_directory = parquet_metadata_directory
@@ -390,13 +792,60 @@ class Indexer:
         self.max_arrow_data_in_memory = max_arrow_data_in_memory
         self.unsupported_features = unsupported_features
         self.all_columns_supported_datasets_allow_list = all_columns_supported_datasets_allow_list
+        self.rows_indexes: SizedLRUCache[tuple[str, str, str, str], RowsIndex] = SizedLRUCache(
+            name="rows_index",
+            max_size=indexes_cache_max_bytes,
+            get_size=lambda rows_index: rows_index.parquet_index.estimated_size,
+        )
+        # shared by all the indexes, so that the memory used by the decoded row groups is bounded
+        self.row_groups_cache = create_row_groups_cache(max_size=row_groups_cache_max_bytes)
+        self.blocks_cache = blocks_cache
+        self.readahead = (
+            Readahead(max_memory_percent=readahead_max_memory_percent) if readahead_max_memory_percent > 0 else None
+        )
+
+    def get_revision(self, dataset: str, config: str) -> Optional[str]:
+        """Get the dataset revision of the parquet metadata, without loading the content of the cache entry.
+
+        Returns:
+            Optional[str]: The revision, or None if no successful parquet metadata response exists. In that case,
+              building the index will raise the appropriate error.
+        """
+        for processing_step in self.processing_graph.get_config_parquet_metadata_processing_steps():
+            try:
+                response = get_response_without_content(
+                    kind=processing_step.cache_kind, dataset=dataset, config=config, split=None
+                )
+            except CacheEntryDoesNotExistError:
+                continue
+            if response["http_status"] == HTTPStatus.OK:
+                return response["dataset_git_revision"]
+        return None
 
-    @lru_cache(maxsize=1)
     def get_rows_index(
         self,
         dataset: str,
         config: str,
         split: str,
+    ) -> RowsIndex:
+        revision = self.get_revision(dataset=dataset, config=config)
+        if revision is not None:
+            rows_index = self.rows_indexes.get((dataset, config, split, revision))
+            if rows_index is not None:
+                return rows_index
+        rows_index = self._create_rows_index(dataset=dataset, config=config, split=split)
+        # drop the indexes of the previous revisions of the split, they will never be used again
+        self.rows_indexes.invalidate_if(
+            lambda key: key[:3] == (dataset, config, split) and key[3] != rows_index.revision
+        )
+        self.rows_indexes.put((dataset, config, split, rows_index.revision), rows_index)
+        return rows_index
+
+    def _create_rows_index(
+        self,
+        dataset: str,
+        config: str,
+        split: str,
     ) -> RowsIndex:
         filter_features = (
             self.all_columns_supported_datasets_allow_list != "all"
@@ -413,4 +862,7 @@ class Indexer:
             parquet_metadata_directory=self.parquet_metadata_directory,
             max_arrow_data_in_memory=self.max_arrow_data_in_memory,
             unsupported_features=unsupported_features,
+            row_groups_cache=self.row_groups_cache,
+            blocks_cache=self.blocks_cache,
+            readahead=self.readahead,
         )
@@ -9,6 +9,7 @@ from typing import Any, Optional, TypeVar
 from prometheus_client import (
     REGISTRY,
     CollectorRegistry,
+    Counter,
     Gauge,
     Histogram,
     generate_latest,
@@ -75,11 +76,71 @@ PARQUET_METADATA_DISK_USAGE = Gauge(
     labelnames=["type"],
     multiprocess_mode="liveall",
 )
+AUDIO_TRANSCODING_QUEUE_SIZE = Gauge(
+    name="audio_transcoding_queue_size",
+    documentation="Number of audio files waiting to be, or being, converted by the pool of processes",
+    multiprocess_mode="livesum",
+)
+DUCKDB_CONNECTIONS_OPEN = Gauge(
+    name="duckdb_connections_open",
+    documentation="Number of connections to the duckdb index files open by the pools of connections (/search)",
+    multiprocess_mode="livesum",
+)
+DUCKDB_QUERIES_WAIT_TIME = Histogram(
+    "duckdb_queries_wait_time_seconds",
+    "Histogram of the time spent by the duckdb queries waiting to be run, per method (in seconds) (/search)",
+    ["method"],
+)
+DUCKDB_QUERIES_PROCESSING_TIME = Histogram(
+    "duckdb_queries_processing_time_seconds",
+    "Histogram of the processing time of the duckdb queries, once admitted, per method (in seconds) (/search)",
+    ["method"],
+)
+DUCKDB_QUERIES_TOTAL = Counter(
+    "duckdb_queries_total",
+    "Number of duckdb queries run (ok, error), interrupted after the timeout (timeout) or not admitted before the"
+    " deadline (rejected), per method (/search)",
+    ["method", "status"],
+)
 METHOD_STEPS_PROCESSING_TIME = Histogram(
     "method_steps_processing_time_seconds",
     "Histogram of the processing time of specific steps in methods for a given context (in seconds)",
     ["method", "step", "context"],
 )
+MEMORY_CACHE_EVENTS_TOTAL = Counter(
+    "memory_cache_events_total",
+    "Number of events (hit, miss, eviction, invalidation) in the in-memory caches of the services",
+    ["cache", "event"],
+)
+MEMORY_CACHE_SIZE_BYTES = Gauge(
+    name="memory_cache_size_bytes",
+    documentation="Total size of the values stored in the in-memory caches of the services",
+    labelnames=["cache"],
+    multiprocess_mode="liveall",
+)
+DISK_CACHE_BYTES_TOTAL = Counter(
+    "disk_cache_bytes_total",
+    "Number of bytes read from (hit), fetched into (miss), fetched by another process while waiting"
+    " (downloaded_by_other) or evicted from (eviction) the on-disk caches",
+    ["cache", "event"],
+)
+DISK_CACHE_EVENTS_TOTAL = Counter(
+    "disk_cache_events_total",
+    "Number of files read from (hit), fetched into (miss), fetched by another process while waiting"
+    " (downloaded_by_other) or evicted from (eviction) the on-disk caches",
+    ["cache", "event"],
+)
+ROWS_READAHEAD_EVENTS_TOTAL = Counter(
+    "rows_readahead_events_total",
+    "Number of pages prefetched (prefetch), then requested (hit) or not (waste), or not prefetched because of the"
+    " memory pressure (skip) or because all the workers are busy (busy), by the /rows readahead",
+    ["event"],
+)
+SINGLE_FLIGHT_CALLS_TOTAL = Counter(
+    "single_flight_calls_total",
+    "Number of computations run (leader) or shared with an identical in-flight computation (follower), per endpoint",
+    ["endpoint", "role"],
+)
 
 
 def update_queue_jobs_total() -> None:
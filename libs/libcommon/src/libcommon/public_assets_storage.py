@@ -1,12 +1,123 @@
 # SPDX-License-Identifier: Apache-2.0
 # Copyright 2023 The HuggingFace Authors.
-from dataclasses import dataclass
+import hashlib
+import hmac
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Optional
 
+from libcommon.memory_cache import SizedLRUCache
 from libcommon.storage_client import StorageClient
 
 
+class AssetsManifest:
+    """
+    An in-memory index of the assets that already exist in the storage, per split directory.
+
+    Checking if an asset exists costs one request to the storage (a HEAD request on S3) per asset. Instead, the keys of
+    all the assets of a split directory are listed at once, the first time an asset of the split is checked, and kept
+    in memory for `ttl_seconds`. The assets created in the meantime by this process are added to the manifest.
+
+    An asset missing from the manifest might have been created by another process since the listing, so its
+    existence is still checked in the storage (and added to the manifest if found).
+
+    The manifests of the least recently used splits are evicted when the total number of keys exceeds `max_keys`. The
+    split directories that contain more than `max_keys` assets are not kept in memory: they are only remembered as too
+    big (until `ttl_seconds`), and their assets are checked one by one in the storage, without listing them again.
+
+    Args:
+        storage_client (StorageClient): The storage client of the assets.
+        max_keys (int): The maximum total number of asset keys kept in memory.
+        ttl_seconds (int): The number of seconds after which the split directory is listed again, so that the deleted
+          assets are eventually removed from the manifest.
+    """
+
+    def __init__(self, storage_client: StorageClient, max_keys: int, ttl_seconds: int):
+        self.storage_client = storage_client
+        self.max_keys = max_keys
+        self.ttl_seconds = ttl_seconds
+        # the keys are None if the split directory has too many assets to be kept in memory
+        self._manifests: SizedLRUCache[str, tuple[float, Optional[set[str]]]] = SizedLRUCache(
+            name="assets_manifest",
+            max_size=max_keys,
+            get_size=lambda manifest: (0 if manifest[1] is None else len(manifest[1])) + 1,
+        )
+
+    def exists(self, split_dir_path: str, object_key: str) -> bool:
+        manifest = self._manifests.get(split_dir_path)
+        if manifest is None or time.monotonic() - manifest[0] > self.ttl_seconds:
+            object_keys = self.storage_client.list_object_keys(split_dir_path, max_keys=self.max_keys - 1)
+            manifest = (time.monotonic(), None if object_keys is None else set(object_keys))
+            self._manifests.put(split_dir_path, manifest)
+        if manifest[1] is not None and object_key in manifest[1]:
+            return True
+        if self.storage_client.exists(object_key=object_key):
+            self.add(split_dir_path, object_key)
+            return True
+        return False
+
+    def add(self, split_dir_path: str, object_key: str) -> None:
+        manifest = self._manifests.get(split_dir_path)
+        if manifest is not None and manifest[1] is not None:
+            manifest[1].add(object_key)
+            # put it again to update the size of the manifest
+            self._manifests.put(split_dir_path, manifest)
+
+
+@dataclass(frozen=True)
+class OnDemandAssets:
+    """
+    The endpoint that creates the assets when they are fetched for the first time, instead of when the rows are
+    returned.
+
+    The URLs of the assets point to the endpoint, and are signed with `signing_key` (HMAC-SHA256 of the object key) so
+    that the endpoint only creates the assets that have been returned by the API.
+
+    Args:
+        url (str): The URL of the endpoint, e.g. https://datasets-server.huggingface.co/on-demand-asset.
+        signing_key (str): The secret key used to sign the URLs of the assets.
+    """
+
+    url: str
+    signing_key: str
+
+    def sign(self, object_key: str) -> str:
+        return hmac.new(self.signing_key.encode(), object_key.encode(), hashlib.sha256).hexdigest()
+
+    def verify(self, object_key: str, signature: str) -> bool:
+        return hmac.compare_digest(self.sign(object_key), signature)
+
+
 @dataclass
 class PublicAssetsStorage:
+    """
+    Where and how the assets (images and audio files) are stored.
+
+    By default, every asset is written synchronously. With `concurrent_uploads`, the assets are uploaded in the
+    background (see `StorageClient.upload`), and the caller must call `wait_for_uploads` once all the assets have been
+    created, unless `upload_in_background` is set: in that case, the URLs of the assets can be returned before the
+    assets are uploaded.
+
+    If `thumbnail_max_size` is set, a thumbnail whose width and height are at most `thumbnail_max_size` pixels is also
+    created for every image.
+
+    If `on_demand_assets` is set, no asset is created: the returned URLs point to the on-demand endpoint, which creates
+    the asset when it is fetched.
+    """
+
     assets_base_url: str
     overwrite: bool
     storage_client: StorageClient
+    manifest: Optional[AssetsManifest] = None
+    concurrent_uploads: bool = False
+    upload_in_background: bool = False
+    thumbnail_max_size: int = 0
+    on_demand_assets: Optional[OnDemandAssets] = None
+    pending_uploads: list["Future[None]"] = field(default_factory=list)
+
+    def wait_for_uploads(self) -> None:
+        """Wait until the pending uploads are done, and raise the first error, if any."""
+        pending_uploads, self.pending_uploads = self.pending_uploads, []
+        for future in pending_uploads:
+            future.result()
@@ -13,6 +13,7 @@ from libcommon.constants import (
     DESCRIPTIVE_STATISTICS_CACHE_APPNAME,
     DUCKDB_INDEX_CACHE_APPNAME,
     HF_DATASETS_CACHE_APPNAME,
+    PARQUET_BLOCKS_CACHE_APPNAME,
     PARQUET_METADATA_CACHE_APPNAME,
 )
 
@@ -54,6 +55,20 @@ def init_parquet_metadata_dir(directory: Optional[StrPath] = None) -> StrPath:
     return init_dir(directory, appname=PARQUET_METADATA_CACHE_APPNAME)
 
 
+def init_parquet_blocks_cache_dir(directory: Optional[StrPath] = None) -> StrPath:
+    """Initialize the directory where the blocks of the remote parquet files are cached.
+
+    If directory is None, it will be set to the default cache location on the machine.
+
+    Args:
+        directory (Optional[Union[str, PathLike[str]]], optional): The directory to initialize. Defaults to None.
+
+    Returns:
+        Union[str, PathLike[str]]: The directory.
+    """
+    return init_dir(directory, appname=PARQUET_BLOCKS_CACHE_APPNAME)
+
+
 def init_duckdb_index_cache_dir(directory: Optional[StrPath] = None) -> StrPath:
     """Initialize the duckdb index directory.
 
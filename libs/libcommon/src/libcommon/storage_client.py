@@ -1,10 +1,15 @@
 # SPDX-License-Identifier: Apache-2.0
 # Copyright 2023 The HuggingFace Authors.
+import asyncio
 import logging
-from typing import Any
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import BoundedSemaphore, Lock
+from typing import Any, Optional
 
 import fsspec
 
+STORAGE_CLIENT_MAX_CONCURRENT_UPLOADS = 32
+
 
 class StorageClientInitializeError(Exception):
     pass
@@ -17,16 +22,28 @@ class StorageClient:
     Args:
         protocol (:obj:`str`): The fsspec protocol (supported s3 or file)
         root (:obj:`str`): The storage root path
+        max_concurrent_uploads (:obj:`int`): The maximum number of uploads in flight (see `upload`)
     """
 
     _fs: Any
     _storage_root: str
     _folder: str
 
-    def __init__(self, protocol: str, root: str, folder: str, **kwargs: Any) -> None:
+    def __init__(
+        self,
+        protocol: str,
+        root: str,
+        folder: str,
+        max_concurrent_uploads: int = STORAGE_CLIENT_MAX_CONCURRENT_UPLOADS,
+        **kwargs: Any,
+    ) -> None:
         logging.info(f"trying to initialize storage client with {protocol=} {root=} {folder=}")
         self._storage_root = root
         self._folder = folder
+        self.max_concurrent_uploads = max_concurrent_uploads
+        self._uploads_semaphore = BoundedSemaphore(max_concurrent_uploads)
+        self._uploads_executor: Optional[ThreadPoolExecutor] = None
+        self._uploads_executor_lock = Lock()
         if protocol == "s3":
             self._fs = fsspec.filesystem(protocol, **kwargs)
         elif protocol == "file":
@@ -45,6 +62,54 @@ class StorageClient:
         object_path = f"{self.get_base_directory()}/{object_key}"
         return bool(self._fs.exists(object_path))
 
+    def upload(self, object_key: str, data: bytes) -> "Future[None]":
+        """
+        Upload the data to the object in the background, and return a future that is done once it has been uploaded.
+
+        On S3, the upload uses the async API of s3fs, in the event loop of fsspec, so that many uploads are in flight
+        without a thread each. On the other file systems, the data is written by a thread pool. At most
+        `max_concurrent_uploads` uploads are in flight: beyond that, the call blocks until an upload is done, so that
+        a fast producer does not accumulate the data of all its pending uploads in memory.
+
+        It must not be called from the event loop of fsspec.
+        """
+        object_path = f"{self.get_base_directory()}/{object_key}"
+        self._uploads_semaphore.acquire()
+        try:
+            future: Future[None]
+            if getattr(self._fs, "async_impl", False):
+                future = asyncio.run_coroutine_threadsafe(self._fs._pipe_file(object_path, data), self._fs.loop)
+            else:
+                future = self._get_uploads_executor().submit(self._fs.pipe_file, object_path, data)
+        except BaseException:
+            self._uploads_semaphore.release()
+            raise
+        future.add_done_callback(lambda _: self._uploads_semaphore.release())
+        return future
+
+    def _get_uploads_executor(self) -> ThreadPoolExecutor:
+        with self._uploads_executor_lock:
+            if self._uploads_executor is None:
+                self._uploads_executor = ThreadPoolExecutor(
+                    max_workers=self.max_concurrent_uploads, thread_name_prefix="storage_client_upload"
+                )
+            return self._uploads_executor
+
+    def list_object_keys(self, prefix: str, max_keys: Optional[int] = None) -> Optional[list[str]]:
+        """Return the keys of all the objects under the prefix, with one listing instead of one request per object.
+
+        If `max_keys` is set and there are more objects under the prefix, None is returned instead.
+        """
+        base_directory = self._fs._strip_protocol(self.get_base_directory())
+        object_keys = []
+        for object_path in self._fs.find(f"{base_directory}/{prefix}"):
+            if not object_path.startswith(f"{base_directory}/"):
+                continue
+            if max_keys is not None and len(object_keys) >= max_keys:
+                return None
+            object_keys.append(object_path[len(base_directory) + 1 :])
+        return object_keys
+
     def get_base_directory(self) -> str:
         return f"{self._storage_root}/{self._folder}"
 
@@ -94,7 +94,12 @@ class FeatureItem(TypedDict):
     type: dict[str, Any]
 
 
-class PaginatedResponse(TypedDict):
+class PaginatedResponseNextCursor(TypedDict, total=False):
+    # only returned by the endpoints that support the cursor pagination (/search and /filter)
+    next_cursor: Optional[str]
+
+
+class PaginatedResponse(PaginatedResponseNextCursor):
     features: list[FeatureItem]
     rows: list[RowItem]
     num_rows_total: int
@@ -1,22 +1,50 @@
 # SPDX-License-Identifier: Apache-2.0
 # Copyright 2022 The HuggingFace Authors.
 
+import hashlib
+import logging
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import replace
+from functools import partial
 from io import BytesIO
 from pathlib import Path
-from tempfile import NamedTemporaryFile
+from threading import Lock
 from typing import Optional, TypedDict
 from urllib import parse
 
 from PIL import Image  # type: ignore
-from pydub import AudioSegment  # type:ignore
+from PIL import features as PILFeatures  # type: ignore
 
 from libcommon.constants import DATASET_SEPARATOR
-from libcommon.public_assets_storage import PublicAssetsStorage
+from libcommon.memory_cache import SizedLRUCache
+from libcommon.prometheus import AUDIO_TRANSCODING_QUEUE_SIZE, StepProfiler
+from libcommon.public_assets_storage import OnDemandAssets, PublicAssetsStorage
 from libcommon.storage import StrPath, remove_dir
+from libcommon.viewer_utils.audio_conversion import convert_audio_file
 
 ASSET_DIR_MODE = 0o755
 DATASETS_SERVER_MDATE_FILENAME = ".dss"
 SUPPORTED_AUDIO_EXTENSION_TO_MEDIA_TYPE = {".wav": "audio/wav", ".mp3": "audio/mpeg"}
+# AVIF is not supported by Pillow, and WebP depends on how Pillow has been built
+THUMBNAIL_FORMAT, THUMBNAIL_EXTENSION = ("WEBP", ".webp") if PILFeatures.check("webp") else ("JPEG", ".jpg")
+# the image modes that Pillow can save as JPEG
+JPEG_MODES = {"1", "L", "RGB", "RGBX", "CMYK", "YCbCr"}
+
+AUDIO_TRANSCODING_MAX_WORKERS = 4
+AUDIO_TRANSCODING_CACHE_MAX_BYTES = 100_000_000
+
+_thumbnails_executor: Optional[ThreadPoolExecutor] = None
+_thumbnails_executor_lock = Lock()
+
+_audio_transcoding_executor: Optional[ProcessPoolExecutor] = None
+_audio_transcoding_in_flight: dict[tuple[str, str], tuple[ProcessPoolExecutor, "Future[bytes]"]] = {}
+_audio_transcoding_lock = Lock()
+# the transcoded audio files, by hash of the source audio file and target format
+_audio_transcoding_cache: SizedLRUCache[tuple[str, str], bytes] = SizedLRUCache(
+    name="audio_transcoding", max_size=AUDIO_TRANSCODING_CACHE_MAX_BYTES, get_size=len
+)
 
 
 def delete_asset_dir(dataset: str, directory: StrPath) -> None:
@@ -30,18 +58,144 @@ class ImageSource(TypedDict):
     width: int
 
 
+class ImageSourceWithThumbnail(ImageSource):
+    thumbnail: ImageSource
+
+
 class AudioSource(TypedDict):
     src: str
     type: str
 
 
+def generate_split_dir_path(dataset: str, revision: str, config: str, split: str) -> str:
+    return f"{parse.quote(dataset)}/{DATASET_SEPARATOR}/{revision}/{DATASET_SEPARATOR}/{parse.quote(config)}/{parse.quote(split)}"
+
+
 def generate_asset_src(
     base_url: str, dataset: str, revision: str, config: str, split: str, row_idx: int, column: str, filename: str
 ) -> tuple[str, str]:
-    dir_path = f"{parse.quote(dataset)}/{DATASET_SEPARATOR}/{revision}/{DATASET_SEPARATOR}/{parse.quote(config)}/{parse.quote(split)}/{str(row_idx)}/{parse.quote(column)}"
+    split_dir_path = generate_split_dir_path(dataset=dataset, revision=revision, config=config, split=split)
+    dir_path = f"{split_dir_path}/{str(row_idx)}/{parse.quote(column)}"
     return dir_path, f"{base_url}/{dir_path}/{filename}"
 
 
+def generate_on_demand_asset_src(
+    dataset: str,
+    revision: str,
+    config: str,
+    split: str,
+    row_idx: int,
+    column: str,
+    filename: str,
+    on_demand_assets: OnDemandAssets,
+) -> str:
+    dir_path, _ = generate_asset_src(
+        base_url="",
+        dataset=dataset,
+        revision=revision,
+        config=config,
+        split=split,
+        row_idx=row_idx,
+        column=column,
+        filename=filename,
+    )
+    query = parse.urlencode(
+        {
+            "dataset": dataset,
+            "revision": revision,
+            "config": config,
+            "split": split,
+            "row_idx": row_idx,
+            "column": column,
+            "filename": filename,
+            "signature": on_demand_assets.sign(f"{dir_path}/{filename}"),
+        }
+    )
+    return f"{on_demand_assets.url}?{query}"
+
+
+def asset_exists(
+    dataset: str, revision: str, config: str, split: str, object_key: str, public_assets_storage: PublicAssetsStorage
+) -> bool:
+    if public_assets_storage.manifest is None:
+        return public_assets_storage.storage_client.exists(object_key=object_key)
+    return public_assets_storage.manifest.exists(
+        split_dir_path=generate_split_dir_path(dataset=dataset, revision=revision, config=config, split=split),
+        object_key=object_key,
+    )
+
+
+def add_asset_to_manifest(
+    dataset: str, revision: str, config: str, split: str, object_key: str, public_assets_storage: PublicAssetsStorage
+) -> None:
+    if public_assets_storage.manifest is not None:
+        public_assets_storage.manifest.add(
+            split_dir_path=generate_split_dir_path(dataset=dataset, revision=revision, config=config, split=split),
+            object_key=object_key,
+        )
+
+
+def _on_upload_done(
+    future: "Future[None]",
+    dataset: str,
+    revision: str,
+    config: str,
+    split: str,
+    object_key: str,
+    public_assets_storage: PublicAssetsStorage,
+) -> None:
+    if future.cancelled() or future.exception() is not None:
+        logging.warning(
+            f"Could not upload the asset {object_key}: {None if future.cancelled() else future.exception()}"
+        )
+        return
+    add_asset_to_manifest(
+        dataset=dataset,
+        revision=revision,
+        config=config,
+        split=split,
+        object_key=object_key,
+        public_assets_storage=public_assets_storage,
+    )
+
+
+def write_asset(
+    dataset: str,
+    revision: str,
+    config: str,
+    split: str,
+    object_key: str,
+    data: bytes,
+    public_assets_storage: PublicAssetsStorage,
+) -> None:
+    storage_client = public_assets_storage.storage_client
+    if not public_assets_storage.concurrent_uploads:
+        with storage_client._fs.open(f"{storage_client.get_base_directory()}/{object_key}", "wb") as f:
+            f.write(data)
+        add_asset_to_manifest(
+            dataset=dataset,
+            revision=revision,
+            config=config,
+            split=split,
+            object_key=object_key,
+            public_assets_storage=public_assets_storage,
+        )
+        return
+    future = storage_client.upload(object_key=object_key, data=data)
+    future.add_done_callback(
+        partial(
+            _on_upload_done,
+            dataset=dataset,
+            revision=revision,
+            config=config,
+            split=split,
+            object_key=object_key,
+            public_assets_storage=public_assets_storage,
+        )
+    )
+    public_assets_storage.pending_uploads.append(future)
+
+
 def create_image_file(
     dataset: str,
     revision: str,
@@ -53,11 +207,11 @@ def create_image_file(
     image: Image.Image,
     format: str,
     public_assets_storage: PublicAssetsStorage,
+    image_bytes: Optional[bytes] = None,
 ) -> ImageSource:
     # get url dir path
     assets_base_url = public_assets_storage.assets_base_url
     overwrite = public_assets_storage.overwrite
-    storage_client = public_assets_storage.storage_client
 
     dir_path, src = generate_asset_src(
         base_url=assets_base_url,
@@ -70,12 +224,253 @@ def create_image_file(
         filename=filename,
     )
     object_key = f"{dir_path}/{filename}"
-    image_path = f"{storage_client.get_base_directory()}/{object_key}"
 
-    if overwrite or not storage_client.exists(object_key=object_key):
-        with storage_client._fs.open(image_path, "wb") as f:
-            image.save(fp=f, format=format)
-    return ImageSource(src=src, height=image.height, width=image.width)
+    if public_assets_storage.on_demand_assets is not None:
+        # the image is not created: only its header has been read, to get its size
+        if format == "JPEG" and image.mode not in JPEG_MODES:
+            # as image.save() would, so that the caller falls back to another format
+            raise OSError(f"cannot write mode {image.mode} as JPEG")
+        src = generate_on_demand_asset_src(
+            dataset=dataset,
+            revision=revision,
+            config=config,
+            split=split,
+            row_idx=row_idx,
+            column=column,
+            filename=filename,
+            on_demand_assets=public_assets_storage.on_demand_assets,
+        )
+    elif overwrite or not asset_exists(
+        dataset=dataset,
+        revision=revision,
+        config=config,
+        split=split,
+        object_key=object_key,
+        public_assets_storage=public_assets_storage,
+    ):
+        # image_bytes, if passed, is the image already encoded in the format: it is stored as is
+        if image_bytes is None:
+            buffer = BytesIO()
+            image.save(fp=buffer, format=format)
+            image_bytes = buffer.getvalue()
+        write_asset(
+            dataset=dataset,
+            revision=revision,
+            config=config,
+            split=split,
+            object_key=object_key,
+            data=image_bytes,
+            public_assets_storage=public_assets_storage,
+        )
+    image_source = ImageSource(src=src, height=image.height, width=image.width)
+    if not public_assets_storage.thumbnail_max_size:
+        return image_source
+    return ImageSourceWithThumbnail(
+        **image_source,
+        thumbnail=create_thumbnail_file(
+            dataset=dataset,
+            revision=revision,
+            config=config,
+            split=split,
+            row_idx=row_idx,
+            column=column,
+            filename=filename,
+            image=image,
+            image_source=image_source,
+            public_assets_storage=public_assets_storage,
+        ),
+    )
+
+
+def get_thumbnail_size(width: int, height: int, max_size: int) -> tuple[int, int]:
+    scale = max_size / max(width, height)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def _get_thumbnails_executor() -> ThreadPoolExecutor:
+    global _thumbnails_executor
+    with _thumbnails_executor_lock:
+        if _thumbnails_executor is None:
+            _thumbnails_executor = ThreadPoolExecutor(thread_name_prefix="thumbnails")
+        return _thumbnails_executor
+
+
+def _write_thumbnail(
+    dataset: str,
+    revision: str,
+    config: str,
+    split: str,
+    object_key: str,
+    image: Image.Image,
+    size: tuple[int, int],
+    public_assets_storage: PublicAssetsStorage,
+) -> None:
+    thumbnail = image.resize(size, resample=Image.LANCZOS)
+    if THUMBNAIL_FORMAT == "JPEG" and thumbnail.mode != "RGB":
+        thumbnail = thumbnail.convert("RGB")
+    elif thumbnail.mode not in ("RGB", "RGBA"):
+        thumbnail = thumbnail.convert("RGBA")
+    buffer = BytesIO()
+    thumbnail.save(fp=buffer, format=THUMBNAIL_FORMAT)
+    write_asset(
+        dataset=dataset,
+        revision=revision,
+        config=config,
+        split=split,
+        object_key=object_key,
+        data=buffer.getvalue(),
+        # the thumbnail is already created in the background: write it directly
+        public_assets_storage=replace(public_assets_storage, concurrent_uploads=False),
+    )
+
+
+def create_thumbnail_file(
+    dataset: str,
+    revision: str,
+    config: str,
+    split: str,
+    row_idx: int,
+    column: str,
+    filename: str,
+    image: Image.Image,
+    image_source: ImageSource,
+    public_assets_storage: PublicAssetsStorage,
+) -> ImageSource:
+    max_size = public_assets_storage.thumbnail_max_size
+    if max(image.width, image.height) <= max_size:
+        # the image is small enough to be its own thumbnail
+        return image_source
+    thumbnail_filename = f"{filename.rsplit('.', 1)[0]}-thumbnail-{max_size}{THUMBNAIL_EXTENSION}"
+    dir_path, src = generate_asset_src(
+        base_url=public_assets_storage.assets_base_url,
+        dataset=dataset,
+        revision=revision,
+        config=config,
+        split=split,
+        row_idx=row_idx,
+        column=column,
+        filename=thumbnail_filename,
+    )
+    object_key = f"{dir_path}/{thumbnail_filename}"
+    # the size is computed beforehand, so that the URL and the size are returned before the thumbnail is created
+    width, height = get_thumbnail_size(width=image.width, height=image.height, max_size=max_size)
+    if public_assets_storage.on_demand_assets is not None:
+        src = generate_on_demand_asset_src(
+            dataset=dataset,
+            revision=revision,
+            config=config,
+            split=split,
+            row_idx=row_idx,
+            column=column,
+            filename=thumbnail_filename,
+            on_demand_assets=public_assets_storage.on_demand_assets,
+        )
+    elif public_assets_storage.overwrite or not asset_exists(
+        dataset=dataset,
+        revision=revision,
+        config=config,
+        split=split,
+        object_key=object_key,
+        public_assets_storage=public_assets_storage,
+    ):
+        write_thumbnail = partial(
+            _write_thumbnail,
+            dataset=dataset,
+            revision=revision,
+            config=config,
+            split=split,
+            object_key=object_key,
+            image=image,
+            size=(width, height),
+            public_assets_storage=public_assets_storage,
+        )
+        if public_assets_storage.concurrent_uploads:
+            # decoding and resizing the large images is slow: it's done by a pool of threads (Pillow releases the GIL)
+            public_assets_storage.pending_uploads.append(_get_thumbnails_executor().submit(write_thumbnail))
+        else:
+            write_thumbnail()
+    return ImageSource(src=src, height=height, width=width)
+
+
+def _get_audio_transcoding_executor() -> ProcessPoolExecutor:
+    global _audio_transcoding_executor
+    if _audio_transcoding_executor is None:
+        # spawn, and not fork, since the parent process runs threads
+        _audio_transcoding_executor = ProcessPoolExecutor(
+            max_workers=AUDIO_TRANSCODING_MAX_WORKERS, mp_context=multiprocessing.get_context("spawn")
+        )
+    return _audio_transcoding_executor
+
+
+def _reset_audio_transcoding_executor(executor: ProcessPoolExecutor) -> None:
+    # a broken pool (e.g. a worker was killed by the OOM killer) fails all the next conversions: replace it. The caller
+    # must hold _audio_transcoding_lock.
+    global _audio_transcoding_executor
+    if _audio_transcoding_executor is executor:
+        _audio_transcoding_executor = None
+        executor.shutdown(wait=False)
+
+
+def _on_audio_transcoding_done(key: tuple[str, str], future: "Future[bytes]") -> None:
+    AUDIO_TRANSCODING_QUEUE_SIZE.dec()
+    if not future.cancelled() and future.exception() is None:
+        _audio_transcoding_cache.put(key, future.result())
+    with _audio_transcoding_lock:
+        if _audio_transcoding_in_flight.get(key, (None, None))[1] is future:
+            _audio_transcoding_in_flight.pop(key)
+
+
+def _transcode_audio_file_in_pool(
+    key: tuple[str, str], audio_file_bytes: bytes, audio_file_extension: Optional[str], target_format: str
+) -> bytes:
+    with _audio_transcoding_lock:
+        in_flight = _audio_transcoding_in_flight.get(key)
+        is_new = in_flight is None
+        if in_flight is None:
+            executor = _get_audio_transcoding_executor()
+            try:
+                future = executor.submit(convert_audio_file, audio_file_bytes, audio_file_extension, target_format)
+            except BrokenProcessPool:
+                _reset_audio_transcoding_executor(executor)
+                raise
+            # only once the conversion is queued, since the callback that decrements it is only called then
+            AUDIO_TRANSCODING_QUEUE_SIZE.inc()
+            _audio_transcoding_in_flight[key] = (executor, future)
+        else:
+            executor, future = in_flight
+    if is_new:
+        # outside of the lock, since the callback is called immediately if the conversion is already done
+        future.add_done_callback(partial(_on_audio_transcoding_done, key))
+    try:
+        return future.result()
+    except BrokenProcessPool:
+        with _audio_transcoding_lock:
+            _reset_audio_transcoding_executor(executor)
+            # the failed conversion must not be joined by the retry
+            if _audio_transcoding_in_flight.get(key, (None, None))[1] is future:
+                _audio_transcoding_in_flight.pop(key)
+        raise
+
+
+def transcode_audio_file(audio_file_bytes: bytes, audio_file_extension: Optional[str], target_format: str) -> bytes:
+    """
+    Convert the audio file to the target format (e.g. "wav") in a pool of processes, since pydub is CPU-bound (or
+    spawns ffmpeg).
+
+    The result is cached in memory by hash of the source audio file, and the identical audio files that are being
+    converted concurrently are converted only once. If the pool is broken, it is replaced and the conversion is retried
+    once.
+    """
+    key = (hashlib.sha256(audio_file_bytes).hexdigest(), target_format)
+    transcoded_audio_file_bytes = _audio_transcoding_cache.get(key)
+    if transcoded_audio_file_bytes is not None:
+        return transcoded_audio_file_bytes
+    with StepProfiler(method="transcode_audio_file", step="convert", context=target_format):
+        try:
+            return _transcode_audio_file_in_pool(key, audio_file_bytes, audio_file_extension, target_format)
+        except BrokenProcessPool:
+            logging.warning("The audio transcoding pool was broken, retry the conversion in a new pool.")
+            return _transcode_audio_file_in_pool(key, audio_file_bytes, audio_file_extension, target_format)
 
 
 def create_audio_file(
@@ -93,7 +488,6 @@ def create_audio_file(
     # get url dir path
     assets_base_url = public_assets_storage.assets_base_url
     overwrite = public_assets_storage.overwrite
-    storage_client = public_assets_storage.storage_client
 
     dir_path, src = generate_asset_src(
         base_url=assets_base_url,
@@ -106,7 +500,6 @@ def create_audio_file(
         filename=filename,
     )
     object_key = f"{dir_path}/{filename}"
-    audio_path = f"{storage_client.get_base_directory()}/{object_key}"
     suffix = f".{filename.split('.')[-1]}"
     if suffix not in SUPPORTED_AUDIO_EXTENSION_TO_MEDIA_TYPE:
         raise ValueError(
@@ -115,20 +508,39 @@ def create_audio_file(
         )
     media_type = SUPPORTED_AUDIO_EXTENSION_TO_MEDIA_TYPE[suffix]
 
-    if overwrite or not storage_client.exists(object_key=object_key):
+    if public_assets_storage.on_demand_assets is not None:
+        # the audio file is not transcoded nor written
+        src = generate_on_demand_asset_src(
+            dataset=dataset,
+            revision=revision,
+            config=config,
+            split=split,
+            row_idx=row_idx,
+            column=column,
+            filename=filename,
+            on_demand_assets=public_assets_storage.on_demand_assets,
+        )
+    elif overwrite or not asset_exists(
+        dataset=dataset,
+        revision=revision,
+        config=config,
+        split=split,
+        object_key=object_key,
+        public_assets_storage=public_assets_storage,
+    ):
         if audio_file_extension == suffix:
-            with storage_client._fs.open(audio_path, "wb") as f:
-                f.write(audio_file_bytes)
+            data = audio_file_bytes
         else:  # we need to convert
-            # might spawn a process to convert the audio file using ffmpeg
-            with NamedTemporaryFile("wb", suffix=audio_file_extension) as tmpfile:
-                tmpfile.write(audio_file_bytes)
-                segment: AudioSegment = AudioSegment.from_file(
-                    tmpfile.name, audio_file_extension[1:] if audio_file_extension else None
-                )
-                buffer = BytesIO()
-                segment.export(buffer, format=suffix[1:])
-                buffer.seek(0)
-                with storage_client._fs.open(audio_path, "wb") as f:
-                    f.write(buffer.read())
+            data = transcode_audio_file(
+                audio_file_bytes=audio_file_bytes, audio_file_extension=audio_file_extension, target_format=suffix[1:]
+            )
+        write_asset(
+            dataset=dataset,
+            revision=revision,
+            config=config,
+            split=split,
+            object_key=object_key,
+            data=data,
+            public_assets_storage=public_assets_storage,
+        )
     return [AudioSource(src=src, type=media_type)]
@@ -0,0 +1,24 @@
+# SPDX-License-Identifier: Apache-2.0
+# Copyright 2023 The HuggingFace Authors.
+
+# This module is imported by the processes of the audio transcoding pool (see libcommon.viewer_utils.asset): keep its
+# imports light.
+
+from io import BytesIO
+from tempfile import NamedTemporaryFile
+from typing import Optional
+
+from pydub import AudioSegment  # type:ignore
+
+
+def convert_audio_file(audio_file_bytes: bytes, audio_file_extension: Optional[str], target_format: str) -> bytes:
+    # might spawn a process to convert the audio file using ffmpeg
+    with NamedTemporaryFile("wb", suffix=audio_file_extension) as tmpfile:
+        tmpfile.write(audio_file_bytes)
+        tmpfile.flush()
+        segment: AudioSegment = AudioSegment.from_file(
+            tmpfile.name, audio_file_extension[1:] if audio_file_extension else None
+        )
+        buffer = BytesIO()
+        segment.export(buffer, format=target_format)
+        return buffer.getvalue()
@@ -3,6 +3,8 @@
 
 import json
 import os
+from collections.abc import Callable
+from dataclasses import dataclass
 from io import BytesIO
 from typing import Any, Optional, Union
 from zlib import adler32
@@ -26,8 +28,9 @@ from datasets import (
 from datasets.features.features import FeatureType, _visit
 from PIL import Image as PILImage  # type: ignore
 
+from libcommon.memory_cache import SizedLRUCache
 from libcommon.public_assets_storage import PublicAssetsStorage
-from libcommon.utils import FeatureItem
+from libcommon.utils import FeatureItem, Row
 from libcommon.viewer_utils.asset import create_audio_file, create_image_file
 
 UNSUPPORTED_FEATURES = [Value("binary")]
@@ -35,6 +38,9 @@ AUDIO_FILE_MAGIC_NUMBERS: dict[str, Any] = {
     ".wav": [(b"\x52\x49\x46\x46", 0), (b"\x57\x41\x56\x45", 8)],  # AND: (magic_number, start)
     ".mp3": (b"\xFF\xFB", b"\xFF\xF3", b"\xFF\xF2", b"\x49\x44\x33"),  # OR
 }
+# the encoded images in these formats are stored as is, instead of being decoded and re-encoded as JPEG or PNG
+PASSTHROUGH_IMAGE_FORMAT_TO_EXTENSION = {"JPEG": ".jpg", "PNG": ".png", "WEBP": ".webp"}
+FEATURES_TRANSFORM_PLANS_CACHE_MAX_SIZE = 1_000
 
 
 def append_hash_suffix(string: str, json_path: Optional[list[Union[str, int]]] = None) -> str:
@@ -67,20 +73,40 @@ def image(
 ) -> Any:
     if value is None:
         return None
+    image_bytes: Optional[bytes] = None
     if isinstance(value, dict) and value.get("bytes"):
-        value = PILImage.open(BytesIO(value["bytes"]))
+        image_bytes = value["bytes"]
     elif (
         isinstance(value, dict)
         and "path" in value
         and isinstance(value["path"], str)
         and os.path.exists(value["path"])
     ):
-        value = PILImage.open(value["path"])
+        with open(value["path"], "rb") as f:
+            image_bytes = f.read()
+    if image_bytes is not None:
+        # only reads the header: the image is decoded only if it has to be re-encoded
+        value = PILImage.open(BytesIO(image_bytes))
     if not isinstance(value, PILImage.Image):
         raise TypeError(
             "Image cell must be a PIL image or an encoded dict of an image, "
             f"but got {str(value)[:300]}{'...' if len(str(value)) > 300 else ''}"
         )
+    if image_bytes is not None and value.format in PASSTHROUGH_IMAGE_FORMAT_TO_EXTENSION:
+        # the image is already encoded in a format supported by the browsers: upload the bytes unchanged
+        return create_image_file(
+            dataset=dataset,
+            revision=revision,
+            config=config,
+            split=split,
+            row_idx=row_idx,
+            column=featureName,
+            filename=f"{append_hash_suffix('image', json_path)}{PASSTHROUGH_IMAGE_FORMAT_TO_EXTENSION[value.format]}",
+            image=value,
+            format=value.format,
+            public_assets_storage=public_assets_storage,
+            image_bytes=image_bytes,
+        )
     # attempt to generate one of the supported formats; if unsuccessful, throw an error
     for ext, format in [(".jpg", "JPEG"), (".png", "PNG")]:
         try:
@@ -377,3 +403,218 @@ def get_supported_unsupported_columns(
         else:
             unsupported_columns.append(str_column)
     return supported_columns, unsupported_columns
+
+
+@dataclass(frozen=True)
+class CellContext:
+    """The arguments of get_cell_value that are the same for all the cells of a response."""
+
+    dataset: str
+    revision: str
+    config: str
+    split: str
+    public_assets_storage: PublicAssetsStorage
+
+
+JsonPath = Optional[list[Union[str, int]]]
+# transforms a cell, given its row index and its json path in the column, like get_cell_value
+CellTransform = Callable[[Any, int, JsonPath, CellContext], Any]
+
+
+def _transform_sub_cell(
+    transform: Optional[CellTransform],
+    cell: Any,
+    row_idx: int,
+    json_path: JsonPath,
+    context: CellContext,
+    *keys: Union[str, int],
+) -> Any:
+    if transform is None:
+        return cell
+    return transform(cell, row_idx, json_path + list(keys) if json_path else list(keys), context)
+
+
+def _transform_sub_cells(
+    transform: Optional[CellTransform],
+    cells: list[Any],
+    row_idx: int,
+    json_path: JsonPath,
+    context: CellContext,
+    *keys: Union[str, int],
+) -> list[Any]:
+    if transform is None:
+        return cells
+    return [
+        _transform_sub_cell(transform, subCell, row_idx, json_path, context, *keys, idx)
+        for (idx, subCell) in enumerate(cells)
+    ]
+
+
+def compile_cell_transform(fieldType: Any, featureName: str) -> Optional[CellTransform]:
+    """
+    Compile the transformation done by get_cell_value for a feature, once, instead of walking the feature for every
+    cell.
+
+    Returns:
+        Optional[CellTransform]: None if the cells are returned as is (no images nor audio in the feature), else a
+          function that returns the same value as get_cell_value. Contrary to get_cell_value, the cells without images
+          nor audio are not validated against the feature.
+    """
+    if isinstance(fieldType, (Image, Audio)):
+        create_asset = image if isinstance(fieldType, Image) else audio
+
+        def transform_asset(cell: Any, row_idx: int, json_path: JsonPath, context: CellContext) -> Any:
+            if cell is None:
+                return None
+            return create_asset(
+                dataset=context.dataset,
+                revision=context.revision,
+                config=context.config,
+                split=context.split,
+                row_idx=row_idx,
+                value=cell,
+                featureName=featureName,
+                public_assets_storage=context.public_assets_storage,
+                json_path=json_path,
+            )
+
+        return transform_asset
+    elif isinstance(fieldType, list):
+        subTransforms = [compile_cell_transform(subFieldType, featureName) for subFieldType in fieldType]
+        if not any(subTransforms):
+            return None
+        if len(fieldType) != 1:
+            return _compile_type_error("the feature type should be a 1-element list.")
+        subTransform = subTransforms[0]
+
+        def transform_list(cell: Any, row_idx: int, json_path: JsonPath, context: CellContext) -> Any:
+            if cell is None:
+                return None
+            if not isinstance(cell, list):
+                raise TypeError("list cell must be a list.")
+            return _transform_sub_cells(subTransform, cell, row_idx, json_path, context)
+
+        return transform_list
+    elif isinstance(fieldType, Sequence):
+        featureTransform = compile_cell_transform(fieldType.feature, featureName)
+        if featureTransform is None:
+            return None
+        length = fieldType.length
+        keyTransforms = (
+            {key: compile_cell_transform(subFieldType, featureName) for key, subFieldType in fieldType.feature.items()}
+            if isinstance(fieldType.feature, dict)
+            else {}
+        )
+
+        def transform_sequence(cell: Any, row_idx: int, json_path: JsonPath, context: CellContext) -> Any:
+            if cell is None:
+                return None
+            if isinstance(cell, list):
+                if length >= 0 and len(cell) != length:
+                    raise TypeError("the cell length should be the same as the Sequence length.")
+                return _transform_sub_cells(featureTransform, cell, row_idx, json_path, context)
+            # a Sequence of dicts is a dict of lists, see get_cell_value
+            if isinstance(cell, dict):
+                if any(not isinstance(v, list) or (k not in keyTransforms) for k, v in cell.items()):
+                    raise TypeError("The value of a Sequence of dicts should be a dictionary of lists.")
+                return {
+                    key: _transform_sub_cells(keyTransforms[key], subCell, row_idx, json_path, context, key)
+                    for (key, subCell) in cell.items()
+                }
+            raise TypeError("Sequence cell must be a list or a dict.")
+
+        return transform_sequence
+    elif isinstance(fieldType, dict):
+        dictTransforms = {
+            key: compile_cell_transform(subFieldType, featureName) for key, subFieldType in fieldType.items()
+        }
+        if not any(dictTransforms.values()):
+            return None
+
+        def transform_dict(cell: Any, row_idx: int, json_path: JsonPath, context: CellContext) -> Any:
+            if cell is None:
+                return None
+            if not isinstance(cell, dict):
+                raise TypeError("dict cell must be a dict.")
+            return {
+                key: _transform_sub_cell(dictTransforms[key], subCell, row_idx, json_path, context, key)
+                for (key, subCell) in cell.items()
+            }
+
+        return transform_dict
+    # the other features (Value, ClassLabel, etc.) contain no assets
+    return None
+
+
+def _compile_type_error(message: str) -> CellTransform:
+    def raise_type_error(cell: Any, _row_idx: int, _json_path: JsonPath, _context: CellContext) -> Any:
+        if cell is None:
+            return None
+        raise TypeError(message)
+
+    return raise_type_error
+
+
+@dataclass(frozen=True)
+class FeaturesTransformPlan:
+    """
+    The transformation of the rows of a split, compiled once for its features. See get_features_transform_plan.
+
+    Args:
+        cell_transforms (dict[str, CellTransform]): The transformation of the cells of the columns that contain images
+          or audio. The cells of the other columns are returned as is.
+        supported_columns (list[str]): The columns, as returned by get_supported_unsupported_columns.
+        unsupported_columns (list[str]): The unsupported columns, as returned by get_supported_unsupported_columns.
+    """
+
+    cell_transforms: dict[str, CellTransform]
+    supported_columns: list[str]
+    unsupported_columns: list[str]
+
+    @property
+    def has_assets(self) -> bool:
+        return bool(self.cell_transforms)
+
+    def transform_cell(self, featureName: str, cell: Any, row_idx: int, context: CellContext) -> Any:
+        transform = self.cell_transforms.get(featureName)
+        return cell if transform is None else transform(cell, row_idx, None, context)
+
+    def transform_row(self, features: Features, row: Row, row_idx: int, context: CellContext) -> Row:
+        """Transform the cells of the row, in the order of the features. The missing cells are None."""
+        return {
+            featureName: self.transform_cell(
+                featureName=featureName, cell=row.get(featureName), row_idx=row_idx, context=context
+            )
+            for featureName in features
+        }
+
+
+# the plans are keyed by the representation of the features, which contains all the types and their parameters
+_features_transform_plans: SizedLRUCache[str, FeaturesTransformPlan] = SizedLRUCache(
+    name="features_transform_plans", max_size=FEATURES_TRANSFORM_PLANS_CACHE_MAX_SIZE
+)
+
+
+def get_features_transform_plan(features: Features) -> FeaturesTransformPlan:
+    """
+    Get the transformation of the cells of the features (see get_cell_value), and their supported and unsupported
+    columns (with the default UNSUPPORTED_FEATURES).
+
+    The plan is compiled on the first call for the features, and reused for the next calls with equal features.
+    """
+    key = repr(features)
+    plan = _features_transform_plans.get(key)
+    if plan is None:
+        cell_transforms = {
+            featureName: transform
+            for featureName, fieldType in features.items()
+            if (transform := compile_cell_transform(fieldType, featureName)) is not None
+        }
+        supported_columns, unsupported_columns = get_supported_unsupported_columns(features)
+        plan = FeaturesTransformPlan(
+            cell_transforms=cell_transforms,
+            supported_columns=supported_columns,
+            unsupported_columns=unsupported_columns,
+        )
+        _features_transform_plans.put(key, plan)
+    return plan
@@ -0,0 +1,87 @@
+# SPDX-License-Identifier: Apache-2.0
+# Copyright 2023 The HuggingFace Authors.
+
+import os
+from pathlib import Path
+
+import pytest
+
+from libcommon.blocks_cache import DiskBlocksCache, FsspecDiskBlocksCache
+
+DATA = bytes(range(256)) * 4  # 1024 bytes
+URL = "https://example.com/0000.parquet"
+REVISION = "revision"
+
+
+class Fetcher:
+    def __init__(self) -> None:
+        self.calls: list[tuple[int, int]] = []
+
+    def __call__(self, start: int, stop: int) -> bytes:
+        self.calls.append((start, stop))
+        return DATA[start:stop]
+
+
+def get_file_cache(disk_blocks_cache: DiskBlocksCache, fetcher: Fetcher) -> FsspecDiskBlocksCache:
+    return FsspecDiskBlocksCache(
+        blocksize=5 * 2**20,
+        fetcher=fetcher,
+        size=len(DATA),
+        disk_blocks_cache=disk_blocks_cache,
+        url=URL,
+        revision=REVISION,
+    )
+
+
+@pytest.mark.parametrize(
+    "start,stop",
+    [(0, 10), (95, 105), (0, 1024), (1000, 2000), (None, None), (500, 500), (2000, 3000)],
+)
+def test_fsspec_disk_blocks_cache_fetch(tmp_path: Path, start: int, stop: int) -> None:
+    disk_blocks_cache = DiskBlocksCache(directory=tmp_path, max_size=10_000, block_size=100)
+    fetcher = Fetcher()
+    assert get_file_cache(disk_blocks_cache, fetcher)._fetch(start, stop) == DATA[start:stop]
+    # the second time, the blocks are read from the disk, even by another file
+    num_calls = len(fetcher.calls)
+    assert get_file_cache(disk_blocks_cache, fetcher)._fetch(start, stop) == DATA[start:stop]
+    assert len(fetcher.calls) == num_calls
+
+
+def test_fsspec_disk_blocks_cache_fetches_only_missing_blocks(tmp_path: Path) -> None:
+    disk_blocks_cache = DiskBlocksCache(directory=tmp_path, max_size=10_000, block_size=100)
+    fetcher = Fetcher()
+    file_cache = get_file_cache(disk_blocks_cache, fetcher)
+    assert file_cache._fetch(250, 350) == DATA[250:350]
+    assert fetcher.calls == [(200, 400)]
+    fetcher.calls.clear()
+    # blocks 2 and 3 are cached: only the contiguous missing blocks are fetched, one request per run
+    assert file_cache._fetch(50, 650) == DATA[50:650]
+    assert fetcher.calls == [(0, 200), (400, 700)]
+
+
+def test_disk_blocks_cache_is_keyed_by_revision(tmp_path: Path) -> None:
+    disk_blocks_cache = DiskBlocksCache(directory=tmp_path, max_size=10_000, block_size=100)
+    disk_blocks_cache.put_block(url=URL, revision=REVISION, block_idx=0, block=DATA[:100])
+    assert disk_blocks_cache.get_block(url=URL, revision=REVISION, block_idx=0, expected_size=100) == DATA[:100]
+    assert disk_blocks_cache.get_block(url=URL, revision="other", block_idx=0, expected_size=100) is None
+    assert disk_blocks_cache.get_block(url=URL, revision=REVISION, block_idx=1, expected_size=100) is None
+    # a block with an unexpected size is ignored
+    assert disk_blocks_cache.get_block(url=URL, revision=REVISION, block_idx=0, expected_size=24) is None
+
+
+def test_disk_blocks_cache_evicts_least_recently_used(tmp_path: Path) -> None:
+    disk_blocks_cache = DiskBlocksCache(directory=tmp_path, max_size=1_000, block_size=100)
+    for block_idx in range(10):
+        disk_blocks_cache.put_block(url=URL, revision=REVISION, block_idx=block_idx, block=DATA[:100])
+        block_path = disk_blocks_cache.get_block_path(url=URL, revision=REVISION, block_idx=block_idx)
+        os.utime(block_path, (block_idx, block_idx))
+    # reading the block 0 makes it the most recently used one
+    assert disk_blocks_cache.get_block(url=URL, revision=REVISION, block_idx=0, expected_size=100) is not None
+    disk_blocks_cache.put_block(url=URL, revision=REVISION, block_idx=10, block=DATA[:100])
+    disk_blocks_cache.evict()
+    cached_blocks_idx = [
+        block_idx
+        for block_idx in range(11)
+        if disk_blocks_cache.get_block_path(url=URL, revision=REVISION, block_idx=block_idx).exists()
+    ]
+    assert cached_blocks_idx == [0, 3, 4, 5, 6, 7, 8, 9, 10]
@@ -0,0 +1,59 @@
+# SPDX-License-Identifier: Apache-2.0
+# Copyright 2023 The HuggingFace Authors.
+
+from libcommon.memory_cache import SizedLRUCache
+
+
+def test_sized_lru_cache_get_put() -> None:
+    cache: SizedLRUCache[str, bytes] = SizedLRUCache(name="test_get_put", max_size=10, get_size=len)
+    assert cache.get("a") is None
+    cache.put("a", b"12345")
+    assert cache.get("a") == b"12345"
+    assert "a" in cache
+    assert len(cache) == 1
+    assert cache.size == 5
+
+
+def test_sized_lru_cache_evicts_least_recently_used() -> None:
+    cache: SizedLRUCache[str, bytes] = SizedLRUCache(name="test_evicts", max_size=10, get_size=len)
+    cache.put("a", b"1234")
+    cache.put("b", b"1234")
+    assert cache.get("a") is not None
+    # "b" is now the least recently used entry
+    cache.put("c", b"1234")
+    assert "a" in cache
+    assert "b" not in cache
+    assert "c" in cache
+    assert cache.size == 8
+
+
+def test_sized_lru_cache_replaces_value() -> None:
+    cache: SizedLRUCache[str, bytes] = SizedLRUCache(name="test_replaces", max_size=10, get_size=len)
+    cache.put("a", b"1234")
+    cache.put("a", b"12")
+    assert cache.get("a") == b"12"
+    assert cache.size == 2
+
+
+def test_sized_lru_cache_ignores_too_big_values() -> None:
+    cache: SizedLRUCache[str, bytes] = SizedLRUCache(name="test_too_big", max_size=10, get_size=len)
+    cache.put("a", b"1234")
+    cache.put("b", b"12345678901")
+    assert "a" in cache
+    assert "b" not in cache
+
+
+def test_sized_lru_cache_invalidate() -> None:
+    cache: SizedLRUCache[tuple[str, str], int] = SizedLRUCache(name="test_invalidate", max_size=10)
+    cache.put(("ds", "rev1"), 1)
+    cache.put(("ds", "rev2"), 2)
+    cache.put(("other", "rev1"), 3)
+    cache.invalidate(("other", "rev1"))
+    assert ("other", "rev1") not in cache
+    cache.invalidate_if(lambda key: key[0] == "ds" and key[1] != "rev2")
+    assert ("ds", "rev1") not in cache
+    assert ("ds", "rev2") in cache
+    assert cache.size == 1
+    cache.clear()
+    assert len(cache) == 0
+    assert cache.size == 0
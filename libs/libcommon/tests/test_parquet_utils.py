@@ -7,23 +7,30 @@ from collections.abc import Generator
 from http import HTTPStatus
 from pathlib import Path
 from typing import Any
-from unittest.mock import patch
+from unittest.mock import Mock, patch
 
+import pyarrow as pa
 import pyarrow.parquet as pq
 import pytest
 from datasets import Dataset, Image, concatenate_datasets
 from datasets.table import embed_table_storage
 from fsspec import AbstractFileSystem
 from fsspec.implementations.http import HTTPFileSystem
+from prometheus_client import REGISTRY
 
 from libcommon.config import ProcessingGraphConfig
 from libcommon.parquet_utils import (
     Indexer,
     ParquetIndexWithMetadata,
+    Readahead,
+    RowGroupReader,
     RowsIndex,
     SchemaMismatchError,
     TooBigRows,
+    _get_parquet_files_read_executor,
+    get_memory_used_percent,
     parquet_export_is_partial,
+    read_row_groups,
 )
 from libcommon.processing_graph import ProcessingGraph
 from libcommon.resources import CacheMongoResource
@@ -355,9 +362,12 @@ def rows_index_with_parquet_metadata(
     ds_sharded_fs: AbstractFileSystem,
     dataset_sharded_with_config_parquet_metadata: dict[str, Any],
 ) -> Generator[RowsIndex, None, None]:
-    with ds_sharded_fs.open("default/train/0003.parquet") as f:
-        with patch("libcommon.parquet_utils.HTTPFile", return_value=f):
-            yield indexer.get_rows_index("ds_sharded", "default", "train")
+    # one file object per parquet file, since the parquet files are read in parallel
+    with patch(
+        "libcommon.parquet_utils.HTTPFile",
+        side_effect=lambda *args, **kwargs: ds_sharded_fs.open("default/train/0003.parquet"),
+    ):
+        yield indexer.get_rows_index("ds_sharded", "default", "train")
 
 
 @pytest.fixture
@@ -401,6 +411,8 @@ def indexer(
         parquet_metadata_directory=parquet_metadata_directory,
         httpfs=HTTPFileSystem(),
         max_arrow_data_in_memory=9999999999,
+        # the prefetches would run in the background of the tests, see test_readahead_prefetches_the_next_page
+        readahead_max_memory_percent=0,
     )
 
 
@@ -469,6 +481,181 @@ def test_rows_index_query_with_parquet_metadata(
         rows_index_with_parquet_metadata.query(offset=-1, length=2)
 
 
+def test_rows_index_query_with_columns(rows_index_with_parquet_metadata: RowsIndex, ds_sharded: Dataset) -> None:
+    column = ds_sharded.column_names[0]
+    pa_table = rows_index_with_parquet_metadata.query(offset=1, length=3, columns=[column])
+    assert pa_table.to_pydict() == ds_sharded.select_columns([column])[1:4]
+
+
+@pytest.mark.parametrize(
+    "offset,length,expected_partial_read",
+    [(0, 1, True), (0, 2, False), (1, 3, True), (3, 4, True), (1, 99999999, True), (999999, 1, False)],
+)
+def test_rows_index_query_reads_part_of_the_row_groups(
+    rows_index_with_parquet_metadata: RowsIndex,
+    ds_sharded: Dataset,
+    offset: int,
+    length: int,
+    expected_partial_read: bool,
+) -> None:
+    # every parquet file has one row group of 2 rows
+    with patch("libcommon.parquet_utils.PARTIAL_READ_MIN_ROW_GROUP_BYTES", 0), patch.object(
+        RowGroupReader, "read_rows", autospec=True, side_effect=RowGroupReader.read_rows
+    ) as mock_read_rows:
+        pa_table = rows_index_with_parquet_metadata.query(offset=offset, length=length)
+    assert pa_table.to_pydict() == ds_sharded[offset : offset + length]  # noqa: E203
+    assert mock_read_rows.called == expected_partial_read
+
+
+def test_row_group_reader_read_rows(tmp_path: Path) -> None:
+    path = tmp_path / "0000.parquet"
+    pq.write_table(pa.table({"idx": list(range(1000))}), path, row_group_size=1000, data_page_size=100)
+    row_group_reader = RowGroupReader(
+        parquet_file=pq.ParquetFile(path),
+        group_id=0,
+        streaming_parquet_file=pq.ParquetFile(path, buffer_size=100),
+        rows_range=(150, 420),
+    )
+    with patch("pyarrow.parquet.ParquetFile.read_row_group", side_effect=RuntimeError):
+        assert row_group_reader.read(["idx"]).column("idx").to_pylist() == list(range(150, 420))
+    assert row_group_reader.read_size(["idx"]) < pq.ParquetFile(path).metadata.row_group(0).total_byte_size
+
+
+def test_rows_index_query_uses_row_groups_cache(
+    indexer: Indexer, rows_index_with_parquet_metadata: RowsIndex, ds_sharded: Dataset
+) -> None:
+    assert rows_index_with_parquet_metadata.query(offset=0, length=1).to_pydict() == ds_sharded[:1]
+    num_cached_row_groups = len(indexer.row_groups_cache)
+    assert num_cached_row_groups > 0
+    # the next page is in the same row group: it must not be read again
+    with patch("pyarrow.parquet.ParquetFile.read_row_group", side_effect=RuntimeError):
+        assert rows_index_with_parquet_metadata.query(offset=1, length=1).to_pydict() == ds_sharded[1:2]
+    assert len(indexer.row_groups_cache) == num_cached_row_groups
+
+
+def get_readahead_events_total(event: str) -> float:
+    return REGISTRY.get_sample_value("rows_readahead_events_total", {"event": event}) or 0
+
+
+def test_readahead_prefetches_the_next_page(
+    indexer: Indexer, rows_index_with_parquet_metadata: RowsIndex, ds_sharded: Dataset
+) -> None:
+    readahead = Readahead(max_memory_percent=100)
+    rows_index_with_parquet_metadata.readahead = readahead
+    num_prefetches, num_hits = get_readahead_events_total("prefetch"), get_readahead_events_total("hit")
+    # the first page is not a sequential access: nothing is prefetched
+    rows_index_with_parquet_metadata.query(offset=0, length=2)
+    assert len(indexer.row_groups_cache) == 1
+    rows_index_with_parquet_metadata.query(offset=2, length=2)
+    assert readahead._pool is not None
+    readahead._pool.close()
+    readahead._pool.join()
+    assert get_readahead_events_total("prefetch") == num_prefetches + 1
+    assert len(indexer.row_groups_cache) == 3
+    # the prefetched page is served from the row groups cache
+    readahead._pool = None
+    with patch("pyarrow.parquet.ParquetFile.read_row_group", side_effect=RuntimeError):
+        assert rows_index_with_parquet_metadata.query(offset=4, length=2).to_pydict() == ds_sharded[4:6]
+    assert get_readahead_events_total("hit") == num_hits + 1
+
+
+def test_readahead_is_skipped_under_memory_pressure(
+    indexer: Indexer, rows_index_with_parquet_metadata: RowsIndex
+) -> None:
+    readahead = Readahead(max_memory_percent=80)
+    rows_index_with_parquet_metadata.readahead = readahead
+    num_skips = get_readahead_events_total("skip")
+    with patch("libcommon.parquet_utils.get_memory_used_percent", return_value=95.0):
+        rows_index_with_parquet_metadata.query(offset=0, length=2)
+        rows_index_with_parquet_metadata.query(offset=2, length=2)
+    assert readahead._pool is None
+    assert get_readahead_events_total("skip") == num_skips + 1
+    assert len(indexer.row_groups_cache) == 2
+
+
+def test_readahead_is_skipped_when_memory_grows_before_the_prefetch(
+    indexer: Indexer, rows_index_with_parquet_metadata: RowsIndex
+) -> None:
+    readahead = Readahead(max_memory_percent=80)
+    rows_index_with_parquet_metadata.readahead = readahead
+    num_prefetches, num_skips = get_readahead_events_total("prefetch"), get_readahead_events_total("skip")
+    # checked when the prefetch is requested, then when it starts
+    with patch("libcommon.parquet_utils.get_memory_used_percent", side_effect=[50.0, 95.0]):
+        rows_index_with_parquet_metadata.query(offset=0, length=2)
+        rows_index_with_parquet_metadata.query(offset=2, length=2)
+        assert readahead._pool is not None
+        readahead._pool.close()
+        readahead._pool.join()
+    assert get_readahead_events_total("prefetch") == num_prefetches
+    assert get_readahead_events_total("skip") == num_skips + 1
+    assert len(indexer.row_groups_cache) == 2
+    assert len(readahead.prefetched_pages) == 0
+
+
+def test_readahead_is_skipped_when_the_workers_are_busy(
+    indexer: Indexer, rows_index_with_parquet_metadata: RowsIndex
+) -> None:
+    readahead = Readahead(max_memory_percent=100, max_workers=1)
+    rows_index_with_parquet_metadata.readahead = readahead
+    num_busy = get_readahead_events_total("busy")
+    # the only worker is prefetching a page of another split
+    assert readahead._workers.acquire(blocking=False)
+    rows_index_with_parquet_metadata.query(offset=0, length=2)
+    rows_index_with_parquet_metadata.query(offset=2, length=2)
+    assert readahead._pool is None
+    assert get_readahead_events_total("busy") == num_busy + 1
+    assert len(indexer.row_groups_cache) == 2
+
+
+@pytest.mark.parametrize(
+    "cgroup_files,expected_percent",
+    [
+        # cgroup v2, with a limit
+        ({"memory.max": "1000\n", "memory.current": "900\n"}, 90.0),
+        # cgroup v2, without limit: the memory of the machine is used
+        ({"memory.max": "max\n", "memory.current": "900\n"}, 42.0),
+        # cgroup v1, with a limit
+        ({"memory/memory.limit_in_bytes": "1000\n", "memory/memory.usage_in_bytes": "250\n"}, 25.0),
+        # cgroup v1, without limit (huge value)
+        ({"memory/memory.limit_in_bytes": "9223372036854771712\n", "memory/memory.usage_in_bytes": "250\n"}, 42.0),
+        # no cgroup
+        ({}, 42.0),
+    ],
+)
+def test_get_memory_used_percent(tmp_path: Path, cgroup_files: dict[str, str], expected_percent: float) -> None:
+    for name, content in cgroup_files.items():
+        (tmp_path / name).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / name).write_text(content)
+    cgroup_memory_files = [
+        (str(tmp_path / "memory.max"), str(tmp_path / "memory.current")),
+        (str(tmp_path / "memory/memory.limit_in_bytes"), str(tmp_path / "memory/memory.usage_in_bytes")),
+    ]
+    with patch("libcommon.parquet_utils.CGROUP_MEMORY_FILES", cgroup_memory_files), patch(
+        "libcommon.parquet_utils.virtual_memory", return_value=Mock(total=1_000_000_000, percent=42.0)
+    ):
+        assert get_memory_used_percent() == expected_percent
+
+
+def test_read_row_groups(tmp_path: Path) -> None:
+    row_group_readers = []
+    for file_idx in range(3):
+        path = tmp_path / f"{file_idx:04d}.parquet"
+        pq.write_table(pa.table({"idx": list(range(file_idx * 10, (file_idx + 1) * 10))}), path, row_group_size=3)
+        parquet_file = pq.ParquetFile(path)
+        row_group_readers.extend(
+            RowGroupReader(parquet_file=parquet_file, group_id=group_id)
+            for group_id in range(parquet_file.metadata.num_row_groups)
+        )
+    # the files are read in parallel, but the row groups are returned in order
+    pa_table = pa.concat_tables(read_row_groups(row_group_readers[2:], columns=["idx"]))
+    assert pa_table.column("idx").to_pylist() == list(range(6, 30))
+    # the threads are reused by the next queries
+    executor = _get_parquet_files_read_executor()
+    pa_table = pa.concat_tables(read_row_groups(row_group_readers, columns=["idx"]))
+    assert pa_table.column("idx").to_pylist() == list(range(30))
+    assert _get_parquet_files_read_executor() is executor
+
+
 def test_rows_index_query_with_too_big_rows(rows_index_with_too_big_rows: RowsIndex, ds_sharded: Dataset) -> None:
     with pytest.raises(TooBigRows):
         rows_index_with_too_big_rows.query(offset=0, length=3)
@@ -493,3 +680,26 @@ def test_indexer_schema_mistmatch_error(
                 index = indexer.get_rows_index("ds_sharded", "default", "train")
                 with pytest.raises(SchemaMismatchError):
                     index.query(offset=0, length=3)
+
+
+def test_indexer_get_rows_index_is_cached_by_revision(
+    indexer: Indexer, ds_fs: AbstractFileSystem, dataset_with_config_parquet_metadata: dict[str, Any]
+) -> None:
+    with ds_fs.open("default/train/0000.parquet") as f:
+        with patch("libcommon.parquet_utils.HTTPFile", return_value=f):
+            index = indexer.get_rows_index("ds", "default", "train")
+            assert indexer.get_rows_index("ds", "default", "train") is index
+            upsert_response(
+                kind="config-parquet-metadata",
+                dataset="ds",
+                dataset_git_revision="new_revision",
+                config="default",
+                content=dataset_with_config_parquet_metadata,
+                http_status=HTTPStatus.OK,
+                progress=1.0,
+            )
+            new_index = indexer.get_rows_index("ds", "default", "train")
+    assert new_index is not index
+    assert new_index.revision == "new_revision"
+    assert ("ds", "default", "train", REVISION_NAME) not in indexer.rows_indexes
+    assert ("ds", "default", "train", "new_revision") in indexer.rows_indexes
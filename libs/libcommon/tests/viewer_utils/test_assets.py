@@ -1,14 +1,27 @@
 from collections.abc import Mapping
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
+from unittest.mock import Mock, patch
+from urllib import parse
 
 import pytest
 import validators  # type: ignore
 from datasets import Dataset
 from PIL import Image as PILImage  # type: ignore
 
-from libcommon.public_assets_storage import PublicAssetsStorage
+from libcommon.memory_cache import SizedLRUCache
+from libcommon.prometheus import REGISTRY
+from libcommon.public_assets_storage import AssetsManifest, OnDemandAssets, PublicAssetsStorage
 from libcommon.storage_client import StorageClient
-from libcommon.viewer_utils.asset import create_audio_file, create_image_file, generate_asset_src
+from libcommon.viewer_utils import asset
+from libcommon.viewer_utils.asset import (
+    THUMBNAIL_EXTENSION,
+    create_audio_file,
+    create_image_file,
+    generate_asset_src,
+    transcode_audio_file,
+)
 
 ASSETS_FOLDER = "assets"
 ASSETS_BASE_URL = f"http://localhost/{ASSETS_FOLDER}"
@@ -83,6 +96,260 @@ def test_create_audio_file(
     assert public_assets_storage.storage_client.exists(audio_key)
 
 
+def test_create_image_file_with_manifest(
+    datasets: Mapping[str, Dataset], public_assets_storage: PublicAssetsStorage
+) -> None:
+    storage_client = public_assets_storage.storage_client
+    existing_key = "dataset/--/revision/--/config/split/0/col/image.jpg"
+    with storage_client._fs.open(f"{storage_client.get_base_directory()}/{existing_key}", "wb") as f:
+        f.write(b"already there")
+    public_assets_storage.manifest = AssetsManifest(storage_client=storage_client, max_keys=100, ttl_seconds=300)
+
+    num_exists_requests = 0
+    original_exists = storage_client.exists
+
+    def counting_exists(object_key: str) -> bool:
+        nonlocal num_exists_requests
+        num_exists_requests += 1
+        return original_exists(object_key=object_key)
+
+    storage_client.exists = counting_exists  # type: ignore
+    for row_idx in range(3):
+        create_image_file(
+            dataset="dataset",
+            revision="revision",
+            config="config",
+            split="split",
+            image=datasets["image"][0]["col"],
+            column="col",
+            filename="image.jpg",
+            row_idx=row_idx,
+            format="JPEG",
+            public_assets_storage=public_assets_storage,
+        )
+    # the existing image has not been overwritten, and only the missing images have been checked in the storage
+    assert (Path(storage_client.get_base_directory()) / existing_key).read_bytes() == b"already there"
+    assert num_exists_requests == 2
+    # the images created by this process are in the manifest: no request to the storage
+    for row_idx in range(3):
+        assert public_assets_storage.manifest.exists(
+            split_dir_path="dataset/--/revision/--/config/split",
+            object_key=f"dataset/--/revision/--/config/split/{row_idx}/col/image.jpg",
+        )
+    assert num_exists_requests == 2
+
+
+def test_manifest_of_split_bigger_than_max_keys(public_assets_storage: PublicAssetsStorage) -> None:
+    storage_client = public_assets_storage.storage_client
+    split_dir_path = "dataset/--/revision/--/config/split"
+    for row_idx in range(3):
+        storage_client.upload(object_key=f"{split_dir_path}/{row_idx}/col/image.jpg", data=b"image").result()
+    manifest = AssetsManifest(storage_client=storage_client, max_keys=3, ttl_seconds=300)
+
+    with patch.object(storage_client, "list_object_keys", wraps=storage_client.list_object_keys) as list_object_keys:
+        for row_idx in range(4):
+            assert manifest.exists(
+                split_dir_path=split_dir_path, object_key=f"{split_dir_path}/{row_idx}/col/image.jpg"
+            ) == (row_idx < 3)
+    # the split directory is too big to be kept in memory, but it is not listed again for every asset
+    assert list_object_keys.call_count == 1
+    assert storage_client.list_object_keys(split_dir_path, max_keys=2) is None
+    assert len(storage_client.list_object_keys(split_dir_path, max_keys=3) or []) == 3
+
+
+@pytest.mark.parametrize("upload_in_background", [False, True])
+def test_create_image_file_with_concurrent_uploads(
+    datasets: Mapping[str, Dataset], public_assets_storage: PublicAssetsStorage, upload_in_background: bool
+) -> None:
+    public_assets_storage.concurrent_uploads = True
+    public_assets_storage.upload_in_background = upload_in_background
+    storage_client = public_assets_storage.storage_client
+    for row_idx in range(10):
+        create_image_file(
+            dataset="dataset",
+            revision="revision",
+            config="config",
+            split="split",
+            image=datasets["image"][0]["col"],
+            column="col",
+            filename="image.jpg",
+            row_idx=row_idx,
+            format="JPEG",
+            public_assets_storage=public_assets_storage,
+        )
+    assert len(public_assets_storage.pending_uploads) == 10
+    public_assets_storage.wait_for_uploads()
+    assert not public_assets_storage.pending_uploads
+    for row_idx in range(10):
+        image_key = f"dataset/--/revision/--/config/split/{row_idx}/col/image.jpg"
+        assert storage_client.exists(image_key)
+        assert PILImage.open(f"{storage_client.get_base_directory()}/{image_key}").size == (640, 480)
+
+
+def test_wait_for_uploads_raises(public_assets_storage: PublicAssetsStorage) -> None:
+    storage_client = public_assets_storage.storage_client
+    # a directory cannot be overwritten by a file
+    (Path(storage_client.get_base_directory()) / "key").mkdir(parents=True)
+    public_assets_storage.pending_uploads.append(storage_client.upload(object_key="key", data=b"data"))
+    with pytest.raises(Exception):
+        public_assets_storage.wait_for_uploads()
+
+
+@pytest.mark.parametrize("concurrent_uploads", [False, True])
+@pytest.mark.parametrize(
+    "thumbnail_max_size,expected_thumbnail_filename,expected_height,expected_width",
+    [
+        (160, f"image-thumbnail-160{THUMBNAIL_EXTENSION}", 120, 160),
+        (1_000, "image.jpg", 480, 640),
+    ],
+)
+def test_create_image_file_with_thumbnail(
+    datasets: Mapping[str, Dataset],
+    public_assets_storage: PublicAssetsStorage,
+    concurrent_uploads: bool,
+    thumbnail_max_size: int,
+    expected_thumbnail_filename: str,
+    expected_height: int,
+    expected_width: int,
+) -> None:
+    public_assets_storage.concurrent_uploads = concurrent_uploads
+    public_assets_storage.thumbnail_max_size = thumbnail_max_size
+    value = create_image_file(
+        dataset="dataset",
+        revision="revision",
+        config="config",
+        split="split",
+        image=datasets["image"][0]["col"],
+        column="col",
+        filename="image.jpg",
+        row_idx=7,
+        format="JPEG",
+        public_assets_storage=public_assets_storage,
+    )
+    public_assets_storage.wait_for_uploads()
+    dir_key = "dataset/--/revision/--/config/split/7/col"
+    assert value == {
+        "src": f"{ASSETS_BASE_URL}/{dir_key}/image.jpg",
+        "height": 480,
+        "width": 640,
+        "thumbnail": {
+            "src": f"{ASSETS_BASE_URL}/{dir_key}/{expected_thumbnail_filename}",
+            "height": expected_height,
+            "width": expected_width,
+        },
+    }
+    thumbnail = PILImage.open(
+        f"{public_assets_storage.storage_client.get_base_directory()}/{dir_key}/{expected_thumbnail_filename}"
+    )
+    assert thumbnail.size == (expected_width, expected_height)
+
+
+def test_create_image_file_on_demand(
+    datasets: Mapping[str, Dataset], public_assets_storage: PublicAssetsStorage
+) -> None:
+    on_demand_assets = OnDemandAssets(url="http://localhost/on-demand-asset", signing_key="key")
+    public_assets_storage.on_demand_assets = on_demand_assets
+    public_assets_storage.thumbnail_max_size = 160
+    value = create_image_file(
+        dataset="dataset",
+        revision="revision",
+        config="config",
+        split="split",
+        image=datasets["image"][0]["col"],
+        column="col",
+        filename="image.jpg",
+        row_idx=7,
+        format="JPEG",
+        public_assets_storage=public_assets_storage,
+    )
+    assert value["height"] == 480
+    assert value["width"] == 640
+    assert value["thumbnail"]["height"] == 120  # type: ignore
+    assert value["thumbnail"]["width"] == 160  # type: ignore
+    dir_key = "dataset/--/revision/--/config/split/7/col"
+    for src, filename in [
+        (value["src"], "image.jpg"),
+        (value["thumbnail"]["src"], f"image-thumbnail-160{THUMBNAIL_EXTENSION}"),  # type: ignore
+    ]:
+        url, query = src.split("?")
+        assert url == on_demand_assets.url
+        params = dict(parse.parse_qsl(query))
+        assert params["row_idx"] == "7"
+        assert params["filename"] == filename
+        assert on_demand_assets.verify(object_key=f"{dir_key}/{filename}", signature=params["signature"])
+        assert not on_demand_assets.verify(object_key=f"{dir_key}/other.jpg", signature=params["signature"])
+    # no asset has been created
+    assert not public_assets_storage.storage_client.exists(dir_key)
+
+
+def test_create_image_file_on_demand_falls_back_to_png(public_assets_storage: PublicAssetsStorage) -> None:
+    public_assets_storage.on_demand_assets = OnDemandAssets(url="http://localhost/on-demand-asset", signing_key="key")
+    with pytest.raises(OSError):
+        create_image_file(
+            dataset="dataset",
+            revision="revision",
+            config="config",
+            split="split",
+            image=PILImage.new("RGBA", (10, 10)),
+            column="col",
+            filename="image.jpg",
+            row_idx=7,
+            format="JPEG",
+            public_assets_storage=public_assets_storage,
+        )
+
+
+def test_transcode_audio_file(shared_datadir: Path) -> None:
+    def get_cache_events(event: str) -> float:
+        return (
+            REGISTRY.get_sample_value("memory_cache_events_total", {"cache": "audio_transcoding", "event": event}) or 0
+        )
+
+    audio_file_bytes = (shared_datadir / "test_audio_44100.wav").read_bytes()
+    num_hits, num_misses = get_cache_events("hit"), get_cache_events("miss")
+    transcoded_audio_file_bytes = transcode_audio_file(
+        audio_file_bytes=audio_file_bytes, audio_file_extension=".wav", target_format="wav"
+    )
+    assert transcoded_audio_file_bytes[:4] == b"RIFF"
+    assert get_cache_events("miss") == num_misses + 1
+    # the same audio file is not converted again
+    assert (
+        transcode_audio_file(audio_file_bytes=audio_file_bytes, audio_file_extension=".wav", target_format="wav")
+        == transcoded_audio_file_bytes
+    )
+    assert get_cache_events("hit") == num_hits + 1
+    assert REGISTRY.get_sample_value("audio_transcoding_queue_size") == 0
+
+
+@pytest.mark.parametrize("broken_on", ["submit", "result"])
+def test_transcode_audio_file_with_broken_pool(
+    shared_datadir: Path, monkeypatch: pytest.MonkeyPatch, broken_on: str
+) -> None:
+    broken_executor = Mock(spec=ProcessPoolExecutor)
+    if broken_on == "submit":
+        broken_executor.submit.side_effect = BrokenProcessPool()
+    else:
+        broken_future: "Future[bytes]" = Future()
+        broken_future.set_exception(BrokenProcessPool())
+        broken_executor.submit.return_value = broken_future
+    monkeypatch.setattr(asset, "_audio_transcoding_executor", broken_executor)
+    monkeypatch.setattr(
+        asset, "_audio_transcoding_cache", SizedLRUCache(name="audio_transcoding", max_size=100_000_000, get_size=len)
+    )
+    queue_size = REGISTRY.get_sample_value("audio_transcoding_queue_size")
+
+    audio_file_bytes = (shared_datadir / "test_audio_44100.wav").read_bytes()
+    transcoded_audio_file_bytes = transcode_audio_file(
+        audio_file_bytes=audio_file_bytes, audio_file_extension=".wav", target_format="wav"
+    )
+    # the broken pool has been replaced, and the conversion retried in the new pool
+    assert transcoded_audio_file_bytes[:4] == b"RIFF"
+    broken_executor.shutdown.assert_called_once_with(wait=False)
+    assert asset._audio_transcoding_executor is not broken_executor
+    assert REGISTRY.get_sample_value("audio_transcoding_queue_size") == queue_size
+    assert not asset._audio_transcoding_in_flight
+
+
 @pytest.mark.parametrize(
     "dataset,config,split,column",
     [
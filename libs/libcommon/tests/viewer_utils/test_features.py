@@ -4,6 +4,7 @@
 import datetime
 import os
 from collections.abc import Mapping
+from io import BytesIO
 from pathlib import Path
 from typing import Any
 from unittest.mock import patch
@@ -15,12 +16,15 @@ import pytest
 from aiobotocore.response import StreamingBody
 from datasets import Audio, Dataset, Features, Image, Value
 from moto import mock_s3
+from PIL import Image as PILImage  # type: ignore
 from urllib3.response import HTTPHeaderDict  # type: ignore
 
 from libcommon.public_assets_storage import PublicAssetsStorage
 from libcommon.storage_client import StorageClient
 from libcommon.viewer_utils.features import (
+    CellContext,
     get_cell_value,
+    get_features_transform_plan,
     get_supported_unsupported_columns,
     infer_audio_file_extension,
 )
@@ -367,6 +371,52 @@ def test_others(
     )
     assert value == output_value
     assert_output_has_valid_files(output_value, public_assets_storage=public_assets_storage)
+    # compiled transform plan
+    plan = get_features_transform_plan(Features({"col": feature}))
+    context = CellContext(
+        dataset="dataset",
+        revision="revision",
+        config="config",
+        split="split",
+        public_assets_storage=public_assets_storage,
+    )
+    value = plan.transform_cell(featureName="col", cell=dataset[0]["col"], row_idx=7, context=context)
+    assert value == output_value
+
+
+@pytest.mark.parametrize(
+    "format,mode,passthrough,extension",
+    [
+        ("JPEG", "RGB", True, ".jpg"),
+        ("PNG", "RGBA", True, ".png"),
+        ("WEBP", "RGB", True, ".webp"),
+        ("BMP", "RGB", False, ".jpg"),
+        ("TIFF", "RGBA", False, ".png"),
+    ],
+)
+def test_image_bytes_passthrough(
+    format: str, mode: str, passthrough: bool, extension: str, public_assets_storage: PublicAssetsStorage
+) -> None:
+    buffer = BytesIO()
+    PILImage.new(mode, (16, 8)).save(buffer, format=format)
+    image_bytes = buffer.getvalue()
+    value = get_cell_value(
+        dataset="dataset",
+        revision="revision",
+        config="config",
+        split="split",
+        row_idx=7,
+        cell={"bytes": image_bytes, "path": None},
+        featureName="col",
+        fieldType=Image(),
+        public_assets_storage=public_assets_storage,
+    )
+    assert value == {"src": f"{ASSETS_BASE_URL_SPLIT}/7/col/image{extension}", "height": 8, "width": 16}
+    stored_bytes = (
+        Path(public_assets_storage.storage_client.get_base_directory())
+        / f"dataset/--/revision/--/config/split/7/col/image{extension}"
+    ).read_bytes()
+    assert (stored_bytes == image_bytes) == passthrough
 
 
 def test_get_supported_unsupported_columns() -> None:
@@ -388,6 +438,25 @@ def test_get_supported_unsupported_columns() -> None:
     assert unsupported_columns == ["audio1", "audio2", "audio3", "binary"]
 
 
+def test_get_features_transform_plan() -> None:
+    features = Features(
+        {
+            "image": Image(),
+            "images": {"a": [Image()], "b": Value("int32")},
+            "string": Value("string"),
+            "binary": Value("binary"),
+        }
+    )
+    plan = get_features_transform_plan(features)
+    assert list(plan.cell_transforms) == ["image", "images"]
+    assert plan.has_assets
+    assert plan.supported_columns == ["image", "images", "string"]
+    assert plan.unsupported_columns == ["binary"]
+    # the plan is compiled once for equal features
+    assert get_features_transform_plan(features.copy()) is plan
+    assert not get_features_transform_plan(Features({"string": Value("string")})).has_assets
+
+
 # specific test created for https://github.com/huggingface/datasets-server/issues/2045
 # which is reproduced only when using s3 for fsspec
 def test_ogg_audio_with_s3(
@@ -2,16 +2,25 @@
 # Copyright 2023 The HuggingFace Authors.
 
 import uvicorn
+from fsspec.implementations.http import HTTPFileSystem
 from libapi.config import UvicornConfig
 from libapi.jwt_token import get_jwt_public_keys
 from libapi.routes.healthcheck import healthcheck_endpoint
 from libapi.routes.metrics import create_metrics_endpoint
 from libapi.utils import EXPOSED_HEADERS
+from libcommon.blocks_cache import DiskBlocksCache
 from libcommon.log import init_logging
+from libcommon.parquet_utils import Indexer
 from libcommon.processing_graph import ProcessingGraph
+from libcommon.public_assets_storage import AssetsManifest, OnDemandAssets
 from libcommon.resources import CacheMongoResource, QueueMongoResource, Resource
-from libcommon.storage import exists, init_parquet_metadata_dir
+from libcommon.storage import (
+    exists,
+    init_parquet_blocks_cache_dir,
+    init_parquet_metadata_dir,
+)
 from libcommon.storage_client import StorageClient
+from libcommon.viewer_utils.features import UNSUPPORTED_FEATURES
 from starlette.applications import Starlette
 from starlette.middleware import Middleware
 from starlette.middleware.cors import CORSMiddleware
@@ -20,7 +29,8 @@ from starlette.routing import Route
 from starlette_prometheus import PrometheusMiddleware
 
 from rows.config import AppConfig
-from rows.routes.rows import create_rows_endpoint
+from rows.routes.on_demand_asset import create_on_demand_asset_endpoint
+from rows.routes.rows import ALL_COLUMNS_SUPPORTED_DATASETS_ALLOW_LIST, create_rows_endpoint
 
 
 def create_app() -> Starlette:
@@ -34,6 +44,16 @@ def create_app_with_config(app_config: AppConfig) -> Starlette:
     parquet_metadata_directory = init_parquet_metadata_dir(directory=app_config.parquet_metadata.storage_directory)
     if not exists(parquet_metadata_directory):
         raise RuntimeError("The parquet metadata storage directory could not be accessed. Exiting.")
+    blocks_cache = None
+    if app_config.rows_index.blocks_cache_max_bytes > 0:
+        blocks_cache_directory = init_parquet_blocks_cache_dir(directory=app_config.rows_index.blocks_cache_directory)
+        if not exists(blocks_cache_directory):
+            raise RuntimeError("The parquet blocks cache directory could not be accessed. Exiting.")
+        blocks_cache = DiskBlocksCache(
+            directory=blocks_cache_directory,
+            max_size=app_config.rows_index.blocks_cache_max_bytes,
+            block_size=app_config.rows_index.blocks_cache_block_size,
+        )
 
     processing_graph = ProcessingGraph(app_config.processing_graph)
     hf_jwt_public_keys = get_jwt_public_keys(
@@ -67,6 +87,36 @@ def create_app_with_config(app_config: AppConfig) -> Starlette:
         secret=app_config.s3.secret_access_key,
         client_kwargs={"region_name": app_config.s3.region_name},
     )
+    assets_manifest = (
+        AssetsManifest(
+            storage_client=storage_client,
+            max_keys=app_config.cached_assets.manifest_max_keys,
+            ttl_seconds=app_config.cached_assets.manifest_ttl_seconds,
+        )
+        if app_config.cached_assets.manifest_max_keys > 0
+        else None
+    )
+    on_demand_assets = (
+        OnDemandAssets(
+            url=app_config.cached_assets.on_demand_url, signing_key=app_config.cached_assets.url_signing_key
+        )
+        if app_config.cached_assets.on_demand_url and app_config.cached_assets.url_signing_key
+        else None
+    )
+    # shared by /rows and /on-demand-asset: one cache of indexes and row groups per process
+    indexer = Indexer(
+        processing_graph=processing_graph,
+        hf_token=app_config.common.hf_token,
+        parquet_metadata_directory=parquet_metadata_directory,
+        httpfs=HTTPFileSystem(headers={"authorization": f"Bearer {app_config.common.hf_token}"}),
+        max_arrow_data_in_memory=app_config.rows_index.max_arrow_data_in_memory,
+        indexes_cache_max_bytes=app_config.rows_index.indexes_cache_max_bytes,
+        row_groups_cache_max_bytes=app_config.rows_index.row_groups_cache_max_bytes,
+        blocks_cache=blocks_cache,
+        readahead_max_memory_percent=app_config.rows_index.readahead_max_memory_percent,
+        unsupported_features=UNSUPPORTED_FEATURES,
+        all_columns_supported_datasets_allow_list=ALL_COLUMNS_SUPPORTED_DATASETS_ALLOW_LIST,
+    )
     resources: list[Resource] = [cache_resource, queue_resource]
     if not cache_resource.is_available():
         raise RuntimeError("The connection to the cache database could not be established. Exiting.")
@@ -81,10 +131,13 @@ def create_app_with_config(app_config: AppConfig) -> Starlette:
             "/rows",
             endpoint=create_rows_endpoint(
                 processing_graph=processing_graph,
+                indexer=indexer,
                 cached_assets_base_url=app_config.cached_assets.base_url,
                 storage_client=storage_client,
-                parquet_metadata_directory=parquet_metadata_directory,
-                max_arrow_data_in_memory=app_config.rows_index.max_arrow_data_in_memory,
+                assets_manifest=assets_manifest,
+                upload_assets_in_background=app_config.cached_assets.upload_in_background,
+                thumbnail_max_size=app_config.cached_assets.thumbnail_max_size,
+                on_demand_assets=on_demand_assets,
                 hf_endpoint=app_config.common.hf_endpoint,
                 hf_token=app_config.common.hf_token,
                 blocked_datasets=app_config.common.blocked_datasets,
@@ -98,6 +151,22 @@ def create_app_with_config(app_config: AppConfig) -> Starlette:
             ),
         ),
     ]
+    if on_demand_assets is not None:
+        routes.append(
+            Route(
+                "/on-demand-asset",
+                endpoint=create_on_demand_asset_endpoint(
+                    indexer=indexer,
+                    cached_assets_base_url=app_config.cached_assets.base_url,
+                    storage_client=storage_client,
+                    on_demand_assets=on_demand_assets,
+                    assets_manifest=assets_manifest,
+                    thumbnail_max_size=app_config.cached_assets.thumbnail_max_size,
+                    max_age_long=app_config.api.max_age_long,
+                    max_age_short=app_config.api.max_age_short,
+                ),
+            )
+        )
 
     return Starlette(routes=routes, middleware=middleware, on_shutdown=[resource.release for resource in resources])
 
@@ -0,0 +1,179 @@
+# SPDX-License-Identifier: Apache-2.0
+# Copyright 2023 The HuggingFace Authors.
+
+import logging
+from typing import Any, Optional
+
+import anyio
+from libapi.exceptions import (
+    ApiError,
+    InvalidAssetSignatureError,
+    InvalidParameterError,
+    ResponseNotFoundError,
+    UnexpectedApiError,
+)
+from libapi.request import get_request_parameter
+from libapi.single_flight import SingleFlight
+from libapi.utils import Endpoint, get_json_api_error_response, get_redirect_response
+from libcommon.parquet_utils import Indexer, RowsIndex
+from libcommon.prometheus import StepProfiler
+from libcommon.public_assets_storage import (
+    AssetsManifest,
+    OnDemandAssets,
+    PublicAssetsStorage,
+)
+from libcommon.simple_cache import CachedArtifactError, CachedArtifactNotFoundError
+from libcommon.storage_client import StorageClient
+from libcommon.viewer_utils.asset import asset_exists, generate_asset_src
+from libcommon.viewer_utils.features import get_cell_value
+from starlette.requests import Request
+from starlette.responses import Response
+
+logger = logging.getLogger(__name__)
+
+
+def find_asset_src(value: Any, filename: str) -> Optional[str]:
+    """Find the URL of the asset in the transformed cell: a cell can contain several assets (e.g. a list of images),
+    and an image can have a thumbnail."""
+    if isinstance(value, dict):
+        src = value.get("src")
+        if isinstance(src, str) and src.endswith(f"/{filename}"):
+            return src
+        values = list(value.values())
+    elif isinstance(value, list):
+        values = value
+    else:
+        return None
+    for item in values:
+        src = find_asset_src(item, filename)
+        if src is not None:
+            return src
+    return None
+
+
+def create_on_demand_asset_endpoint(
+    indexer: Indexer,
+    cached_assets_base_url: str,
+    storage_client: StorageClient,
+    on_demand_assets: OnDemandAssets,
+    assets_manifest: Optional[AssetsManifest] = None,
+    thumbnail_max_size: int = 0,
+    max_age_long: int = 0,
+    max_age_short: int = 0,
+) -> Endpoint:
+    """Create the assets returned by /rows, /search and /filter in on-demand mode, when they are fetched.
+
+    The URL of an asset is signed by the API, so that the rows, and thus the assets, are only read for the URLs that
+    the API has returned to an authorized user. The asset is created from the cell in the parquet files (only one
+    row of one column is read), with the same object key as if it had been created by /rows, then the client is
+    redirected to the cached asset.
+
+    The indexer is the one of /rows, so that the row groups decoded for /rows are reused, and the memory budget of
+    the caches is shared.
+    """
+    public_assets_storage = PublicAssetsStorage(
+        assets_base_url=cached_assets_base_url,
+        overwrite=False,
+        storage_client=storage_client,
+        manifest=assets_manifest,
+        thumbnail_max_size=thumbnail_max_size,
+    )
+
+    # the browsers fetch the image and its thumbnail, or the same asset from several tabs, concurrently
+    single_flight = SingleFlight(endpoint="on_demand_asset")
+
+    def create_asset(rows_index: RowsIndex, row_idx: int, column: str, filename: str) -> Optional[str]:
+        # the parquet index is queried directly, without the readahead: the assets are fetched one by one, in no
+        # particular order, and must not be taken for the sequential pages of /rows
+        pa_table = rows_index.parquet_index.query(offset=row_idx, length=1, columns=[column])
+        if pa_table.num_rows == 0 or column not in pa_table.column_names:
+            return None
+        return find_asset_src(
+            get_cell_value(
+                dataset=rows_index.dataset,
+                revision=rows_index.revision,
+                config=rows_index.config,
+                split=rows_index.split,
+                row_idx=row_idx,
+                cell=pa_table.column(column)[0].as_py(),
+                featureName=column,
+                fieldType=rows_index.parquet_index.features[column],
+                public_assets_storage=public_assets_storage,
+            ),
+            filename,
+        )
+
+    async def on_demand_asset_endpoint(request: Request) -> Response:
+        await indexer.httpfs.set_session()
+        with StepProfiler(method="on_demand_asset_endpoint", step="all"):
+            try:
+                with StepProfiler(method="on_demand_asset_endpoint", step="validate parameters"):
+                    dataset = get_request_parameter(request, "dataset", required=True)
+                    revision = get_request_parameter(request, "revision", required=True)
+                    config = get_request_parameter(request, "config", required=True)
+                    split = get_request_parameter(request, "split", required=True)
+                    column = get_request_parameter(request, "column", required=True)
+                    filename = get_request_parameter(request, "filename", required=True)
+                    signature = get_request_parameter(request, "signature", required=True)
+                    try:
+                        row_idx = int(get_request_parameter(request, "row_idx", required=True))
+                    except ValueError as err:
+                        raise InvalidParameterError("Parameter 'row_idx' must be an integer") from err
+                    if row_idx < 0:
+                        raise InvalidParameterError("Parameter 'row_idx' must be positive")
+                    dir_path, src = generate_asset_src(
+                        base_url=cached_assets_base_url,
+                        dataset=dataset,
+                        revision=revision,
+                        config=config,
+                        split=split,
+                        row_idx=row_idx,
+                        column=column,
+                        filename=filename,
+                    )
+                    object_key = f"{dir_path}/{filename}"
+                    if not on_demand_assets.verify(object_key=object_key, signature=signature):
+                        raise InvalidAssetSignatureError("The signature of the asset URL is invalid.")
+                with StepProfiler(method="on_demand_asset_endpoint", step="check if the asset exists"):
+                    if await anyio.to_thread.run_sync(
+                        lambda: asset_exists(
+                            dataset=dataset,
+                            revision=revision,
+                            config=config,
+                            split=split,
+                            object_key=object_key,
+                            public_assets_storage=public_assets_storage,
+                        )
+                    ):
+                        return get_redirect_response(url=src, max_age=max_age_long)
+                logging.info(
+                    f"/on-demand-asset, dataset={dataset}, revision={revision}, config={config}, split={split},"
+                    f" row_idx={row_idx}, column={column}, filename={filename}"
+                )
+                with StepProfiler(method="on_demand_asset_endpoint", step="get row groups index"):
+                    try:
+                        rows_index = await anyio.to_thread.run_sync(indexer.get_rows_index, dataset, config, split)
+                    except (CachedArtifactError, CachedArtifactNotFoundError) as err:
+                        raise ResponseNotFoundError("The asset could not be found.") from err
+                    if rows_index.revision != revision:
+                        # the URL has been returned for a previous revision of the dataset
+                        raise ResponseNotFoundError("The asset could not be found.")
+                    if (
+                        column not in rows_index.parquet_index.features
+                        or column in rows_index.parquet_index.unsupported_columns
+                    ):
+                        raise ResponseNotFoundError("The asset could not be found.")
+                with StepProfiler(method="on_demand_asset_endpoint", step="create the asset"):
+                    created_src = await single_flight.run(
+                        key=(dataset, revision, config, split, row_idx, column),
+                        fn=lambda: anyio.to_thread.run_sync(create_asset, rows_index, row_idx, column, filename),
+                    )
+                if created_src is None:
+                    raise ResponseNotFoundError("The asset could not be found.")
+                return get_redirect_response(url=created_src, max_age=max_age_long)
+            except Exception as e:
+                error = e if isinstance(e, ApiError) else UnexpectedApiError("Unexpected error.", e)
+                with StepProfiler(method="on_demand_asset_endpoint", step="generate API error response"):
+                    return get_json_api_error_response(error=error, max_age=max_age_short)
+
+    return on_demand_asset_endpoint
@@ -4,29 +4,37 @@
 import logging
 from typing import Literal, Optional, Union
 
-from fsspec.implementations.http import HTTPFileSystem
+import anyio
+import pyarrow as pa
+from datasets import Features
 from libapi.authentication import auth_check
 from libapi.exceptions import ApiError, TooBigContentError, UnexpectedApiError
 from libapi.request import (
     get_request_parameter,
+    get_request_parameter_columns,
+    get_request_parameter_format,
     get_request_parameter_length,
     get_request_parameter_offset,
+    select_columns,
 )
-from libapi.response import create_response
+from libapi.response import create_response, create_table
+from libapi.single_flight import SingleFlight
 from libapi.utils import (
+    VARY_ACCEPT_HEADERS,
     Endpoint,
     get_json_api_error_response,
     get_json_error_response,
     get_json_ok_response,
+    get_table_ok_response,
     try_backfill_dataset_then_raise,
 )
-from libcommon.parquet_utils import Indexer, TooBigRows
+from libcommon.parquet_utils import Indexer, RowsIndex, TooBigRows
 from libcommon.processing_graph import ProcessingGraph
 from libcommon.prometheus import StepProfiler
+from libcommon.public_assets_storage import AssetsManifest, OnDemandAssets
 from libcommon.simple_cache import CachedArtifactError, CachedArtifactNotFoundError
-from libcommon.storage import StrPath
 from libcommon.storage_client import StorageClient
-from libcommon.viewer_utils.features import UNSUPPORTED_FEATURES
+from libcommon.utils import PaginatedResponse
 from starlette.requests import Request
 from starlette.responses import Response
 
@@ -38,11 +46,10 @@ ALL_COLUMNS_SUPPORTED_DATASETS_ALLOW_LIST: Union[Literal["all"], list[str]] = ["
 
 def create_rows_endpoint(
     processing_graph: ProcessingGraph,
+    indexer: Indexer,
     cached_assets_base_url: str,
     storage_client: StorageClient,
-    parquet_metadata_directory: StrPath,
     cache_max_days: int,
-    max_arrow_data_in_memory: int,
     hf_endpoint: str,
     blocked_datasets: list[str],
     hf_token: Optional[str] = None,
@@ -52,16 +59,64 @@ def create_rows_endpoint(
     hf_timeout_seconds: Optional[float] = None,
     max_age_long: int = 0,
     max_age_short: int = 0,
+    assets_manifest: Optional[AssetsManifest] = None,
+    upload_assets_in_background: bool = False,
+    thumbnail_max_size: int = 0,
+    on_demand_assets: Optional[OnDemandAssets] = None,
 ) -> Endpoint:
-    indexer = Indexer(
-        processing_graph=processing_graph,
-        hf_token=hf_token,
-        parquet_metadata_directory=parquet_metadata_directory,
-        httpfs=HTTPFileSystem(headers={"authorization": f"Bearer {hf_token}"}),
-        max_arrow_data_in_memory=max_arrow_data_in_memory,
-        unsupported_features=UNSUPPORTED_FEATURES,
-        all_columns_supported_datasets_allow_list=ALL_COLUMNS_SUPPORTED_DATASETS_ALLOW_LIST,
-    )
+    single_flight = SingleFlight(endpoint="rows")
+
+    async def get_content(
+        rows_index: RowsIndex,
+        offset: int,
+        length: int,
+        columns: Optional[list[str]],
+        format: Literal["json", "arrow", "parquet"],
+        features: Features,
+        unsupported_columns: list[str],
+    ) -> Union[PaginatedResponse, pa.Table]:
+        with StepProfiler(method="rows_endpoint", step="query the rows"):
+            try:
+                pa_table = await anyio.to_thread.run_sync(rows_index.query, offset, length, columns)
+            except TooBigRows as err:
+                raise TooBigContentError(str(err)) from None
+        if format != "json":
+            with StepProfiler(method="rows_endpoint", step="transform the table"):
+                return await create_table(
+                    dataset=rows_index.dataset,
+                    revision=rows_index.revision,
+                    config=rows_index.config,
+                    split=rows_index.split,
+                    cached_assets_base_url=cached_assets_base_url,
+                    storage_client=storage_client,
+                    assets_manifest=assets_manifest,
+                    upload_assets_in_background=upload_assets_in_background,
+                    thumbnail_max_size=thumbnail_max_size,
+                    on_demand_assets=on_demand_assets,
+                    pa_table=pa_table,
+                    offset=offset,
+                    features=features,
+                    unsupported_columns=unsupported_columns,
+                )
+        with StepProfiler(method="rows_endpoint", step="transform to a list"):
+            return await create_response(
+                dataset=rows_index.dataset,
+                revision=rows_index.revision,
+                config=rows_index.config,
+                split=rows_index.split,
+                cached_assets_base_url=cached_assets_base_url,
+                storage_client=storage_client,
+                assets_manifest=assets_manifest,
+                upload_assets_in_background=upload_assets_in_background,
+                thumbnail_max_size=thumbnail_max_size,
+                on_demand_assets=on_demand_assets,
+                pa_table=pa_table,
+                offset=offset,
+                features=features,
+                unsupported_columns=unsupported_columns,
+                partial=rows_index.parquet_index.partial,
+                num_rows_total=rows_index.parquet_index.num_rows_total,
+            )
 
     async def rows_endpoint(request: Request) -> Response:
         await indexer.httpfs.set_session()
@@ -74,8 +129,11 @@ def create_rows_endpoint(
                     split = get_request_parameter(request, "split", required=True)
                     offset = get_request_parameter_offset(request)
                     length = get_request_parameter_length(request)
+                    columns = get_request_parameter_columns(request)
+                    format = get_request_parameter_format(request)
                     logging.info(
-                        f"/rows, dataset={dataset}, config={config}, split={split}, offset={offset}, length={length}"
+                        f"/rows, dataset={dataset}, config={config}, split={split}, offset={offset}, length={length},"
+                        f" columns={columns}, format={format}"
                     )
                 with StepProfiler(method="rows_endpoint", step="check authentication"):
                     # if auth_check fails, it will raise an exception that will be caught below
@@ -88,33 +146,42 @@ def create_rows_endpoint(
                         hf_timeout_seconds=hf_timeout_seconds,
                     )
                 try:
+                    # the index (mongo lookups and parquet metadata loading) and the query (remote parquet reads) are
+                    # blocking: run them in a thread to not block the event loop and the other requests
                     with StepProfiler(method="rows_endpoint", step="get row groups index"):
-                        rows_index = indexer.get_rows_index(
-                            dataset=dataset,
-                            config=config,
-                            split=split,
+                        # the identical concurrent requests share the same index, and the same content (single-flight)
+                        rows_index = await single_flight.run(
+                            key=("index", dataset, config, split),
+                            fn=lambda: anyio.to_thread.run_sync(indexer.get_rows_index, dataset, config, split),
                         )
                         revision = rows_index.revision
-                    with StepProfiler(method="rows_endpoint", step="query the rows"):
-                        try:
-                            pa_table = rows_index.query(offset=offset, length=length)
-                        except TooBigRows as err:
-                            raise TooBigContentError(str(err)) from None
-                    with StepProfiler(method="rows_endpoint", step="transform to a list"):
-                        response = await create_response(
-                            dataset=dataset,
-                            revision=revision,
-                            config=config,
-                            split=split,
-                            cached_assets_base_url=cached_assets_base_url,
-                            storage_client=storage_client,
-                            pa_table=pa_table,
+                    with StepProfiler(method="rows_endpoint", step="select the columns"):
+                        features = select_columns(rows_index.parquet_index.features, columns)
+                        unsupported_columns = [
+                            column for column in rows_index.parquet_index.unsupported_columns if column in features
+                        ]
+                    rows_content = await single_flight.run(
+                        key=(
+                            "content",
+                            dataset,
+                            config,
+                            split,
+                            revision,
+                            offset,
+                            length,
+                            None if columns is None else tuple(columns),
+                            format,
+                        ),
+                        fn=lambda: get_content(
+                            rows_index=rows_index,
                             offset=offset,
-                            features=rows_index.parquet_index.features,
-                            unsupported_columns=rows_index.parquet_index.unsupported_columns,
-                            partial=rows_index.parquet_index.partial,
-                            num_rows_total=rows_index.parquet_index.num_rows_total,
-                        )
+                            length=length,
+                            columns=columns,
+                            format=format,
+                            features=features,
+                            unsupported_columns=unsupported_columns,
+                        ),
+                    )
                 except CachedArtifactNotFoundError:
                     config_parquet_processing_steps = processing_graph.get_config_parquet_processing_steps()
                     config_parquet_metadata_processing_steps = (
@@ -133,7 +200,20 @@ def create_rows_endpoint(
                             blocked_datasets=blocked_datasets,
                         )
                 with StepProfiler(method="rows_endpoint", step="generate the OK response"):
-                    return get_json_ok_response(content=response, max_age=max_age_long, revision=revision)
+                    if isinstance(rows_content, pa.Table):
+                        return get_table_ok_response(
+                            pa_table=rows_content,
+                            format=format,  # type: ignore
+                            max_age=max_age_long,
+                            revision=revision,
+                            headers={
+                                "X-Num-Rows-Total": str(rows_index.parquet_index.num_rows_total),
+                                "X-Partial": str(rows_index.parquet_index.partial).lower(),
+                            },
+                        )
+                    return get_json_ok_response(
+                        content=rows_content, max_age=max_age_long, revision=revision, headers=VARY_ACCEPT_HEADERS
+                    )
             except CachedArtifactError as e:
                 content = e.cache_entry_with_details["content"]
                 http_status = e.cache_entry_with_details["http_status"]
@@ -144,10 +224,13 @@ def create_rows_endpoint(
                     max_age=max_age_short,
                     error_code=error_code,
                     revision=revision,
+                    headers=VARY_ACCEPT_HEADERS,
                 )
             except Exception as e:
                 error = e if isinstance(e, ApiError) else UnexpectedApiError("Unexpected error.", e)
                 with StepProfiler(method="rows_endpoint", step="generate API error response"):
-                    return get_json_api_error_response(error=error, max_age=max_age_short, revision=revision)
+                    return get_json_api_error_response(
+                        error=error, max_age=max_age_short, revision=revision, headers=VARY_ACCEPT_HEADERS
+                    )
 
     return rows_endpoint
@@ -0,0 +1,148 @@
+# SPDX-License-Identifier: Apache-2.0
+# Copyright 2023 The HuggingFace Authors.
+
+from collections.abc import Iterator
+from io import BytesIO
+from pathlib import Path
+from unittest.mock import Mock, patch
+
+import httpx
+import pyarrow as pa
+import pytest
+from datasets import Features, Image
+from fsspec.implementations.http import HTTPFileSystem
+from libcommon.parquet_utils import Indexer, RowsIndex
+from libcommon.processing_graph import ProcessingGraph
+from libcommon.public_assets_storage import OnDemandAssets
+from libcommon.storage_client import StorageClient
+from libcommon.viewer_utils.asset import THUMBNAIL_EXTENSION
+from PIL import Image as PILImage  # type: ignore
+from starlette.applications import Starlette
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from rows.routes.on_demand_asset import create_on_demand_asset_endpoint
+
+CACHED_ASSETS_BASE_URL = "http://localhost/cached-assets"
+THUMBNAIL_MAX_SIZE = 16
+DATASET, REVISION, CONFIG, SPLIT, COLUMN = "dataset", "revision", "config", "split", "image"
+SPLIT_DIR_PATH = f"{DATASET}/--/{REVISION}/--/{CONFIG}/{SPLIT}"
+IMAGE_FILENAME = "image.png"
+THUMBNAIL_FILENAME = f"image-thumbnail-{THUMBNAIL_MAX_SIZE}{THUMBNAIL_EXTENSION}"
+
+
+@pytest.fixture
+def storage_client(tmp_path: Path) -> StorageClient:
+    return StorageClient(protocol="file", root=str(tmp_path), folder="cached-assets")
+
+
+@pytest.fixture
+def on_demand_assets() -> OnDemandAssets:
+    return OnDemandAssets(url="http://localhost/on-demand-asset", signing_key="secret")
+
+
+@pytest.fixture
+def rows_index() -> Iterator[Mock]:
+    buffer = BytesIO()
+    PILImage.new("RGB", (32, 32)).save(buffer, format="PNG")
+    rows_index = Mock(
+        spec=RowsIndex,
+        dataset=DATASET,
+        revision=REVISION,
+        config=CONFIG,
+        split=SPLIT,
+        parquet_index=Mock(features=Features({COLUMN: Image()}), unsupported_columns=[]),
+    )
+    rows_index.parquet_index.query.return_value = pa.table({COLUMN: [{"bytes": buffer.getvalue(), "path": None}]})
+    with patch("libcommon.parquet_utils.Indexer.get_rows_index", return_value=rows_index):
+        yield rows_index
+
+
+@pytest.fixture
+def client(
+    tmp_path: Path, processing_graph: ProcessingGraph, storage_client: StorageClient, on_demand_assets: OnDemandAssets
+) -> TestClient:
+    indexer = Indexer(
+        processing_graph=processing_graph,
+        parquet_metadata_directory=str(tmp_path),
+        httpfs=HTTPFileSystem(),
+        max_arrow_data_in_memory=10_000_000,
+    )
+    endpoint = create_on_demand_asset_endpoint(
+        indexer=indexer,
+        cached_assets_base_url=CACHED_ASSETS_BASE_URL,
+        storage_client=storage_client,
+        on_demand_assets=on_demand_assets,
+        thumbnail_max_size=THUMBNAIL_MAX_SIZE,
+    )
+    return TestClient(Starlette(routes=[Route("/on-demand-asset", endpoint=endpoint)]))
+
+
+def get_on_demand_asset(
+    client: TestClient, on_demand_assets: OnDemandAssets, filename: str, revision: str = REVISION, row_idx: int = 0
+) -> httpx.Response:
+    object_key = f"{DATASET}/--/{revision}/--/{CONFIG}/{SPLIT}/{row_idx}/{COLUMN}/{filename}"
+    return client.get(
+        "/on-demand-asset",
+        params={
+            "dataset": DATASET,
+            "revision": revision,
+            "config": CONFIG,
+            "split": SPLIT,
+            "row_idx": str(row_idx),
+            "column": COLUMN,
+            "filename": filename,
+            "signature": on_demand_assets.sign(object_key),
+        },
+        follow_redirects=False,
+    )
+
+
+def test_on_demand_asset_invalid_signature(client: TestClient, rows_index: Mock) -> None:
+    response = get_on_demand_asset(
+        client, OnDemandAssets(url="http://localhost/on-demand-asset", signing_key="other"), IMAGE_FILENAME
+    )
+    assert response.status_code == 403
+    assert response.headers["X-Error-Code"] == "InvalidAssetSignature"
+    rows_index.parquet_index.query.assert_not_called()
+
+
+def test_on_demand_asset_exists(
+    client: TestClient, on_demand_assets: OnDemandAssets, storage_client: StorageClient, rows_index: Mock
+) -> None:
+    object_key = f"{SPLIT_DIR_PATH}/0/{COLUMN}/{IMAGE_FILENAME}"
+    storage_client.upload(object_key=object_key, data=b"already there").result()
+    response = get_on_demand_asset(client, on_demand_assets, IMAGE_FILENAME)
+    assert response.status_code == 302
+    assert response.headers["Location"] == f"{CACHED_ASSETS_BASE_URL}/{object_key}"
+    # the rows are not read
+    rows_index.parquet_index.query.assert_not_called()
+
+
+def test_on_demand_asset_revision_mismatch(
+    client: TestClient, on_demand_assets: OnDemandAssets, rows_index: Mock
+) -> None:
+    # the URL has been returned for a previous revision of the dataset
+    response = get_on_demand_asset(client, on_demand_assets, IMAGE_FILENAME, revision="previous_revision")
+    assert response.status_code == 404
+    assert response.headers["X-Error-Code"] == "ResponseNotFound"
+    rows_index.parquet_index.query.assert_not_called()
+
+
+@pytest.mark.parametrize("filename", [IMAGE_FILENAME, THUMBNAIL_FILENAME])
+def test_on_demand_asset_is_created(
+    client: TestClient,
+    on_demand_assets: OnDemandAssets,
+    storage_client: StorageClient,
+    rows_index: Mock,
+    filename: str,
+) -> None:
+    object_key = f"{SPLIT_DIR_PATH}/3/{COLUMN}/{filename}"
+    assert not storage_client.exists(object_key)
+    response = get_on_demand_asset(client, on_demand_assets, filename, row_idx=3)
+    assert response.status_code == 302
+    assert response.headers["Location"] == f"{CACHED_ASSETS_BASE_URL}/{object_key}"
+    rows_index.parquet_index.query.assert_called_once_with(offset=3, length=1, columns=[COLUMN])
+    # the image and its thumbnail are created
+    assert storage_client.exists(f"{SPLIT_DIR_PATH}/3/{COLUMN}/{IMAGE_FILENAME}")
+    assert storage_client.exists(f"{SPLIT_DIR_PATH}/3/{COLUMN}/{THUMBNAIL_FILENAME}")
@@ -3,12 +3,14 @@
 
 import uvicorn
 from libapi.config import UvicornConfig
+from libapi.duckdb import DuckDBIndexFilesCache
 from libapi.jwt_token import get_jwt_public_keys
 from libapi.routes.healthcheck import healthcheck_endpoint
 from libapi.routes.metrics import create_metrics_endpoint
 from libapi.utils import EXPOSED_HEADERS
 from libcommon.log import init_logging
 from libcommon.processing_graph import ProcessingGraph
+from libcommon.public_assets_storage import AssetsManifest, OnDemandAssets
 from libcommon.resources import CacheMongoResource, QueueMongoResource, Resource
 from libcommon.storage import exists, init_duckdb_index_cache_dir
 from libcommon.storage_client import StorageClient
@@ -20,6 +22,8 @@ from starlette.routing import Route
 from starlette_prometheus import PrometheusMiddleware
 
 from search.config import AppConfig
+from search.duckdb_connection import DuckDBConnectionPool
+from search.query_scheduler import QueryScheduler
 from search.routes.filter import create_filter_endpoint
 from search.routes.search import create_search_endpoint
 
@@ -68,6 +72,46 @@ def create_app_with_config(app_config: AppConfig) -> Starlette:
         folder=app_config.cached_assets.folder_name,
         client_kwargs={"region_name": app_config.s3.region_name},
     )
+    assets_manifest = (
+        AssetsManifest(
+            storage_client=storage_client,
+            max_keys=app_config.cached_assets.manifest_max_keys,
+            ttl_seconds=app_config.cached_assets.manifest_ttl_seconds,
+        )
+        if app_config.cached_assets.manifest_max_keys > 0
+        else None
+    )
+    on_demand_assets = (
+        OnDemandAssets(
+            url=app_config.cached_assets.on_demand_url, signing_key=app_config.cached_assets.url_signing_key
+        )
+        if app_config.cached_assets.on_demand_url and app_config.cached_assets.url_signing_key
+        else None
+    )
+    index_files_cache = (
+        DuckDBIndexFilesCache(
+            directory=duckdb_index_cache_directory, max_bytes=app_config.duckdb_index.cache_max_bytes
+        )
+        if app_config.duckdb_index.cache_max_bytes > 0
+        else None
+    )
+    # also used if connections_max_open is 0, to apply the connection settings to the unpooled connections
+    duckdb_connection_pool = DuckDBConnectionPool(
+        max_connections=app_config.duckdb_index.connections_max_open,
+        idle_timeout_seconds=app_config.duckdb_index.connections_idle_timeout_seconds,
+        threads=app_config.duckdb_index.connection_threads,
+        memory_limit=app_config.duckdb_index.connection_memory_limit,
+    )
+    # shared by /search and /filter, since the queries use the same CPU and memory
+    query_scheduler = (
+        QueryScheduler(
+            max_concurrent_queries=app_config.duckdb_index.max_concurrent_queries,
+            queue_timeout_seconds=app_config.duckdb_index.queries_queue_timeout_seconds,
+            query_timeout_seconds=app_config.duckdb_index.query_timeout_seconds,
+        )
+        if app_config.duckdb_index.max_concurrent_queries > 0
+        else None
+    )
     resources: list[Resource] = [cache_resource, queue_resource]
     if not cache_resource.is_available():
         raise RuntimeError("The connection to the cache database could not be established. Exiting.")
@@ -84,6 +128,15 @@ def create_app_with_config(app_config: AppConfig) -> Starlette:
                 duckdb_index_file_directory=duckdb_index_cache_directory,
                 cached_assets_base_url=app_config.cached_assets.base_url,
                 storage_client=storage_client,
+                assets_manifest=assets_manifest,
+                upload_assets_in_background=app_config.cached_assets.upload_in_background,
+                thumbnail_max_size=app_config.cached_assets.thumbnail_max_size,
+                on_demand_assets=on_demand_assets,
+                duckdb_connection_pool=duckdb_connection_pool,
+                num_rows_total_cache_max_size=app_config.duckdb_index.num_rows_total_cache_max_entries,
+                index_files_cache=index_files_cache,
+                ranked_results_cache_max_bytes=app_config.duckdb_index.ranked_results_cache_max_bytes,
+                query_scheduler=query_scheduler,
                 cache_max_days=app_config.cache.max_days,
                 target_revision=app_config.duckdb_index.target_revision,
                 hf_endpoint=app_config.common.hf_endpoint,
@@ -106,6 +159,14 @@ def create_app_with_config(app_config: AppConfig) -> Starlette:
                 target_revision=app_config.duckdb_index.target_revision,
                 cached_assets_base_url=app_config.cached_assets.base_url,
                 storage_client=storage_client,
+                assets_manifest=assets_manifest,
+                upload_assets_in_background=app_config.cached_assets.upload_in_background,
+                thumbnail_max_size=app_config.cached_assets.thumbnail_max_size,
+                on_demand_assets=on_demand_assets,
+                duckdb_connection_pool=duckdb_connection_pool,
+                num_rows_total_cache_max_size=app_config.duckdb_index.num_rows_total_cache_max_entries,
+                index_files_cache=index_files_cache,
+                query_scheduler=query_scheduler,
                 hf_endpoint=app_config.common.hf_endpoint,
                 hf_token=app_config.common.hf_token,
                 blocked_datasets=app_config.common.blocked_datasets,
@@ -120,7 +181,10 @@ def create_app_with_config(app_config: AppConfig) -> Starlette:
         ),
     ]
 
-    return Starlette(routes=routes, middleware=middleware, on_shutdown=[resource.release for resource in resources])
+    on_shutdown = [resource.release for resource in resources]
+    on_shutdown.append(duckdb_connection_pool.close)
+
+    return Starlette(routes=routes, middleware=middleware, on_shutdown=on_shutdown)
 
 
 def start() -> None:
@@ -17,13 +17,33 @@ from libcommon.config import (
 )
 
 DUCKDB_INDEX_CACHE_DIRECTORY = None
+DUCKDB_INDEX_CACHE_MAX_BYTES = 0
 DUCKDB_INDEX_TARGET_REVISION = "refs/convert/parquet"
+DUCKDB_INDEX_CONNECTIONS_MAX_OPEN = 32
+DUCKDB_INDEX_CONNECTIONS_IDLE_TIMEOUT_SECONDS = 300
+DUCKDB_INDEX_NUM_ROWS_TOTAL_CACHE_MAX_ENTRIES = 10_000
+DUCKDB_INDEX_RANKED_RESULTS_CACHE_MAX_BYTES = 50_000_000
+DUCKDB_INDEX_MAX_CONCURRENT_QUERIES = 8
+DUCKDB_INDEX_QUERIES_QUEUE_TIMEOUT_SECONDS = 10
+DUCKDB_INDEX_QUERY_TIMEOUT_SECONDS = 30
+DUCKDB_INDEX_CONNECTION_THREADS = 0
+DUCKDB_INDEX_CONNECTION_MEMORY_LIMIT = None
 
 
 @dataclass(frozen=True)
 class DuckDbIndexConfig:
     cache_directory: Optional[str] = DUCKDB_INDEX_CACHE_DIRECTORY
+    cache_max_bytes: int = DUCKDB_INDEX_CACHE_MAX_BYTES
     target_revision: str = DUCKDB_INDEX_TARGET_REVISION
+    connections_max_open: int = DUCKDB_INDEX_CONNECTIONS_MAX_OPEN
+    connections_idle_timeout_seconds: int = DUCKDB_INDEX_CONNECTIONS_IDLE_TIMEOUT_SECONDS
+    num_rows_total_cache_max_entries: int = DUCKDB_INDEX_NUM_ROWS_TOTAL_CACHE_MAX_ENTRIES
+    ranked_results_cache_max_bytes: int = DUCKDB_INDEX_RANKED_RESULTS_CACHE_MAX_BYTES
+    max_concurrent_queries: int = DUCKDB_INDEX_MAX_CONCURRENT_QUERIES
+    queries_queue_timeout_seconds: float = DUCKDB_INDEX_QUERIES_QUEUE_TIMEOUT_SECONDS
+    query_timeout_seconds: float = DUCKDB_INDEX_QUERY_TIMEOUT_SECONDS
+    connection_threads: int = DUCKDB_INDEX_CONNECTION_THREADS
+    connection_memory_limit: Optional[str] = DUCKDB_INDEX_CONNECTION_MEMORY_LIMIT
 
     @classmethod
     def from_env(cls) -> "DuckDbIndexConfig":
@@ -31,7 +51,31 @@ class DuckDbIndexConfig:
         with env.prefixed("DUCKDB_INDEX_"):
             return cls(
                 cache_directory=env.str(name="CACHE_DIRECTORY", default=DUCKDB_INDEX_CACHE_DIRECTORY),
+                cache_max_bytes=env.int(name="CACHE_MAX_BYTES", default=DUCKDB_INDEX_CACHE_MAX_BYTES),
                 target_revision=env.str(name="TARGET_REVISION", default=DUCKDB_INDEX_TARGET_REVISION),
+                connections_max_open=env.int(name="CONNECTIONS_MAX_OPEN", default=DUCKDB_INDEX_CONNECTIONS_MAX_OPEN),
+                connections_idle_timeout_seconds=env.int(
+                    name="CONNECTIONS_IDLE_TIMEOUT_SECONDS", default=DUCKDB_INDEX_CONNECTIONS_IDLE_TIMEOUT_SECONDS
+                ),
+                num_rows_total_cache_max_entries=env.int(
+                    name="NUM_ROWS_TOTAL_CACHE_MAX_ENTRIES", default=DUCKDB_INDEX_NUM_ROWS_TOTAL_CACHE_MAX_ENTRIES
+                ),
+                ranked_results_cache_max_bytes=env.int(
+                    name="RANKED_RESULTS_CACHE_MAX_BYTES", default=DUCKDB_INDEX_RANKED_RESULTS_CACHE_MAX_BYTES
+                ),
+                max_concurrent_queries=env.int(
+                    name="MAX_CONCURRENT_QUERIES", default=DUCKDB_INDEX_MAX_CONCURRENT_QUERIES
+                ),
+                queries_queue_timeout_seconds=env.float(
+                    name="QUERIES_QUEUE_TIMEOUT_SECONDS", default=DUCKDB_INDEX_QUERIES_QUEUE_TIMEOUT_SECONDS
+                ),
+                query_timeout_seconds=env.float(
+                    name="QUERY_TIMEOUT_SECONDS", default=DUCKDB_INDEX_QUERY_TIMEOUT_SECONDS
+                ),
+                connection_threads=env.int(name="CONNECTION_THREADS", default=DUCKDB_INDEX_CONNECTION_THREADS),
+                connection_memory_limit=env.str(
+                    name="CONNECTION_MEMORY_LIMIT", default=DUCKDB_INDEX_CONNECTION_MEMORY_LIMIT
+                ),
             )
 
 
@@ -1,10 +1,286 @@
-from typing import Any
+# SPDX-License-Identifier: Apache-2.0
+# Copyright 2023 The HuggingFace Authors.
+
+import logging
+import os
+import time
+from collections import OrderedDict
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from threading import Condition, Lock, local
+from typing import Any, Optional
 
 import duckdb
+from libcommon.memory_cache import SizedLRUCache
+from libcommon.prometheus import DUCKDB_CONNECTIONS_OPEN, MEMORY_CACHE_EVENTS_TOTAL
+
+DUCKDB_CONNECTIONS_CACHE_NAME = "duckdb_connections"
+
+# (index file location, index file id, query or where clause) -> total number of results
+NumRowsTotalKey = tuple[str, tuple[int, int], str]
+NumRowsTotalCache = SizedLRUCache[NumRowsTotalKey, int]
 
 
-def duckdb_connect(**kwargs: Any) -> duckdb.DuckDBPyConnection:
+def duckdb_connect(threads: int = 0, memory_limit: Optional[str] = None, **kwargs: Any) -> duckdb.DuckDBPyConnection:
     con = duckdb.connect(read_only=True, **kwargs)
+    # the resources are limited per connection, before the configuration is locked
+    if threads > 0:
+        con.sql(f"SET threads={threads};")
+    if memory_limit:
+        con.sql(f"SET memory_limit='{memory_limit}';")
     con.sql("SET enable_external_access=false;")
     con.sql("SET lock_configuration=true;")
     return con
+
+
+def get_file_id(database: str) -> tuple[int, int]:
+    # the modification time is not used, since the index files are touched on every request
+    stat = os.stat(database)
+    return stat.st_dev, stat.st_ino
+
+
+def is_same_file(database: str, file_id: tuple[int, int]) -> bool:
+    try:
+        return get_file_id(database) == file_id
+    except OSError:
+        # the file has been deleted
+        return False
+
+
+def get_num_rows_total_key(database: str, query: str) -> NumRowsTotalKey:
+    # the file id changes if the index file is downloaded again
+    return database, get_file_id(database), query
+
+
+class RunningQuery:
+    """The connections used by a query, run in a worker thread, to interrupt them if the query takes too long."""
+
+    def __init__(self) -> None:
+        self.interrupted = False
+        self._connections: list[duckdb.DuckDBPyConnection] = []
+        self._lock = Lock()
+
+    def add(self, con: duckdb.DuckDBPyConnection) -> None:
+        with self._lock:
+            if self.interrupted:
+                raise duckdb.InterruptException("The query has been interrupted")
+            self._connections.append(con)
+
+    def remove(self, con: duckdb.DuckDBPyConnection) -> None:
+        with self._lock:
+            self._connections.remove(con)
+
+    def interrupt(self) -> None:
+        with self._lock:
+            self.interrupted = True
+            for con in self._connections:
+                # only supported by duckdb>=0.9: with the previous versions, the running query is not interrupted,
+                # but the query cannot open a new connection anymore
+                if hasattr(con, "interrupt"):
+                    con.interrupt()
+
+
+# the query run by the current thread, if any
+_current = local()
+
+
+@contextmanager
+def running_query(query: RunningQuery) -> Iterator[None]:
+    """Register the connections opened by the current thread with `connect`, in the query."""
+    _current.query = query
+    try:
+        yield
+    finally:
+        _current.query = None
+
+
+@contextmanager
+def connect(
+    database: str, connection_pool: Optional["DuckDBConnectionPool"] = None
+) -> Iterator[duckdb.DuckDBPyConnection]:
+    """Get a read-only connection to the index file, from the pool if any. The connection can be interrupted if it is
+    used by a running query."""
+    with (
+        duckdb_connect(database=database) if connection_pool is None else connection_pool.connection(database=database)
+    ) as con:
+        query: Optional[RunningQuery] = getattr(_current, "query", None)
+        if query is None:
+            yield con
+            return
+        query.add(con)
+        try:
+            yield con
+        finally:
+            query.remove(con)
+
+
+@dataclass
+class _IdleConnections:
+    file_id: tuple[int, int]
+    # the idle connections, with the time when they were released, the most recently released last
+    connections: list[tuple[duckdb.DuckDBPyConnection, float]] = field(default_factory=list)
+
+
+class DuckDBConnectionPool:
+    """
+    A per-process pool of read-only connections to the duckdb index files, to avoid loading the catalog and the FTS
+    index metadata of the file on every request.
+
+    A duckdb connection must not be used by two threads at the same time: a connection is either in use by one
+    request, or idle in the pool. Once released, it can be reused by the next request on the same file.
+
+    At most `max_connections` connections are open at the same time: when the limit is reached, the least recently
+    used idle connection (of any file) is closed, or the caller waits until a connection is released. The idle
+    connections are closed after `idle_timeout_seconds`. If `max_connections` is 0, the connections are not pooled: a
+    new connection, with the same `threads` and `memory_limit` settings, is opened for every request and closed after
+    use.
+
+    An index file can be deleted (e.g. by the clean_directory job) and downloaded again while its connections are
+    idle: the connections are bound to the file that was open, so they are closed, instead of being reused, if the
+    file at the path is not the same anymore. The idle connections of the deleted files are closed on the next request
+    to the pool (whatever the file), to free their disk space without waiting for `idle_timeout_seconds`.
+
+    Args:
+        max_connections (int): The maximum number of open connections (and thus of open index files). If 0, the
+          connections are not pooled.
+        idle_timeout_seconds (float): The number of seconds after which an idle connection is closed.
+        threads (int): The maximum number of threads used by a connection. If 0, the duckdb default is used.
+        memory_limit (str|None): The maximum memory used by a connection, e.g. "1GB". If None or empty, the duckdb
+          default is used.
+    """
+
+    def __init__(
+        self,
+        max_connections: int,
+        idle_timeout_seconds: float,
+        threads: int = 0,
+        memory_limit: Optional[str] = None,
+    ):
+        self.max_connections = max_connections
+        self.idle_timeout_seconds = idle_timeout_seconds
+        self.threads = threads
+        self.memory_limit = memory_limit
+        self._idle: OrderedDict[str, _IdleConnections] = OrderedDict()
+        self._num_open = 0
+        self._condition = Condition()
+
+    @property
+    def num_open(self) -> int:
+        return self._num_open
+
+    @contextmanager
+    def connection(self, database: str) -> Iterator[duckdb.DuckDBPyConnection]:
+        """Get a connection to the index file, and release it to the pool after use.
+
+        If an exception is raised while the connection is used, the connection is closed instead of being reused.
+        """
+        if self.max_connections <= 0:
+            with duckdb_connect(database=database, threads=self.threads, memory_limit=self.memory_limit) as con:
+                yield con
+            return
+        file_id = get_file_id(database)
+        con = self._acquire(database=database, file_id=file_id)
+        try:
+            yield con
+        except BaseException:
+            self._close(con)
+            raise
+        self._release(database=database, file_id=file_id, con=con)
+
+    def _acquire(self, database: str, file_id: tuple[int, int]) -> duckdb.DuckDBPyConnection:
+        with self._condition:
+            self._close_expired()
+            idle = self._idle.get(database)
+            if idle is not None and idle.file_id != file_id:
+                # the file has been replaced: the idle connections read the previous one
+                self._close_idle(database)
+                idle = None
+            if idle is not None and idle.connections:
+                con, _ = idle.connections.pop()
+                self._idle.move_to_end(database)
+                MEMORY_CACHE_EVENTS_TOTAL.labels(cache=DUCKDB_CONNECTIONS_CACHE_NAME, event="hit").inc()
+                return con
+            MEMORY_CACHE_EVENTS_TOTAL.labels(cache=DUCKDB_CONNECTIONS_CACHE_NAME, event="miss").inc()
+            while self._num_open >= self.max_connections:
+                if not self._close_least_recently_used():
+                    # all the connections are in use
+                    self._condition.wait()
+            self._num_open += 1
+            DUCKDB_CONNECTIONS_OPEN.inc()
+        try:
+            # opened outside of the lock, since it can be slow
+            return duckdb_connect(database=database, threads=self.threads, memory_limit=self.memory_limit)
+        except BaseException:
+            self._forget()
+            raise
+
+    def _release(self, database: str, file_id: tuple[int, int], con: duckdb.DuckDBPyConnection) -> None:
+        if not is_same_file(database=database, file_id=file_id):
+            # the file has been deleted or replaced while the connection was in use
+            self._close(con)
+            return
+        with self._condition:
+            idle = self._idle.get(database)
+            if idle is not None and idle.file_id != file_id:
+                self._close_idle(database)
+                idle = None
+            if idle is None:
+                idle = self._idle[database] = _IdleConnections(file_id=file_id)
+            idle.connections.append((con, time.monotonic()))
+            self._idle.move_to_end(database)
+            self._close_expired()
+            self._condition.notify()
+
+    def _close(self, con: duckdb.DuckDBPyConnection) -> None:
+        try:
+            con.close()
+        except duckdb.Error as err:
+            logging.warning(f"Could not close a duckdb connection: {err}")
+        self._forget()
+
+    def _forget(self) -> None:
+        with self._condition:
+            self._num_open -= 1
+            DUCKDB_CONNECTIONS_OPEN.dec()
+            self._condition.notify()
+
+    # the following methods must be called with the lock held
+
+    def _close_idle_connection(self, con: duckdb.DuckDBPyConnection) -> None:
+        con.close()
+        self._num_open -= 1
+        DUCKDB_CONNECTIONS_OPEN.dec()
+        MEMORY_CACHE_EVENTS_TOTAL.labels(cache=DUCKDB_CONNECTIONS_CACHE_NAME, event="eviction").inc()
+
+    def _close_idle(self, database: str) -> None:
+        for con, _ in self._idle.pop(database).connections:
+            self._close_idle_connection(con)
+
+    def _close_least_recently_used(self) -> bool:
+        for database, idle in self._idle.items():
+            if idle.connections:
+                con, _ = idle.connections.pop(0)
+                self._close_idle_connection(con)
+                if not idle.connections:
+                    del self._idle[database]
+                return True
+        return False
+
+    def _close_expired(self) -> None:
+        expiration_time = time.monotonic() - self.idle_timeout_seconds
+        for database, idle in self._idle.items():
+            # the disk space of a deleted (or replaced) file is only freed once its connections are closed
+            is_deleted = not is_same_file(database=database, file_id=idle.file_id)
+            # the connections are sorted by release time
+            while idle.connections and (is_deleted or idle.connections[0][1] < expiration_time):
+                con, _ = idle.connections.pop(0)
+                self._close_idle_connection(con)
+        for database in [database for database, idle in self._idle.items() if not idle.connections]:
+            del self._idle[database]
+
+    def close(self) -> None:
+        """Close all the idle connections."""
+        with self._condition:
+            for database in list(self._idle):
+                self._close_idle(database)
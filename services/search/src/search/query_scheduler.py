@@ -0,0 +1,97 @@
+# SPDX-License-Identifier: Apache-2.0
+# Copyright 2023 The HuggingFace Authors.
+
+import time
+from collections.abc import Callable
+from threading import Timer
+from typing import Any, Optional, TypeVar
+
+import anyio
+from libapi.exceptions import QueryTimeoutError, TooManyQueriesError
+from libcommon.prometheus import (
+    DUCKDB_QUERIES_PROCESSING_TIME,
+    DUCKDB_QUERIES_TOTAL,
+    DUCKDB_QUERIES_WAIT_TIME,
+)
+
+from search.duckdb_connection import RunningQuery, running_query
+
+T = TypeVar("T")
+
+
+class QueryScheduler:
+    """
+    The admission control of the duckdb queries of a worker, so that a few expensive queries cannot starve the other
+    requests.
+
+    At most `max_concurrent_queries` queries run at the same time, each in a worker thread. The next queries wait, in
+    arrival order, for at most `queue_timeout_seconds`: after this deadline, the query is rejected with a
+    TooManyQueriesError, and the client can retry later. A query that runs for more than `query_timeout_seconds` is
+    interrupted, with `interrupt()` on the duckdb connections it uses (see `search.duckdb_connection.connect`), and
+    fails with a QueryTimeoutError.
+
+    The time spent waiting and the time spent running are reported separately to Prometheus.
+
+    Args:
+        max_concurrent_queries (int): The maximum number of queries run at the same time.
+        queue_timeout_seconds (float): The maximum time a query waits before being run.
+        query_timeout_seconds (float): The maximum time a query runs before being interrupted. If 0, the queries are
+          never interrupted.
+    """
+
+    def __init__(self, max_concurrent_queries: int, queue_timeout_seconds: float, query_timeout_seconds: float):
+        self.max_concurrent_queries = max_concurrent_queries
+        self.queue_timeout_seconds = queue_timeout_seconds
+        self.query_timeout_seconds = query_timeout_seconds
+        # created on first use, since it must be created in the event loop
+        self._limiter: Optional[anyio.CapacityLimiter] = None
+
+    @property
+    def limiter(self) -> anyio.CapacityLimiter:
+        if self._limiter is None:
+            self._limiter = anyio.CapacityLimiter(self.max_concurrent_queries)
+        return self._limiter
+
+    async def run(self, method: str, fn: Callable[..., T], *args: Any) -> T:
+        """Run fn(*args) in a worker thread, once admitted."""
+        queued_time = time.perf_counter()
+        try:
+            with anyio.fail_after(self.queue_timeout_seconds):
+                await self.limiter.acquire()
+        except TimeoutError as err:
+            DUCKDB_QUERIES_TOTAL.labels(method=method, status="rejected").inc()
+            raise TooManyQueriesError("The server is busy. Please retry later.") from err
+        start_time = time.perf_counter()
+        DUCKDB_QUERIES_WAIT_TIME.labels(method=method).observe(start_time - queued_time)
+        query = RunningQuery()
+        status = "ok"
+        try:
+            return await anyio.to_thread.run_sync(self._run, query, fn, *args)
+        except Exception as err:
+            if query.interrupted:
+                status = "timeout"
+                raise QueryTimeoutError("The query took too long and has been interrupted.", err) from err
+            status = "error"
+            raise
+        finally:
+            self.limiter.release()
+            DUCKDB_QUERIES_PROCESSING_TIME.labels(method=method).observe(time.perf_counter() - start_time)
+            DUCKDB_QUERIES_TOTAL.labels(method=method, status=status).inc()
+
+    def _run(self, query: RunningQuery, fn: Callable[..., T], *args: Any) -> T:
+        timer = Timer(self.query_timeout_seconds, query.interrupt) if self.query_timeout_seconds > 0 else None
+        with running_query(query):
+            if timer is not None:
+                timer.start()
+            try:
+                return fn(*args)
+            finally:
+                if timer is not None:
+                    timer.cancel()
+
+
+async def run_query(query_scheduler: Optional[QueryScheduler], method: str, fn: Callable[..., T], *args: Any) -> T:
+    """Run fn(*args) in a worker thread, with the admission control of the scheduler if any."""
+    if query_scheduler is None:
+        return await anyio.to_thread.run_sync(fn, *args)
+    return await query_scheduler.run(method, fn, *args)
@@ -3,49 +3,79 @@
 
 import logging
 import re
+from contextlib import nullcontext
 from http import HTTPStatus
-from typing import Optional
+from typing import Any, Literal, Optional, Union
 
-import anyio
 import duckdb
 import pyarrow as pa
 from datasets import Features
 from libapi.authentication import auth_check
 from libapi.duckdb import (
+    DuckDBIndexFilesCache,
     get_cache_entry_from_duckdb_index_job,
     get_index_file_location_and_download_if_missing,
 )
 from libapi.exceptions import ApiError, InvalidParameterError, UnexpectedApiError
 from libapi.request import (
     get_request_parameter,
+    get_request_parameter_columns,
+    get_request_parameter_cursor,
+    get_request_parameter_format,
     get_request_parameter_length,
     get_request_parameter_offset,
+    select_columns,
 )
-from libapi.response import ROW_IDX_COLUMN, create_response
+from libapi.response import ROW_IDX_COLUMN, create_response, create_table
+from libapi.single_flight import SingleFlight
 from libapi.utils import (
+    VARY_ACCEPT_HEADERS,
     Endpoint,
+    encode_cursor,
     get_json_api_error_response,
     get_json_error_response,
     get_json_ok_response,
+    get_table_ok_response,
 )
 from libcommon.duckdb_utils import duckdb_index_is_partial
+from libcommon.memory_cache import SizedLRUCache
 from libcommon.processing_graph import ProcessingGraph
 from libcommon.prometheus import StepProfiler
+from libcommon.public_assets_storage import AssetsManifest, OnDemandAssets
 from libcommon.storage import StrPath
 from libcommon.storage_client import StorageClient
-from libcommon.viewer_utils.features import get_supported_unsupported_columns
+from libcommon.utils import PaginatedResponse
+from libcommon.viewer_utils.features import get_features_transform_plan
 from starlette.requests import Request
 from starlette.responses import Response
 
-from search.duckdb_connection import duckdb_connect
+from search.duckdb_connection import (
+    DuckDBConnectionPool,
+    NumRowsTotalCache,
+    connect,
+    get_num_rows_total_key,
+)
+from search.query_scheduler import QueryScheduler, run_query
 
+# the rows are sorted by index, since the order of the scan is not guaranteed (e.g. with several threads): the pages
+# of the same query must not overlap or skip rows
 FILTER_QUERY = """\
     SELECT {columns}
     FROM data
     WHERE {where}
+    ORDER BY __hf_index_id
     LIMIT {limit}
     OFFSET {offset}"""
 
+# same as FILTER_QUERY, for the page after a row index cursor: a range predicate replaces the offset
+FILTER_QUERY_AFTER_CURSOR = """\
+    SELECT {columns}
+    FROM data
+    WHERE ({where}) AND __hf_index_id > {row_idx}
+    ORDER BY __hf_index_id
+    LIMIT {limit}"""
+
+# the count only reads the columns of the predicate, not the (possibly large) columns of the page
 FILTER_COUNT_QUERY = """\
     SELECT COUNT(*)
     FROM data
@@ -57,6 +87,20 @@ SQL_INVALID_SYMBOLS_PATTERN = re.compile(rf"(?:{SQL_INVALID_SYMBOLS})", flags=re
 logger = logging.getLogger(__name__)
 
 
+def get_filter_cursor(cursor: dict[str, Any]) -> int:
+    row_idx = cursor.get("row_idx")
+    if not isinstance(row_idx, int) or isinstance(row_idx, bool):
+        raise InvalidParameterError("Parameter 'cursor' is invalid")
+    return row_idx
+
+
+def get_next_filter_cursor(pa_table: pa.Table, length: int) -> Optional[str]:
+    """Return the cursor of the next page, if the page is full."""
+    if length == 0 or pa_table.num_rows < length:
+        return None
+    return encode_cursor({"row_idx": pa_table[ROW_IDX_COLUMN][-1].as_py()})
+
+
 def create_filter_endpoint(
     processing_graph: ProcessingGraph,
     duckdb_index_file_directory: StrPath,
@@ -73,7 +117,98 @@ def create_filter_endpoint(
     hf_timeout_seconds: Optional[float] = None,
     max_age_long: int = 0,
     max_age_short: int = 0,
+    assets_manifest: Optional[AssetsManifest] = None,
+    upload_assets_in_background: bool = False,
+    thumbnail_max_size: int = 0,
+    on_demand_assets: Optional[OnDemandAssets] = None,
+    duckdb_connection_pool: Optional[DuckDBConnectionPool] = None,
+    num_rows_total_cache_max_size: int = 0,
+    index_files_cache: Optional[DuckDBIndexFilesCache] = None,
+    query_scheduler: Optional[QueryScheduler] = None,
 ) -> Endpoint:
+    single_flight = SingleFlight(endpoint="filter")
+    # the total number of results of the recent filters, to compute it only once when paginating
+    num_rows_total_cache: NumRowsTotalCache = SizedLRUCache(
+        name="filter_num_rows_total", max_size=num_rows_total_cache_max_size
+    )
+
+    async def get_content(
+        dataset: str,
+        revision: str,
+        config: str,
+        split: str,
+        index_file_location: str,
+        where: str,
+        offset: int,
+        length: int,
+        features: Features,
+        supported_columns: list[str],
+        unsupported_columns: list[str],
+        format: Literal["json", "arrow", "parquet"],
+        partial: bool,
+        after_row_idx: Optional[int],
+    ) -> tuple[int, Optional[str], Union[PaginatedResponse, pa.Table]]:
+        with StepProfiler(method="filter_endpoint", step="execute filter query"), (
+            # the index file must not be evicted while it is read
+            nullcontext() if index_files_cache is None else index_files_cache.pin(index_file_location)
+        ):
+            num_rows_total, pa_table = await run_query(
+                query_scheduler,
+                "filter_endpoint",
+                execute_filter_query,
+                index_file_location,
+                supported_columns,
+                where,
+                length,
+                offset,
+                duckdb_connection_pool,
+                num_rows_total_cache,
+                after_row_idx,
+            )
+        next_cursor = get_next_filter_cursor(pa_table, length)
+        if format != "json":
+            with StepProfiler(method="filter_endpoint", step="create table"):
+                return num_rows_total, next_cursor, await create_table(
+                    dataset=dataset,
+                    revision=revision,
+                    config=config,
+                    split=split,
+                    cached_assets_base_url=cached_assets_base_url,
+                    storage_client=storage_client,
+                    assets_manifest=assets_manifest,
+                    upload_assets_in_background=upload_assets_in_background,
+                    thumbnail_max_size=thumbnail_max_size,
+                    on_demand_assets=on_demand_assets,
+                    pa_table=pa_table,
+                    offset=offset,
+                    features=features,
+                    unsupported_columns=unsupported_columns,
+                    use_row_idx_column=True,
+                )
+        with StepProfiler(method="filter_endpoint", step="create response"):
+            response = await create_response(
+                dataset=dataset,
+                revision=revision,
+                config=config,
+                split=split,
+                cached_assets_base_url=cached_assets_base_url,
+                storage_client=storage_client,
+                assets_manifest=assets_manifest,
+                upload_assets_in_background=upload_assets_in_background,
+                thumbnail_max_size=thumbnail_max_size,
+                on_demand_assets=on_demand_assets,
+                pa_table=pa_table,
+                offset=offset,
+                features=features,
+                unsupported_columns=unsupported_columns,
+                num_rows_total=num_rows_total,
+                partial=partial,
+                use_row_idx_column=True,
+            )
+            if next_cursor is not None:
+                response["next_cursor"] = next_cursor
+            return num_rows_total, next_cursor, response
+
     async def filter_endpoint(request: Request) -> Response:
         revision: Optional[str] = None
         with StepProfiler(method="filter_endpoint", step="all"):
@@ -86,9 +221,15 @@ def create_filter_endpoint(
                     validate_where_parameter(where)
                     offset = get_request_parameter_offset(request)
                     length = get_request_parameter_length(request)
+                    columns = get_request_parameter_columns(request)
+                    format = get_request_parameter_format(request)
+                    # the cursor of the previous page replaces the offset, if set
+                    cursor = get_request_parameter_cursor(request)
+                    after_row_idx = None if cursor is None else get_filter_cursor(cursor)
                     logger.info(
                         f'/filter, dataset={dataset}, config={config}, split={split}, where="{where}",'
-                        f" offset={offset}, length={length}"
+                        f" offset={offset}, length={length}, columns={columns}, format={format},"
+                        f" after_row_idx={after_row_idx}"
                     )
                 with StepProfiler(method="filter_endpoint", step="check authentication"):
                     # If auth_check fails, it will raise an exception that will be caught below
@@ -122,6 +263,7 @@ def create_filter_endpoint(
                             max_age=max_age_short,
                             error_code=duckdb_index_cache_entry["error_code"],
                             revision=revision,
+                            headers=VARY_ACCEPT_HEADERS,
                         )
 
                     # check if the index is on the full dataset or if it's partial
@@ -140,6 +282,7 @@ def create_filter_endpoint(
                         url=url,
                         target_revision=target_revision,
                         hf_token=hf_token,
+                        index_files_cache=index_files_cache,
                     )
                 with StepProfiler(method="filter_endpoint", step="get features"):
                     try:
@@ -152,56 +295,105 @@ def create_filter_endpoint(
                         )
                     except (KeyError, AttributeError):
                         raise RuntimeError("The indexing process did not store the features.")
+                    features = select_columns(features, columns)
                 with StepProfiler(method="filter_endpoint", step="get supported and unsupported columns"):
-                    supported_columns, unsupported_columns = get_supported_unsupported_columns(
-                        features,
-                    )
-                with StepProfiler(method="filter_endpoint", step="execute filter query"):
-                    num_rows_total, pa_table = await anyio.to_thread.run_sync(
-                        execute_filter_query, index_file_location, supported_columns, where, length, offset
-                    )
-                with StepProfiler(method="filter_endpoint", step="create response"):
-                    response = await create_response(
+                    plan = get_features_transform_plan(features)
+                    supported_columns, unsupported_columns = plan.supported_columns, plan.unsupported_columns
+                # the identical concurrent requests share the same filtered rows and content (single-flight)
+                num_rows_total, next_cursor, filter_content = await single_flight.run(
+                    key=(
+                        dataset,
+                        config,
+                        split,
+                        revision,
+                        where,
+                        offset,
+                        length,
+                        tuple(features),
+                        format,
+                        after_row_idx,
+                    ),
+                    fn=lambda: get_content(
                         dataset=dataset,
                         revision=revision,
                         config=config,
                         split=split,
-                        cached_assets_base_url=cached_assets_base_url,
-                        storage_client=storage_client,
-                        pa_table=pa_table,
+                        index_file_location=index_file_location,
+                        where=where,
                         offset=offset,
+                        length=length,
                         features=features,
+                        supported_columns=supported_columns,
                         unsupported_columns=unsupported_columns,
-                        num_rows_total=num_rows_total,
+                        format=format,
                         partial=partial,
-                        use_row_idx_column=True,
-                    )
+                        after_row_idx=after_row_idx,
+                    ),
+                )
                 with StepProfiler(method="filter_endpoint", step="generate the OK response"):
-                    return get_json_ok_response(content=response, max_age=max_age_long, revision=revision)
+                    if isinstance(filter_content, pa.Table):
+                        return get_table_ok_response(
+                            pa_table=filter_content,
+                            format=format,  # type: ignore
+                            max_age=max_age_long,
+                            revision=revision,
+                            headers={
+                                "X-Num-Rows-Total": str(num_rows_total),
+                                "X-Partial": str(partial).lower(),
+                                **({} if next_cursor is None else {"X-Next-Cursor": next_cursor}),
+                            },
+                        )
+                    return get_json_ok_response(
+                        content=filter_content, max_age=max_age_long, revision=revision, headers=VARY_ACCEPT_HEADERS
+                    )
             except Exception as e:
                 error = e if isinstance(e, ApiError) else UnexpectedApiError("Unexpected error.", e)
                 with StepProfiler(method="filter_endpoint", step="generate API error response"):
-                    return get_json_api_error_response(error=error, max_age=max_age_short, revision=revision)
+                    return get_json_api_error_response(
+                        error=error, max_age=max_age_short, revision=revision, headers=VARY_ACCEPT_HEADERS
+                    )
 
     return filter_endpoint
 
 
 def execute_filter_query(
-    index_file_location: str, columns: list[str], where: str, limit: int, offset: int
+    index_file_location: str,
+    columns: list[str],
+    where: str,
+    limit: int,
+    offset: int,
+    connection_pool: Optional[DuckDBConnectionPool] = None,
+    num_rows_total_cache: Optional[NumRowsTotalCache] = None,
+    after_row_idx: Optional[int] = None,
 ) -> tuple[int, pa.Table]:
-    with duckdb_connect(database=index_file_location) as con:
-        filter_query = FILTER_QUERY.format(
-            columns=",".join([f'"{column}"' for column in [ROW_IDX_COLUMN] + columns]),
-            where=where,
-            limit=limit,
-            offset=offset,
-        )
-        filter_count_query = FILTER_COUNT_QUERY.format(where=where)
+    """Run the filter query, and return the total number of results and the requested page of results.
+
+    The total number of results is computed by a separate count query, and cached, so that it is not computed again
+    for the next pages of the same filter.
+
+    If `after_row_idx` is set (the row index of the last row of the previous page), the page starts after this row,
+    and `offset` is ignored: the previous rows are skipped by a range predicate instead of being read then discarded.
+    """
+    select_list = ",".join([f'"{column}"' for column in [ROW_IDX_COLUMN] + columns])
+    num_rows_total_key = get_num_rows_total_key(database=index_file_location, query=where)
+    cached_num_rows_total = None if num_rows_total_cache is None else num_rows_total_cache.get(num_rows_total_key)
+    num_rows_total = cached_num_rows_total
+    with connect(database=index_file_location, connection_pool=connection_pool) as con:
         try:
-            pa_table = con.sql(filter_query).arrow()
-            num_rows_total = con.sql(filter_count_query).fetchall()[0][0]
+            if after_row_idx is not None:
+                filter_query = FILTER_QUERY_AFTER_CURSOR.format(
+                    columns=select_list, where=where, row_idx=after_row_idx, limit=limit
+                )
+                pa_table = con.sql(filter_query).arrow()
+            else:
+                filter_query = FILTER_QUERY.format(columns=select_list, where=where, limit=limit, offset=offset)
+                pa_table = con.sql(filter_query).arrow()
+            if num_rows_total is None:
+                num_rows_total = con.sql(FILTER_COUNT_QUERY.format(where=where)).fetchall()[0][0]
         except duckdb.Error:
             raise InvalidParameterError(message="Parameter 'where' is invalid")
+    if num_rows_total_cache is not None and cached_num_rows_total is None:
+        num_rows_total_cache.put(num_rows_total_key, num_rows_total)
     return num_rows_total, pa_table
 
 
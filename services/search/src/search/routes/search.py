@@ -2,76 +2,265 @@
 # Copyright 2023 The HuggingFace Authors.
 
 import logging
+from contextlib import nullcontext
 from http import HTTPStatus
-from typing import Optional
+from typing import Any, Literal, Optional, Union
 
-import anyio
 import pyarrow as pa
+import pyarrow.compute as pc
 from datasets import Features
 from libapi.authentication import auth_check
 from libapi.duckdb import (
+    DuckDBIndexFilesCache,
     get_cache_entry_from_duckdb_index_job,
     get_index_file_location_and_download_if_missing,
 )
 from libapi.exceptions import (
     ApiError,
+    InvalidParameterError,
     SearchFeatureNotAvailableError,
     UnexpectedApiError,
 )
 from libapi.request import (
     get_request_parameter,
+    get_request_parameter_columns,
+    get_request_parameter_cursor,
+    get_request_parameter_format,
     get_request_parameter_length,
     get_request_parameter_offset,
+    select_columns,
 )
-from libapi.response import ROW_IDX_COLUMN
+from libapi.response import ROW_IDX_COLUMN, create_table
+from libapi.single_flight import SingleFlight
 from libapi.utils import (
+    VARY_ACCEPT_HEADERS,
     Endpoint,
+    encode_cursor,
     get_json_api_error_response,
     get_json_error_response,
     get_json_ok_response,
+    get_table_ok_response,
     to_rows_list,
 )
 from libcommon.duckdb_utils import duckdb_index_is_partial
+from libcommon.memory_cache import SizedLRUCache
 from libcommon.processing_graph import ProcessingGraph
 from libcommon.prometheus import StepProfiler
-from libcommon.public_assets_storage import PublicAssetsStorage
+from libcommon.public_assets_storage import AssetsManifest, OnDemandAssets, PublicAssetsStorage
 from libcommon.storage import StrPath
 from libcommon.storage_client import StorageClient
 from libcommon.utils import MAX_NUM_ROWS_PER_PAGE, PaginatedResponse
 from libcommon.viewer_utils.features import (
-    get_supported_unsupported_columns,
+    get_features_transform_plan,
     to_features_list,
 )
 from starlette.requests import Request
 from starlette.responses import Response
 
-from search.duckdb_connection import duckdb_connect
+from search.duckdb_connection import (
+    DuckDBConnectionPool,
+    NumRowsTotalCache,
+    NumRowsTotalKey,
+    connect,
+    get_num_rows_total_key,
+)
+from search.query_scheduler import QueryScheduler, run_query
 
 FTS_COMMAND_COUNT = (
     "SELECT COUNT(*) FROM (SELECT __hf_index_id, fts_main_data.match_bm25(__hf_index_id, ?) AS __hf_fts_score FROM"
     " data) A WHERE __hf_fts_score IS NOT NULL;"
 )
 
+# the ties are broken by the row index, to get a stable order between the pages
 FTS_COMMAND = (
-    "SELECT * EXCLUDE (__hf_fts_score) FROM (SELECT *, fts_main_data.match_bm25(__hf_index_id, ?) AS __hf_fts_score"
-    " FROM data) A WHERE __hf_fts_score IS NOT NULL ORDER BY __hf_fts_score DESC OFFSET {offset} LIMIT {length};"
+    "SELECT * FROM (SELECT {columns}, fts_main_data.match_bm25(__hf_index_id, ?) AS __hf_fts_score FROM data) A"
+    " WHERE __hf_fts_score IS NOT NULL ORDER BY __hf_fts_score DESC, __hf_index_id OFFSET {offset} LIMIT {length};"
+)
+
+# same as FTS_COMMAND, for the page after a (score, row index) cursor: a range predicate replaces the offset
+FTS_COMMAND_AFTER_CURSOR = (
+    "SELECT * FROM (SELECT {columns}, fts_main_data.match_bm25(__hf_index_id, ?) AS __hf_fts_score FROM data) A"
+    " WHERE __hf_fts_score IS NOT NULL AND (__hf_fts_score < ? OR (__hf_fts_score = ? AND __hf_index_id > ?))"
+    " ORDER BY __hf_fts_score DESC, __hf_index_id LIMIT {length};"
 )
 
+# all the results, ranked, up to a limit (the sort only keeps the top rows in memory)
+FTS_RANKED_RESULTS_COMMAND = (
+    "SELECT __hf_index_id, __hf_fts_score FROM (SELECT __hf_index_id, fts_main_data.match_bm25(__hf_index_id, ?) AS"
+    " __hf_fts_score FROM data) A WHERE __hf_fts_score IS NOT NULL ORDER BY __hf_fts_score DESC, __hf_index_id"
+    " LIMIT {limit};"
+)
+
+ROWS_BY_INDEX_COMMAND = "SELECT {columns} FROM data WHERE __hf_index_id IN (SELECT UNNEST(?));"
+
+FTS_SCORE_COLUMN = "__hf_fts_score"
+
+RANKED_RESULTS_CACHE_NAME = "search_ranked_results"
+# the ranked results of one search can use at most this fraction of the cache: the searches with more results (e.g.
+# a frequent word in a big dataset) are not ranked in memory, and their pages are computed by duckdb
+RANKED_RESULTS_MAX_CACHE_FRACTION = 0.1
+# size of a ranked result: the row index (BIGINT) and the score (DOUBLE)
+RANKED_RESULT_BYTES = 16
+
+# (index file location, index file id, query) -> ranked results (row indexes and scores)
+RankedResultsCache = SizedLRUCache[NumRowsTotalKey, pa.Table]
+
+# the score and the row index of the last row of the previous page
+SearchCursor = tuple[float, int]
+
 
 logger = logging.getLogger(__name__)
 
 
-def full_text_search(index_file_location: str, query: str, offset: int, length: int) -> tuple[int, pa.Table]:
-    with duckdb_connect(database=index_file_location) as con:
-        count_result = con.execute(query=FTS_COMMAND_COUNT, parameters=[query]).fetchall()
-        num_rows_total = count_result[0][0]  # it will always return a non-empty list with one element in a tuple
-        logging.debug(f"got {num_rows_total=} results for {query=}")
-        query_result = con.execute(
-            query=FTS_COMMAND.format(offset=offset, length=length),
-            parameters=[query],
-        )
-        pa_table = query_result.arrow()
-    return num_rows_total, pa_table
+def get_search_cursor(cursor: dict[str, Any]) -> SearchCursor:
+    score, row_idx = cursor.get("score"), cursor.get("row_idx")
+    if (
+        not isinstance(score, (int, float))
+        or isinstance(score, bool)
+        or not isinstance(row_idx, int)
+        or isinstance(row_idx, bool)
+    ):
+        raise InvalidParameterError("Parameter 'cursor' is invalid")
+    return float(score), row_idx
+
+
+def get_next_search_cursor(pa_table: pa.Table, length: int) -> Optional[str]:
+    """Return the cursor of the next page, if the page (with the scores) is full."""
+    if length == 0 or pa_table.num_rows < length:
+        return None
+    return encode_cursor(
+        {"score": pa_table[FTS_SCORE_COLUMN][-1].as_py(), "row_idx": pa_table[ROW_IDX_COLUMN][-1].as_py()}
+    )
+
+
+def full_text_search(
+    index_file_location: str,
+    query: str,
+    offset: int,
+    length: int,
+    columns: Optional[list[str]] = None,
+    connection_pool: Optional[DuckDBConnectionPool] = None,
+    num_rows_total_cache: Optional[NumRowsTotalCache] = None,
+    ranked_results_cache: Optional[RankedResultsCache] = None,
+    cursor: Optional[SearchCursor] = None,
+    with_scores: bool = False,
+) -> tuple[int, pa.Table]:
+    """Run the full-text search, and return the total number of results and the requested page of results.
+
+    If `ranked_results_cache` is set, the ranked results of the search (the row indexes and their scores) are cached,
+    and the rows of the next pages of the same search are fetched by their row index, without scoring and sorting
+    all the rows again. The searches with too many results to be cached (see get_ranked_results_max_num_rows) are
+    run as if the cache was not set.
+
+    Otherwise, the total number of results is computed by a count query that only reads the row index, and cached in
+    `num_rows_total_cache`, so that it is not computed again for the next pages of the same search.
+
+    If `cursor` is set, the page starts after the row of the cursor, and `offset` is ignored: the results before the
+    cursor are filtered out by a range predicate, instead of being sorted then skipped.
+
+    If `with_scores` is True, the scores are returned in the `__hf_fts_score` column, e.g. to create the next cursor.
+    """
+    select_list = "*" if columns is None else ",".join([f'"{column}"' for column in [ROW_IDX_COLUMN] + columns])
+    num_rows_total_key = get_num_rows_total_key(database=index_file_location, query=query)
+    cached_num_rows_total = None if num_rows_total_cache is None else num_rows_total_cache.get(num_rows_total_key)
+    if ranked_results_cache is not None:
+        max_num_rows = get_ranked_results_max_num_rows(ranked_results_cache)
+        # the total number of results is only cached for the searches that have too many results to be ranked
+        if cached_num_rows_total is None or cached_num_rows_total <= max_num_rows:
+            ranked_search_result = full_text_search_with_ranked_results(
+                index_file_location=index_file_location,
+                query=query,
+                offset=offset,
+                length=length,
+                select_list=select_list,
+                ranked_results_key=num_rows_total_key,
+                ranked_results_cache=ranked_results_cache,
+                max_num_rows=max_num_rows,
+                connection_pool=connection_pool,
+                cursor=cursor,
+            )
+            if ranked_search_result is not None:
+                num_rows_total, pa_table = ranked_search_result
+                return num_rows_total, pa_table if with_scores else pa_table.drop([FTS_SCORE_COLUMN])
+    num_rows_total = cached_num_rows_total
+    with connect(database=index_file_location, connection_pool=connection_pool) as con:
+        if cursor is not None:
+            pa_table = con.execute(
+                query=FTS_COMMAND_AFTER_CURSOR.format(columns=select_list, length=length),
+                parameters=[query, cursor[0], cursor[0], cursor[1]],
+            ).arrow()
+        else:
+            pa_table = con.execute(
+                query=FTS_COMMAND.format(columns=select_list, offset=offset, length=length),
+                parameters=[query],
+            ).arrow()
+        if num_rows_total is None:
+            # the count only reads the row index, not the (possibly large) columns of the page
+            count_result = con.execute(query=FTS_COMMAND_COUNT, parameters=[query]).fetchall()
+            num_rows_total = count_result[0][0]  # it will always return a non-empty list with one element in a tuple
+    logging.debug(f"got {num_rows_total=} results for {query=}")
+    if num_rows_total_cache is not None and cached_num_rows_total is None:
+        num_rows_total_cache.put(num_rows_total_key, num_rows_total)
+    return num_rows_total, pa_table if with_scores else pa_table.drop([FTS_SCORE_COLUMN])
+
+
+def get_ranked_results_max_num_rows(ranked_results_cache: RankedResultsCache) -> int:
+    """The maximum number of results of a search whose ranked results are cached."""
+    return int(ranked_results_cache.max_size * RANKED_RESULTS_MAX_CACHE_FRACTION) // RANKED_RESULT_BYTES
+
+
+def full_text_search_with_ranked_results(
+    index_file_location: str,
+    query: str,
+    offset: int,
+    length: int,
+    select_list: str,
+    ranked_results_key: NumRowsTotalKey,
+    ranked_results_cache: RankedResultsCache,
+    max_num_rows: int,
+    connection_pool: Optional[DuckDBConnectionPool] = None,
+    cursor: Optional[SearchCursor] = None,
+) -> Optional[tuple[int, pa.Table]]:
+    """Return the page of results from the cached ranked results, or None if the search has more than `max_num_rows`
+    results: they are not materialized (only the first `max_num_rows + 1` are ranked), nor cached."""
+    ranked_results = ranked_results_cache.get(ranked_results_key)
+    with connect(database=index_file_location, connection_pool=connection_pool) as con:
+        if ranked_results is None:
+            with StepProfiler(method="full_text_search", step="rank the results"):
+                ranked_results = (
+                    con.execute(query=FTS_RANKED_RESULTS_COMMAND.format(limit=max_num_rows + 1), parameters=[query])
+                    .arrow()
+                    .combine_chunks()
+                )
+            if ranked_results.num_rows > max_num_rows:
+                logging.debug(f"too many results for {query=} to rank them in memory")
+                return None
+            ranked_results_cache.put(ranked_results_key, ranked_results)
+        if cursor is not None:
+            # the number of results up to the cursor, in the (score descending, row index ascending) order
+            scores, row_indexes = ranked_results[FTS_SCORE_COLUMN], ranked_results[ROW_IDX_COLUMN]
+            score, row_idx = cursor
+            offset = (
+                pc.sum(
+                    pc.or_(
+                        pc.greater(scores, score),
+                        pc.and_(pc.equal(scores, score), pc.less_equal(row_indexes, row_idx)),
+                    )
+                ).as_py()
+                or 0
+            )
+        with StepProfiler(method="full_text_search", step="get the rows of the page"):
+            page_ranked_results = ranked_results.slice(offset, length)
+            pa_table = con.execute(
+                query=ROWS_BY_INDEX_COMMAND.format(columns=select_list),
+                parameters=[page_ranked_results[ROW_IDX_COLUMN].to_pylist()],
+            ).arrow()
+    # the rows are returned in no particular order: sort them by rank
+    pa_table = pa_table.take(
+        pc.index_in(page_ranked_results[ROW_IDX_COLUMN], value_set=pa_table[ROW_IDX_COLUMN].combine_chunks())
+    ).append_column(FTS_SCORE_COLUMN, page_ranked_results[FTS_SCORE_COLUMN])
+    logging.debug(f"got {ranked_results.num_rows} results for {query=}")
+    return ranked_results.num_rows, pa_table
 
 
 async def create_response(
@@ -86,22 +275,30 @@ async def create_response(
     features: Features,
     num_rows_total: int,
     partial: bool,
+    assets_manifest: Optional[AssetsManifest] = None,
+    upload_assets_in_background: bool = False,
+    thumbnail_max_size: int = 0,
+    on_demand_assets: Optional[OnDemandAssets] = None,
+    next_cursor: Optional[str] = None,
 ) -> PaginatedResponse:
     features_without_key = features.copy()
     features_without_key.pop(ROW_IDX_COLUMN, None)
 
-    _, unsupported_columns = get_supported_unsupported_columns(
-        features,
-    )
+    unsupported_columns = get_features_transform_plan(features).unsupported_columns
     pa_table = pa_table.drop(unsupported_columns)
     logging.debug(f"create response for {dataset=} {config=} {split=}")
     public_assets_storage = PublicAssetsStorage(
         assets_base_url=cached_assets_base_url,
         overwrite=False,
         storage_client=storage_client,
+        manifest=assets_manifest,
+        concurrent_uploads=True,
+        upload_in_background=upload_assets_in_background,
+        thumbnail_max_size=thumbnail_max_size,
+        on_demand_assets=on_demand_assets,
     )
 
-    return PaginatedResponse(
+    response = PaginatedResponse(
         features=to_features_list(features_without_key),
         rows=await to_rows_list(
             pa_table=pa_table,
@@ -119,6 +316,9 @@ async def create_response(
         num_rows_per_page=MAX_NUM_ROWS_PER_PAGE,
         partial=partial,
     )
+    if next_cursor is not None:
+        response["next_cursor"] = next_cursor
+    return response
 
 
 def create_search_endpoint(
@@ -137,7 +337,115 @@ def create_search_endpoint(
     hf_timeout_seconds: Optional[float] = None,
     max_age_long: int = 0,
     max_age_short: int = 0,
+    assets_manifest: Optional[AssetsManifest] = None,
+    upload_assets_in_background: bool = False,
+    thumbnail_max_size: int = 0,
+    on_demand_assets: Optional[OnDemandAssets] = None,
+    duckdb_connection_pool: Optional[DuckDBConnectionPool] = None,
+    num_rows_total_cache_max_size: int = 0,
+    index_files_cache: Optional[DuckDBIndexFilesCache] = None,
+    ranked_results_cache_max_bytes: int = 0,
+    query_scheduler: Optional[QueryScheduler] = None,
 ) -> Endpoint:
+    single_flight = SingleFlight(endpoint="search")
+    # the total number of results of the recent searches, to compute it only once when paginating
+    num_rows_total_cache: NumRowsTotalCache = SizedLRUCache(
+        name="search_num_rows_total", max_size=num_rows_total_cache_max_size
+    )
+    # the ranked results of the recent searches, to score and sort the rows only once when paginating
+    ranked_results_cache: Optional[RankedResultsCache] = (
+        SizedLRUCache(
+            name=RANKED_RESULTS_CACHE_NAME,
+            max_size=ranked_results_cache_max_bytes,
+            get_size=lambda ranked_results: ranked_results.nbytes,
+        )
+        if ranked_results_cache_max_bytes > 0
+        else None
+    )
+
+    async def get_content(
+        dataset: str,
+        revision: str,
+        config: str,
+        split: str,
+        index_file_location: str,
+        query: str,
+        offset: int,
+        length: int,
+        columns: Optional[list[str]],
+        select_list: Optional[list[str]],
+        features: Optional[Features],
+        format: Literal["json", "arrow", "parquet"],
+        partial: bool,
+        cursor: Optional[SearchCursor],
+    ) -> tuple[int, Optional[str], Union[PaginatedResponse, pa.Table]]:
+        with StepProfiler(method="search_endpoint", step="perform FTS command"), (
+            # the index file must not be evicted while it is read
+            nullcontext() if index_files_cache is None else index_files_cache.pin(index_file_location)
+        ):
+            logging.debug(f"connect to index file {index_file_location}")
+            num_rows_total, pa_table = await run_query(
+                query_scheduler,
+                "search_endpoint",
+                full_text_search,
+                index_file_location,
+                query,
+                offset,
+                length,
+                select_list,
+                duckdb_connection_pool,
+                num_rows_total_cache,
+                ranked_results_cache,
+                cursor,
+                True,
+            )
+        next_cursor = get_next_search_cursor(pa_table, length)
+        pa_table = pa_table.drop([FTS_SCORE_COLUMN])
+        if features is None:
+            # the index has been created without the features: they are only known after the query
+            features = select_columns(Features.from_arrow_schema(pa_table.schema), columns)
+        if format != "json":
+            with StepProfiler(method="search_endpoint", step="create table"):
+                features_without_key = features.copy()
+                features_without_key.pop(ROW_IDX_COLUMN, None)
+                unsupported_columns = get_features_transform_plan(features_without_key).unsupported_columns
+                return num_rows_total, next_cursor, await create_table(
+                    dataset=dataset,
+                    revision=revision,
+                    config=config,
+                    split=split,
+                    cached_assets_base_url=cached_assets_base_url,
+                    storage_client=storage_client,
+                    assets_manifest=assets_manifest,
+                    upload_assets_in_background=upload_assets_in_background,
+                    thumbnail_max_size=thumbnail_max_size,
+                    on_demand_assets=on_demand_assets,
+                    pa_table=pa_table.drop(unsupported_columns),
+                    offset=offset,
+                    features=features_without_key,
+                    unsupported_columns=unsupported_columns,
+                    use_row_idx_column=True,
+                )
+        with StepProfiler(method="search_endpoint", step="create response"):
+            return num_rows_total, next_cursor, await create_response(
+                pa_table=pa_table,
+                dataset=dataset,
+                revision=revision,
+                config=config,
+                split=split,
+                cached_assets_base_url=cached_assets_base_url,
+                storage_client=storage_client,
+                assets_manifest=assets_manifest,
+                upload_assets_in_background=upload_assets_in_background,
+                thumbnail_max_size=thumbnail_max_size,
+                on_demand_assets=on_demand_assets,
+                offset=offset,
+                features=features,
+                num_rows_total=num_rows_total,
+                partial=partial,
+                next_cursor=next_cursor,
+            )
+
     async def search_endpoint(request: Request) -> Response:
         revision: Optional[str] = None
         with StepProfiler(method="search_endpoint", step="all"):
@@ -149,6 +457,11 @@ def create_search_endpoint(
                     query = get_request_parameter(request, "query", required=True)
                     offset = get_request_parameter_offset(request)
                     length = get_request_parameter_length(request)
+                    columns = get_request_parameter_columns(request)
+                    format = get_request_parameter_format(request)
+                    # the cursor of the previous page replaces the offset, if set
+                    request_cursor = get_request_parameter_cursor(request)
+                    cursor = None if request_cursor is None else get_search_cursor(request_cursor)
 
                 with StepProfiler(method="search_endpoint", step="check authentication"):
                     # if auth_check fails, it will raise an exception that will be caught below
@@ -161,7 +474,10 @@ def create_search_endpoint(
                         hf_timeout_seconds=hf_timeout_seconds,
                     )
 
-                logging.info(f"/search {dataset=} {config=} {split=} {query=} {offset=} {length=}")
+                logging.info(
+                    f"/search {dataset=} {config=} {split=} {query=} {offset=} {length=} {columns=} {format=}"
+                    f" {cursor=}"
+                )
 
                 with StepProfiler(method="search_endpoint", step="validate indexing was done"):
                     # no cache data is needed to download the index file
@@ -185,6 +501,7 @@ def create_search_endpoint(
                             max_age=max_age_short,
                             error_code=duckdb_index_cache_entry["error_code"],
                             revision=revision,
+                            headers=VARY_ACCEPT_HEADERS,
                         )
                     if duckdb_index_cache_entry["content"]["has_fts"] is not True:
                         raise SearchFeatureNotAvailableError("The split does not have search feature enabled.")
@@ -205,39 +522,75 @@ def create_search_endpoint(
                         url=url,
                         target_revision=target_revision,
                         hf_token=hf_token,
+                        index_files_cache=index_files_cache,
                     )
 
-                with StepProfiler(method="search_endpoint", step="perform FTS command"):
-                    logging.debug(f"connect to index file {index_file_location}")
-                    num_rows_total, pa_table = await anyio.to_thread.run_sync(
-                        full_text_search, index_file_location, query, offset, length
-                    )
-
-                with StepProfiler(method="search_endpoint", step="create response"):
+                with StepProfiler(method="search_endpoint", step="get features"):
+                    features: Optional[Features] = None
+                    select_list: Optional[list[str]] = None
                     if "features" in duckdb_index_cache_entry["content"] and isinstance(
                         duckdb_index_cache_entry["content"]["features"], dict
                     ):
                         features = Features.from_dict(duckdb_index_cache_entry["content"]["features"])
-                    else:
-                        features = Features.from_arrow_schema(pa_table.schema)
-                    response = await create_response(
-                        pa_table=pa_table,
+                        if columns is not None:
+                            # only read the requested columns (and the row index) from the index
+                            features_without_key = features.copy()
+                            features_without_key.pop(ROW_IDX_COLUMN, None)
+                            features = select_columns(features_without_key, columns)
+                            select_list = list(features)
+
+                # the identical concurrent requests share the same search results and content (single-flight)
+                num_rows_total, next_cursor, search_content = await single_flight.run(
+                    key=(
+                        dataset,
+                        config,
+                        split,
+                        revision,
+                        query,
+                        offset,
+                        length,
+                        None if columns is None else tuple(columns),
+                        format,
+                        cursor,
+                    ),
+                    fn=lambda: get_content(
                         dataset=dataset,
                         revision=revision,
                         config=config,
                         split=split,
-                        cached_assets_base_url=cached_assets_base_url,
-                        storage_client=storage_client,
+                        index_file_location=index_file_location,
+                        query=query,
                         offset=offset,
+                        length=length,
+                        columns=columns,
+                        select_list=select_list,
                         features=features,
-                        num_rows_total=num_rows_total,
+                        format=format,
                         partial=partial,
-                    )
+                        cursor=cursor,
+                    ),
+                )
                 with StepProfiler(method="search_endpoint", step="generate the OK response"):
-                    return get_json_ok_response(response, max_age=max_age_long, revision=revision)
+                    if isinstance(search_content, pa.Table):
+                        return get_table_ok_response(
+                            pa_table=search_content,
+                            format=format,  # type: ignore
+                            max_age=max_age_long,
+                            revision=revision,
+                            headers={
+                                "X-Num-Rows-Total": str(num_rows_total),
+                                "X-Partial": str(partial).lower(),
+                                **({} if next_cursor is None else {"X-Next-Cursor": next_cursor}),
+                            },
+                        )
+                    return get_json_ok_response(
+                        search_content, max_age=max_age_long, revision=revision, headers=VARY_ACCEPT_HEADERS
+                    )
             except Exception as e:
                 error = e if isinstance(e, ApiError) else UnexpectedApiError("Unexpected error.", e)
                 with StepProfiler(method="search_endpoint", step="generate API error response"):
-                    return get_json_api_error_response(error=error, max_age=max_age_short, revision=revision)
+                    return get_json_api_error_response(
+                        error=error, max_age=max_age_short, revision=revision, headers=VARY_ACCEPT_HEADERS
+                    )
 
     return search_endpoint
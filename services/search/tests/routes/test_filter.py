@@ -4,6 +4,7 @@
 import os
 from collections.abc import Generator
 from pathlib import Path
+from typing import Any
 
 import duckdb
 import pyarrow as pa
@@ -11,10 +12,18 @@ import pytest
 from datasets import Dataset
 from libapi.exceptions import InvalidParameterError
 from libapi.response import create_response
+from libapi.utils import decode_cursor
+from libcommon.memory_cache import SizedLRUCache
 from libcommon.storage_client import StorageClient
 
 from search.config import AppConfig
-from search.routes.filter import execute_filter_query, validate_where_parameter
+from search.duckdb_connection import NumRowsTotalCache, get_num_rows_total_key
+from search.routes.filter import (
+    execute_filter_query,
+    get_filter_cursor,
+    get_next_filter_cursor,
+    validate_where_parameter,
+)
 
 CACHED_ASSETS_FOLDER = "cached-assets"
 
@@ -80,6 +89,83 @@ def test_execute_filter_query(index_file_location: str) -> None:
     assert pa_table == pa.Table.from_pydict({"__hf_index_id": [3], "name": ["Simone"], "age": [30]})
 
 
+@pytest.mark.parametrize(
+    "limit,offset,expected_names",
+    [(2, 0, ["Marie", "Simone"]), (1, 1, ["Simone"]), (0, 0, []), (10, 5, [])],
+)
+def test_execute_filter_query_num_rows_total_cache(
+    index_file_location: str, limit: int, offset: int, expected_names: list[str]
+) -> None:
+    columns, where = ["name"], "gender='female'"
+    num_rows_total_cache: NumRowsTotalCache = SizedLRUCache(name="test_filter_num_rows_total", max_size=10)
+    for _ in range(2):
+        # the second query gets the total number of results from the cache
+        num_rows_total, pa_table = execute_filter_query(
+            index_file_location=index_file_location,
+            columns=columns,
+            where=where,
+            limit=limit,
+            offset=offset,
+            num_rows_total_cache=num_rows_total_cache,
+        )
+        assert num_rows_total == 2
+        assert pa_table.column_names == ["__hf_index_id", "name"]
+        assert pa_table["name"].to_pylist() == expected_names
+    assert num_rows_total_cache.get(get_num_rows_total_key(database=index_file_location, query=where)) == 2
+
+
+def test_execute_filter_query_is_sorted_by_index(tmp_path: Path) -> None:
+    index_file_location = str(tmp_path / "index.duckdb")
+    with duckdb.connect(index_file_location) as con:
+        # the rows are not stored in the order of their index
+        con.sql("CREATE TABLE data AS SELECT 9 - range AS __hf_index_id, range % 2 AS parity FROM range(10)")
+    num_rows_total_cache: NumRowsTotalCache = SizedLRUCache(name="test_filter_num_rows_total", max_size=10)
+    for _ in range(2):
+        # the second query gets the total number of results from the cache, and does not count the results
+        num_rows_total, pa_table = execute_filter_query(
+            index_file_location=index_file_location,
+            columns=["parity"],
+            where="parity=0",
+            limit=3,
+            offset=1,
+            num_rows_total_cache=num_rows_total_cache,
+        )
+        assert num_rows_total == 5
+        assert pa_table["__hf_index_id"].to_pylist() == [3, 5, 7]
+
+
+def test_execute_filter_query_after_cursor(index_file_location: str) -> None:
+    columns, where, limit = ["name"], "gender='female' OR age=25", 2
+    num_rows_total, pa_table = execute_filter_query(
+        index_file_location=index_file_location, columns=columns, where=where, limit=limit, offset=0
+    )
+    assert num_rows_total == 3
+    assert pa_table["name"].to_pylist() == ["Marie", "Leo"]
+    next_cursor = get_next_filter_cursor(pa_table, limit)
+    assert next_cursor is not None
+    after_row_idx = get_filter_cursor(decode_cursor(next_cursor))
+    assert after_row_idx == 2
+    # the offset is ignored when the cursor is set
+    num_rows_total, pa_table = execute_filter_query(
+        index_file_location=index_file_location,
+        columns=columns,
+        where=where,
+        limit=limit,
+        offset=100,
+        after_row_idx=after_row_idx,
+    )
+    assert num_rows_total == 3
+    assert pa_table["name"].to_pylist() == ["Simone"]
+    # the last page is not full
+    assert get_next_filter_cursor(pa_table, limit) is None
+
+
+@pytest.mark.parametrize("cursor", [{}, {"row_idx": "2"}, {"row_idx": 2.5}, {"row_idx": True}])
+def test_get_filter_cursor_raises(cursor: dict[str, Any]) -> None:
+    with pytest.raises(InvalidParameterError):
+        get_filter_cursor(cursor)
+
+
 @pytest.mark.parametrize("where", ["non-existing-column=30", "name=30", "name>30"])
 def test_execute_filter_query_raises(where: str, index_file_location: str) -> None:
     columns, limit, offset = ["name", "gender", "age"], 100, 0
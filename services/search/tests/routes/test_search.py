@@ -2,16 +2,30 @@
 # Copyright 2023 The HuggingFace Authors.
 
 import os
-from typing import Any
+from collections.abc import Generator
+from typing import Any, Optional
+from unittest.mock import patch
 
 import duckdb
 import pandas as pd
 import pyarrow as pa
 import pytest
 from libapi.duckdb import get_download_folder
+from libapi.exceptions import InvalidParameterError
+from libapi.utils import decode_cursor
+from libcommon.memory_cache import SizedLRUCache
 from libcommon.storage import StrPath
 
-from search.routes.search import full_text_search
+from search.duckdb_connection import NumRowsTotalCache, get_num_rows_total_key
+from search.routes.search import (
+    FTS_SCORE_COLUMN,
+    RankedResultsCache,
+    full_text_search,
+    full_text_search_with_ranked_results,
+    get_next_search_cursor,
+    get_ranked_results_max_num_rows,
+    get_search_cursor,
+)
 
 
 def test_get_download_folder(duckdb_index_cache_directory: StrPath) -> None:
@@ -54,10 +68,17 @@ def test_get_download_folder(duckdb_index_cache_directory: StrPath) -> None:
         ("non existing text", 0, 100, {"__hf_index_id": [], "text": []}, 0),
         (";DROP TABLE data;", 0, 100, {"__hf_index_id": [], "text": []}, 0),
         ("some text'); DROP TABLE data; --", 0, 100, {"__hf_index_id": [], "text": []}, 0),
+        ("Lord Vader", 10, 2, {"__hf_index_id": [], "text": []}, 3),
     ],
 )
+@pytest.mark.parametrize("use_ranked_results_cache", [False, True])
 def test_full_text_search(
-    query: str, offset: int, length: int, expected_result: Any, expected_num_rows_total: int
+    query: str,
+    offset: int,
+    length: int,
+    expected_result: Any,
+    expected_num_rows_total: int,
+    use_ranked_results_cache: bool,
 ) -> None:
     # simulate index file
     index_file_location = "index.duckdb"
@@ -87,15 +108,25 @@ def test_full_text_search(
     con.close()
 
     # assert search results
-    (num_rows_total, pa_table) = full_text_search(index_file_location, query, offset, length)
-    assert num_rows_total is not None
-    assert pa_table is not None
-    assert num_rows_total == expected_num_rows_total
-
+    ranked_results_cache: Optional[RankedResultsCache] = (
+        SizedLRUCache(name="test_search_ranked_results", max_size=1_000_000, get_size=lambda table: table.nbytes)
+        if use_ranked_results_cache
+        else None
+    )
     fields = [pa.field("__hf_index_id", pa.int64()), pa.field("text", pa.string())]
     filtered_df = pd.DataFrame(expected_result)
     expected_table = pa.Table.from_pandas(filtered_df, schema=pa.schema(fields), preserve_index=False)
-    assert pa_table == expected_table
+    # the second search gets the ranked results from the cache, if any
+    for _ in range(2):
+        (num_rows_total, pa_table) = full_text_search(
+            index_file_location, query, offset, length, ranked_results_cache=ranked_results_cache
+        )
+        assert num_rows_total is not None
+        assert pa_table is not None
+        assert num_rows_total == expected_num_rows_total
+        assert pa_table == expected_table
+    if ranked_results_cache is not None:
+        assert len(ranked_results_cache) == 1
 
     # ensure that database has not been modified
     con = duckdb.connect(index_file_location)
@@ -103,3 +134,99 @@ def test_full_text_search(
     con.close()
 
     os.remove(index_file_location)
+
+
+@pytest.fixture
+def index_file_location() -> Generator[str, None, None]:
+    index_file_location = "index.duckdb"
+    con = duckdb.connect(index_file_location)
+    con.execute("INSTALL 'fts';")
+    con.execute("LOAD 'fts';")
+    con.sql("CREATE OR REPLACE SEQUENCE serial START 0 MINVALUE 0;")
+    sample_df = pd.DataFrame(  # noqa: F841
+        {
+            "text": [
+                "Grand Moff Tarkin and Lord Vader are interrupted in their discussion by the buzz of the comlink",
+                "There goes another one.",
+                "Vader turns round and round in circles as his ship spins into space.",
+                "We count thirty Rebel ships.",
+                "The wingman spots the pirateship coming at him and warns the Dark Lord",
+            ]
+        },
+        dtype=pd.StringDtype(storage="python"),
+    )
+    con.sql("CREATE OR REPLACE TABLE data AS SELECT nextval('serial') AS __hf_index_id, * FROM sample_df")
+    con.sql("PRAGMA create_fts_index('data', '__hf_index_id', '*', overwrite=1);")
+    con.close()
+    yield index_file_location
+    os.remove(index_file_location)
+
+
+@pytest.mark.parametrize("use_ranked_results_cache", [False, True])
+def test_full_text_search_after_cursor(index_file_location: str, use_ranked_results_cache: bool) -> None:
+    query, length = "Lord Vader", 2
+    ranked_results_cache: Optional[RankedResultsCache] = (
+        SizedLRUCache(name="test_search_ranked_results", max_size=1_000_000, get_size=lambda table: table.nbytes)
+        if use_ranked_results_cache
+        else None
+    )
+    num_rows_total, pa_table = full_text_search(
+        index_file_location, query, 0, length, ranked_results_cache=ranked_results_cache, with_scores=True
+    )
+    assert num_rows_total == 3
+    assert pa_table["__hf_index_id"].to_pylist() == [0, 4]
+    assert pa_table.column_names == ["__hf_index_id", "text", FTS_SCORE_COLUMN]
+    next_cursor = get_next_search_cursor(pa_table, length)
+    assert next_cursor is not None
+    cursor = get_search_cursor(decode_cursor(next_cursor))
+    assert cursor == (pa_table[FTS_SCORE_COLUMN][-1].as_py(), 4)
+    # the offset is ignored when the cursor is set
+    num_rows_total, pa_table = full_text_search(
+        index_file_location, query, 100, length, ranked_results_cache=ranked_results_cache, cursor=cursor
+    )
+    assert num_rows_total == 3
+    assert pa_table.column_names == ["__hf_index_id", "text"]
+    assert pa_table["__hf_index_id"].to_pylist() == [2]
+
+
+def test_full_text_search_with_too_many_results_to_rank(index_file_location: str) -> None:
+    query, offset, length = "Lord Vader", 1, 2
+    # the cache can only hold the ranked results of the searches with at most 2 results
+    ranked_results_cache: RankedResultsCache = SizedLRUCache(
+        name="test_search_ranked_results", max_size=320, get_size=lambda table: table.nbytes
+    )
+    assert get_ranked_results_max_num_rows(ranked_results_cache) == 2
+    num_rows_total_cache: NumRowsTotalCache = SizedLRUCache(name="test_search_num_rows_total", max_size=10)
+    with patch(
+        "search.routes.search.full_text_search_with_ranked_results", wraps=full_text_search_with_ranked_results
+    ) as mock_ranked_search:
+        for _ in range(2):
+            num_rows_total, pa_table = full_text_search(
+                index_file_location,
+                query,
+                offset,
+                length,
+                num_rows_total_cache=num_rows_total_cache,
+                ranked_results_cache=ranked_results_cache,
+            )
+            assert num_rows_total == 3
+            assert pa_table["__hf_index_id"].to_pylist() == [4, 2]
+    # the results are not ranked in memory, and the next searches don't try again since the total is cached
+    assert mock_ranked_search.call_count == 1
+    assert len(ranked_results_cache) == 0
+    assert num_rows_total_cache.get(get_num_rows_total_key(database=index_file_location, query=query)) == 3
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    [
+        {"row_idx": 1},
+        {"score": "1.0", "row_idx": 1},
+        {"score": 1.0, "row_idx": 1.0},
+        {"score": 1.0, "row_idx": True},
+        {"score": True, "row_idx": 1},
+    ],
+)
+def test_get_search_cursor_raises(cursor: dict[str, Any]) -> None:
+    with pytest.raises(InvalidParameterError):
+        get_search_cursor(cursor)
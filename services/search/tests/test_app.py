@@ -53,6 +53,8 @@ def test_get_search(client: TestClient) -> None:
     # missing parameter
     response = client.get("/search")
     assert response.status_code == 422
+    # the format of the responses depends on the Accept header, even for the errors
+    assert "Accept" in response.headers["Vary"]
 
 
 @pytest.mark.parametrize(
@@ -0,0 +1,158 @@
+# SPDX-License-Identifier: Apache-2.0
+# Copyright 2023 The HuggingFace Authors.
+
+import os
+import time
+from pathlib import Path
+from threading import Thread
+
+import duckdb
+import pytest
+
+from search.duckdb_connection import DuckDBConnectionPool
+
+
+def create_index_file(path: Path, value: int) -> str:
+    database = str(path)
+    con = duckdb.connect(database)
+    con.sql(f"CREATE TABLE data AS SELECT {value} AS value;")
+    con.close()
+    return database
+
+
+def get_value(con: duckdb.DuckDBPyConnection) -> int:
+    row = con.sql("SELECT value FROM data;").fetchone()
+    assert row is not None
+    return int(row[0])
+
+
+def test_connection_pool_reuses_idle_connections(tmp_path: Path) -> None:
+    database = create_index_file(tmp_path / "index.duckdb", 1)
+    pool = DuckDBConnectionPool(max_connections=2, idle_timeout_seconds=60)
+    with pool.connection(database) as first_con:
+        assert get_value(first_con) == 1
+    with pool.connection(database) as con:
+        assert con is first_con
+    assert pool.num_open == 1
+    pool.close()
+    assert pool.num_open == 0
+
+
+def test_connection_pool_is_read_only(tmp_path: Path) -> None:
+    database = create_index_file(tmp_path / "index.duckdb", 1)
+    pool = DuckDBConnectionPool(max_connections=2, idle_timeout_seconds=60)
+    with pytest.raises(duckdb.Error):
+        with pool.connection(database) as con:
+            con.sql("INSERT INTO data VALUES (2);")
+    # the connection is closed after an error, instead of being reused
+    assert pool.num_open == 0
+
+
+def test_connection_pool_evicts_least_recently_used(tmp_path: Path) -> None:
+    databases = [create_index_file(tmp_path / f"index_{i}.duckdb", i) for i in range(3)]
+    pool = DuckDBConnectionPool(max_connections=2, idle_timeout_seconds=60)
+    with pool.connection(databases[0]) as first_con:
+        pass
+    with pool.connection(databases[1]) as second_con:
+        pass
+    with pool.connection(databases[2]) as con:
+        assert get_value(con) == 2
+    assert pool.num_open == 2
+    with pool.connection(databases[1]) as con:
+        assert con is second_con
+    with pool.connection(databases[0]) as con:
+        assert con is not first_con
+        assert get_value(con) == 0
+    pool.close()
+
+
+def test_connection_pool_waits_for_a_connection(tmp_path: Path) -> None:
+    databases = [create_index_file(tmp_path / f"index_{i}.duckdb", i) for i in range(2)]
+    pool = DuckDBConnectionPool(max_connections=1, idle_timeout_seconds=60)
+    values: list[int] = []
+
+    def query_second_database() -> None:
+        with pool.connection(databases[1]) as con:
+            values.append(get_value(con))
+
+    with pool.connection(databases[0]) as con:
+        thread = Thread(target=query_second_database)
+        thread.start()
+        thread.join(timeout=0.2)
+        # the maximum number of connections is reached
+        assert thread.is_alive()
+        values.append(get_value(con))
+    thread.join(timeout=5)
+    assert values == [0, 1]
+    assert pool.num_open == 1
+    pool.close()
+
+
+def test_connection_pool_closes_expired_connections(tmp_path: Path) -> None:
+    databases = [create_index_file(tmp_path / f"index_{i}.duckdb", i) for i in range(2)]
+    pool = DuckDBConnectionPool(max_connections=2, idle_timeout_seconds=0.05)
+    with pool.connection(databases[0]):
+        pass
+    assert pool.num_open == 1
+    time.sleep(0.1)
+    with pool.connection(databases[1]):
+        assert pool.num_open == 1
+    pool.close()
+
+
+def test_connection_pool_replaced_file(tmp_path: Path) -> None:
+    database = create_index_file(tmp_path / "index.duckdb", 1)
+    pool = DuckDBConnectionPool(max_connections=2, idle_timeout_seconds=60)
+    with pool.connection(database) as con:
+        assert get_value(con) == 1
+    # the file is deleted then downloaded again, as done by the clean_directory job
+    new_database = create_index_file(tmp_path / "new_index.duckdb", 2)
+    os.replace(new_database, database)
+    with pool.connection(database) as con:
+        assert get_value(con) == 2
+    assert pool.num_open == 1
+    # deleted while in use
+    with pool.connection(database) as con:
+        os.remove(database)
+    assert pool.num_open == 0
+
+
+def test_connection_pool_closes_connections_of_deleted_files(tmp_path: Path) -> None:
+    databases = [create_index_file(tmp_path / f"index_{i}.duckdb", i) for i in range(2)]
+    pool = DuckDBConnectionPool(max_connections=2, idle_timeout_seconds=60)
+    with pool.connection(databases[0]):
+        pass
+    assert pool.num_open == 1
+    # deleted while idle: the connection is closed by the next request, even on another file
+    os.remove(databases[0])
+    with pool.connection(databases[1]):
+        assert pool.num_open == 1
+    assert pool.num_open == 1
+    pool.close()
+
+
+@pytest.mark.parametrize("max_connections", [1, 0])
+def test_connection_pool_limits_resources(tmp_path: Path, max_connections: int) -> None:
+    database = create_index_file(tmp_path / "index.duckdb", 1)
+    # with max_connections=0, the connections are not pooled, but the limits are applied
+    pool = DuckDBConnectionPool(
+        max_connections=max_connections, idle_timeout_seconds=60, threads=1, memory_limit="100MB"
+    )
+    with pool.connection(database) as con:
+        assert con.sql("SELECT current_setting('threads');").fetchone() == (1,)
+        assert con.sql("SELECT current_setting('memory_limit');").fetchone() == ("100.0MB",)
+        # the limits cannot be changed by a query
+        with pytest.raises(duckdb.Error):
+            con.sql("SET threads=4;")
+    pool.close()
+
+
+def test_connection_pool_disabled(tmp_path: Path) -> None:
+    database = create_index_file(tmp_path / "index.duckdb", 1)
+    pool = DuckDBConnectionPool(max_connections=0, idle_timeout_seconds=60)
+    with pool.connection(database) as con:
+        assert con.sql("SELECT COUNT(*) FROM data;").fetchone() == (1,)
+    # the connection is closed after use
+    with pytest.raises(duckdb.ConnectionException):
+        con.sql("SELECT 1;")
+    assert pool.num_open == 0
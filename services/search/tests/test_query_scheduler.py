@@ -0,0 +1,82 @@
+# SPDX-License-Identifier: Apache-2.0
+# Copyright 2023 The HuggingFace Authors.
+
+import time
+from pathlib import Path
+
+import anyio
+import duckdb
+import pytest
+from libapi.exceptions import QueryTimeoutError, TooManyQueriesError
+
+from search.duckdb_connection import DuckDBConnectionPool, connect
+from search.query_scheduler import QueryScheduler
+
+pytestmark = pytest.mark.anyio
+
+
+def create_index_file(path: Path) -> str:
+    database = str(path)
+    con = duckdb.connect(database)
+    con.sql("CREATE TABLE data AS SELECT range AS value FROM range(100000);")
+    con.close()
+    return database
+
+
+async def test_query_scheduler_runs_query() -> None:
+    query_scheduler = QueryScheduler(max_concurrent_queries=1, queue_timeout_seconds=1, query_timeout_seconds=1)
+    assert await query_scheduler.run("test", lambda x: x + 1, 1) == 2
+
+
+async def test_query_scheduler_rejects_queries_after_deadline() -> None:
+    query_scheduler = QueryScheduler(max_concurrent_queries=1, queue_timeout_seconds=0.1, query_timeout_seconds=0)
+    results: list[str] = []
+
+    async def run_slow_query() -> None:
+        results.append(await query_scheduler.run("test", lambda: time.sleep(0.5) or "slow"))
+
+    async with anyio.create_task_group() as tg:
+        tg.start_soon(run_slow_query)
+        await anyio.sleep(0.05)
+        # the only slot is taken by the slow query
+        with pytest.raises(TooManyQueriesError):
+            await query_scheduler.run("test", lambda: "fast")
+    assert results == ["slow"]
+    # the slot has been released
+    assert await query_scheduler.run("test", lambda: "fast") == "fast"
+
+
+@pytest.mark.skipif(not hasattr(duckdb.DuckDBPyConnection, "interrupt"), reason="interrupt() requires duckdb>=0.9")
+@pytest.mark.parametrize("use_connection_pool", [False, True])
+async def test_query_scheduler_interrupts_long_queries(tmp_path: Path, use_connection_pool: bool) -> None:
+    database = create_index_file(tmp_path / "index.duckdb")
+    connection_pool = DuckDBConnectionPool(max_connections=1, idle_timeout_seconds=60) if use_connection_pool else None
+    query_scheduler = QueryScheduler(max_concurrent_queries=1, queue_timeout_seconds=1, query_timeout_seconds=0.2)
+
+    def run_long_query() -> int:
+        with connect(database=database, connection_pool=connection_pool) as con:
+            row = con.sql("SELECT COUNT(*) FROM data a, data b WHERE a.value + b.value = -1;").fetchone()
+            assert row is not None
+            return int(row[0])
+
+    start_time = time.perf_counter()
+    with pytest.raises(QueryTimeoutError):
+        await query_scheduler.run("test", run_long_query)
+    assert time.perf_counter() - start_time < 5
+    if connection_pool is not None:
+        # the interrupted connection is not reused
+        assert connection_pool.num_open == 0
+
+
+async def test_query_scheduler_interrupts_queries_before_connecting(tmp_path: Path) -> None:
+    database = create_index_file(tmp_path / "index.duckdb")
+    query_scheduler = QueryScheduler(max_concurrent_queries=1, queue_timeout_seconds=1, query_timeout_seconds=0.1)
+
+    def run_late_query() -> None:
+        # e.g. waiting for a connection of the pool
+        time.sleep(0.3)
+        with connect(database=database):
+            pass
+
+    with pytest.raises(QueryTimeoutError):
+        await query_scheduler.run("test", run_late_query)
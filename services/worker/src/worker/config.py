@@ -275,6 +275,7 @@ DUCKDB_INDEX_MAX_DATASET_SIZE_BYTES = 100_000_000
 DUCKDB_INDEX_TARGET_REVISION = "refs/convert/parquet"
 DUCKDB_INDEX_URL_TEMPLATE = "/datasets/%s/resolve/%s/%s"
 DUCKDB_INDEX_EXTENSIONS_DIRECTORY: Optional[str] = None
+DUCKDB_INDEX_MAX_CONCURRENT_DOWNLOADS = 8
 
 
 @dataclass(frozen=True)
@@ -286,6 +287,7 @@ class DuckDbIndexConfig:
     url_template: str = DUCKDB_INDEX_URL_TEMPLATE
     max_dataset_size_bytes: int = DUCKDB_INDEX_MAX_DATASET_SIZE_BYTES
     extensions_directory: Optional[str] = DUCKDB_INDEX_EXTENSIONS_DIRECTORY
+    max_concurrent_downloads: int = DUCKDB_INDEX_MAX_CONCURRENT_DOWNLOADS
 
     @classmethod
     def from_env(cls) -> "DuckDbIndexConfig":
@@ -301,6 +303,9 @@ class DuckDbIndexConfig:
                     name="MAX_DATASET_SIZE_BYTES", default=DUCKDB_INDEX_MAX_DATASET_SIZE_BYTES
                 ),
                 extensions_directory=env.str(name="EXTENSIONS_DIRECTORY", default=DUCKDB_INDEX_EXTENSIONS_DIRECTORY),
+                max_concurrent_downloads=env.int(
+                    name="MAX_CONCURRENT_DOWNLOADS", default=DUCKDB_INDEX_MAX_CONCURRENT_DOWNLOADS
+                ),
             )
 
 
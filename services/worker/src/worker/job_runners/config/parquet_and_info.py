@@ -646,6 +646,17 @@ def fill_builder_info(
             builder.info.dataset_size += approx_num_bytes
 
 
+class ParquetWriterWithPageIndex(pq.ParquetWriter):  # type: ignore
+    """Write the page index (column index and offset index) in the parquet files.
+
+    It lets the readers locate the data pages of a given range of rows without reading the whole row groups.
+    """
+
+    def __init__(self, where: Any, schema: pa.Schema, **kwargs: Any) -> None:
+        kwargs.setdefault("write_page_index", True)
+        super().__init__(where, schema, **kwargs)
+
+
 class limit_parquet_writes:
     """
     Context manager that limits the number of bytes a `DatasetBuilder` can write to parquet.
@@ -693,7 +704,7 @@ class limit_parquet_writes:
     def __enter__(self) -> "limit_parquet_writes":
         limiter = self
 
-        class _TrackedParquetWriter(pq.ParquetWriter):  # type: ignore
+        class _TrackedParquetWriter(ParquetWriterWithPageIndex):
             """Count on-the-fly how many bytes are written"""
 
             def track_write_table(self, pa_table: pa.Table) -> None:
@@ -795,9 +806,10 @@ def stream_convert_to_parquet(
     for split in splits_generators:
         split_dict.add(splits_generators[split].split_info)
         if max_dataset_size_bytes is None:
-            builder._prepare_split(
-                split_generator=splits_generators[split], file_format="parquet", **prepare_split_kwargs
-            )
+            with patch.object(ParquetWriter, "_WRITER_CLASS", ParquetWriterWithPageIndex):
+                builder._prepare_split(
+                    split_generator=splits_generators[split], file_format="parquet", **prepare_split_kwargs
+                )
         else:
             with limit_parquet_writes(builder, max_dataset_size_bytes=max_dataset_size_bytes) as limiter:
                 builder._prepare_split(
@@ -826,9 +838,10 @@ def convert_to_parquet(builder: DatasetBuilder) -> list[CommitOperationAdd]:
         builder._writer_batch_size is None or builder._writer_batch_size > writer_batch_size
     ):
         builder._writer_batch_size = writer_batch_size
-    builder.download_and_prepare(
-        file_format="parquet"
-    )  # the parquet files are stored in the cache dir and it fills the info
+    with patch.object(ParquetWriter, "_WRITER_CLASS", ParquetWriterWithPageIndex):
+        builder.download_and_prepare(
+            file_format="parquet"
+        )  # the parquet files are stored in the cache dir and it fills the info
     local_parquet_files = list_generated_parquet_files(builder)
 
     # send the files to the target revision
@@ -4,6 +4,9 @@
 import copy
 import logging
 import os
+from collections.abc import Generator
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
 from pathlib import Path
 from typing import Optional
 
@@ -59,6 +62,7 @@ CREATE_TABLE_COMMAND = "CREATE OR REPLACE TABLE data AS SELECT {columns} FROM '{
 CREATE_SEQUENCE_COMMAND = "CREATE OR REPLACE SEQUENCE serial START 0 MINVALUE 0;"
 ALTER_TABLE_BY_ADDING_SEQUENCE_COLUMN = "ALTER TABLE data ADD COLUMN __hf_index_id BIGINT DEFAULT nextval('serial');"
 CREATE_TABLE_COMMANDS = CREATE_TABLE_COMMAND + CREATE_SEQUENCE_COMMAND + ALTER_TABLE_BY_ADDING_SEQUENCE_COLUMN
+INSERT_INTO_TABLE_COMMAND = "INSERT INTO data SELECT {columns} FROM '{source}';"
 INSTALL_EXTENSION_COMMAND = "INSTALL '{extension}';"
 LOAD_EXTENSION_COMMAND = "LOAD '{extension}';"
 SET_EXTENSIONS_DIRECTORY_COMMAND = "SET extension_directory='{directory}';"
@@ -81,6 +85,43 @@ def get_indexable_columns(features: Features) -> list[str]:
     return indexable_columns
 
 
+def download_parquet_files(
+    dataset: str,
+    config: str,
+    split_directory: str,
+    parquet_file_names: list[str],
+    target_revision: str,
+    hf_token: Optional[str],
+    duckdb_index_file_directory: Path,
+    max_concurrent_downloads: int,
+) -> Generator[str, None, None]:
+    """Download the parquet files of the split, `max_concurrent_downloads` at a time, and yield their local paths in
+    the order of the files, as soon as they are downloaded."""
+    executor = ThreadPoolExecutor(max_workers=max_concurrent_downloads)
+    try:
+        futures = [
+            executor.submit(
+                hf_hub_download,
+                repo_type=REPO_TYPE,
+                revision=target_revision,
+                repo_id=dataset,
+                filename=f"{config}/{split_directory}/{parquet_file}",
+                local_dir=duckdb_index_file_directory,
+                local_dir_use_symlinks=False,
+                token=hf_token,
+                cache_dir=duckdb_index_file_directory,
+                force_download=True,
+                resume_download=False,
+            )
+            for parquet_file in parquet_file_names
+        ]
+        for future in futures:
+            yield future.result()
+    finally:
+        # if a download fails, the next ones are not started
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
 def compute_index_rows(
     job_id: str,
     dataset: str,
@@ -96,6 +137,7 @@ def compute_index_rows(
     extensions_directory: Optional[str],
     committer_hf_token: Optional[str],
     parquet_metadata_directory: StrPath,
+    max_concurrent_downloads: int,
 ) -> SplitDuckdbIndex:
     logging.info(f"get split-duckdb-index for dataset={dataset} config={config} split={split}")
 
@@ -161,22 +203,6 @@ def compute_index_rows(
 
     # see https://pypi.org/project/hf-transfer/ for more details about how to enable hf_transfer
     os.environ["HF_HUB_ENABLE_HF_TRANSFER"] = "1"
-    for parquet_file in parquet_file_names:
-        hf_hub_download(
-            repo_type=REPO_TYPE,
-            revision=target_revision,
-            repo_id=dataset,
-            filename=f"{config}/{split_directory}/{parquet_file}",
-            local_dir=duckdb_index_file_directory,
-            local_dir_use_symlinks=False,
-            token=hf_token,
-            cache_dir=duckdb_index_file_directory,
-            force_download=True,
-            resume_download=False,
-        )
-
-    all_split_parquets = f"{duckdb_index_file_directory}/{config}/{split_directory}/*.parquet"
-    create_command_sql = CREATE_TABLE_COMMANDS.format(columns=column_names, source=all_split_parquets)
 
     # index all columns
     db_path = duckdb_index_file_directory.resolve() / index_filename
@@ -190,8 +216,27 @@ def compute_index_rows(
         con.execute(INSTALL_EXTENSION_COMMAND.format(extension="fts"))
         con.execute(LOAD_EXTENSION_COMMAND.format(extension="fts"))
 
-        logging.info(create_command_sql)
-        con.sql(create_command_sql)
+        # the files are downloaded concurrently, and each file is inserted as soon as it is downloaded, in the order
+        # of the files, so that the row indexes (__hf_index_id) follow the order of the rows in the split
+        with closing(
+            download_parquet_files(
+                dataset=dataset,
+                config=config,
+                split_directory=split_directory,
+                parquet_file_names=parquet_file_names,
+                target_revision=target_revision,
+                hf_token=hf_token,
+                duckdb_index_file_directory=duckdb_index_file_directory,
+                max_concurrent_downloads=max_concurrent_downloads,
+            )
+        ) as parquet_file_paths:
+            for file_idx, parquet_file_path in enumerate(parquet_file_paths):
+                insert_command_sql = (CREATE_TABLE_COMMAND if file_idx == 0 else INSERT_INTO_TABLE_COMMAND).format(
+                    columns=column_names, source=parquet_file_path
+                )
+                logging.info(insert_command_sql)
+                con.sql(insert_command_sql)
+        con.sql(CREATE_SEQUENCE_COMMAND + ALTER_TABLE_BY_ADDING_SEQUENCE_COLUMN)
 
         is_indexable = len(indexable_columns) > 0
         if is_indexable:
@@ -353,5 +398,6 @@ class SplitDuckDbIndexJobRunner(SplitJobRunnerWithCache):
                 target_revision=self.duckdb_index_config.target_revision,
                 max_dataset_size_bytes=self.duckdb_index_config.max_dataset_size_bytes,
                 parquet_metadata_directory=self.parquet_metadata_directory,
+                max_concurrent_downloads=self.duckdb_index_config.max_concurrent_downloads,
             )
         )
@@ -22,7 +22,11 @@ from libcommon.public_assets_storage import PublicAssetsStorage
 from libcommon.storage import StrPath
 from libcommon.storage_client import StorageClient
 from libcommon.utils import JobInfo, Row, RowItem
-from libcommon.viewer_utils.features import get_cell_value, to_features_list
+from libcommon.viewer_utils.features import (
+    CellContext,
+    get_features_transform_plan,
+    to_features_list,
+)
 
 from worker.config import AppConfig, FirstRowsConfig
 from worker.dtos import CompleteJobResult, JobRunnerInfo, SplitFirstRowsResponse
@@ -39,23 +43,18 @@ def transform_rows(
     features: Features,
     public_assets_storage: PublicAssetsStorage,
 ) -> list[Row]:
-    return [
-        {
-            featureName: get_cell_value(
-                dataset=dataset,
-                revision=revision,
-                config=config,
-                split=split,
-                row_idx=row_idx,
-                cell=row["row"][featureName] if featureName in row["row"] else None,
-                featureName=featureName,
-                fieldType=fieldType,
-                public_assets_storage=public_assets_storage,
-            )
-            for (featureName, fieldType) in features.items()
-        }
+    # compiled once for the features, instead of walking the features for every cell
+    plan = get_features_transform_plan(features)
+    context = CellContext(
+        dataset=dataset, revision=revision, config=config, split=split, public_assets_storage=public_assets_storage
+    )
+    transformed_rows: list[Row] = [
+        plan.transform_row(features=features, row=row["row"], row_idx=row_idx, context=context)
         for row_idx, row in enumerate(rows)
     ]
+    # the assets are uploaded concurrently while the next cells are transformed: wait for the last ones
+    public_assets_storage.wait_for_uploads()
+    return transformed_rows
 
 
 def compute_first_rows_response(
@@ -210,12 +209,15 @@ class SplitFirstRowsFromParquetJobRunner(SplitJobRunner):
             unsupported_features=[],
             all_columns_supported_datasets_allow_list="all",
             max_arrow_data_in_memory=app_config.rows_index.max_arrow_data_in_memory,
+            row_groups_cache_max_bytes=app_config.rows_index.row_groups_cache_max_bytes,
         )
 
         self.public_assets_storage = PublicAssetsStorage(
             assets_base_url=self.assets_base_url,
             overwrite=True,
             storage_client=storage_client,
+            concurrent_uploads=True,
+            thumbnail_max_size=app_config.assets.thumbnail_max_size,
         )
 
     def compute(self) -> CompleteJobResult:
@@ -28,7 +28,11 @@ from libcommon.processing_graph import ProcessingStep
 from libcommon.public_assets_storage import PublicAssetsStorage
 from libcommon.storage_client import StorageClient
 from libcommon.utils import JobInfo, Row
-from libcommon.viewer_utils.features import get_cell_value, to_features_list
+from libcommon.viewer_utils.features import (
+    CellContext,
+    get_features_transform_plan,
+    to_features_list,
+)
 
 from worker.config import AppConfig, FirstRowsConfig
 from worker.dtos import CompleteJobResult, JobRunnerInfo, SplitFirstRowsResponse
@@ -50,23 +54,18 @@ def transform_rows(
     features: Features,
     public_assets_storage: PublicAssetsStorage,
 ) -> list[Row]:
-    return [
-        {
-            featureName: get_cell_value(
-                dataset=dataset,
-                revision=revision,
-                config=config,
-                split=split,
-                row_idx=row_idx,
-                cell=row[featureName] if featureName in row else None,
-                featureName=featureName,
-                fieldType=fieldType,
-                public_assets_storage=public_assets_storage,
-            )
-            for (featureName, fieldType) in features.items()
-        }
+    # compiled once for the features, instead of walking the features for every cell
+    plan = get_features_transform_plan(features)
+    context = CellContext(
+        dataset=dataset, revision=revision, config=config, split=split, public_assets_storage=public_assets_storage
+    )
+    transformed_rows: list[Row] = [
+        plan.transform_row(features=features, row=row, row_idx=row_idx, context=context)
         for row_idx, row in enumerate(rows)
     ]
+    # the assets are uploaded concurrently while the next cells are transformed: wait for the last ones
+    public_assets_storage.wait_for_uploads()
+    return transformed_rows
 
 
 def compute_first_rows_response(
@@ -300,6 +299,8 @@ class SplitFirstRowsFromStreamingJobRunner(SplitJobRunnerWithDatasetsCache):
             assets_base_url=self.assets_base_url,
             overwrite=True,
             storage_client=storage_client,
+            concurrent_uploads=True,
+            thumbnail_max_size=app_config.assets.thumbnail_max_size,
         )
 
     def compute(self) -> CompleteJobResult:
@@ -826,6 +826,21 @@ def test_stream_convert_to_parquet_generatorbasedbuilder(
         )
 
 
+@pytest.mark.parametrize("max_dataset_size_bytes", [None, 9999999])
+def test_stream_convert_to_parquet_writes_page_index(max_dataset_size_bytes: Optional[int], tmp_path: Path) -> None:
+    def generator() -> Iterator[dict[str, int]]:
+        for i in range(100):
+            yield {"foo": i}
+
+    cache_dir = str(tmp_path / "test_stream_convert_to_parquet_writes_page_index_cache_dir")
+    builder = ParametrizedGeneratorBasedBuilder(generator=generator, cache_dir=cache_dir)
+    stream_convert_to_parquet(builder, max_dataset_size_bytes=max_dataset_size_bytes)
+    for parquet_file in list_generated_parquet_files(builder):
+        column_chunk_metadata = pq.ParquetFile(parquet_file.local_file).metadata.row_group(0).column(0)
+        assert column_chunk_metadata.has_offset_index
+        assert column_chunk_metadata.has_column_index
+
+
 def test_limit_parquet_writes(tmp_path: Path) -> None:
     num_examples = 0
 
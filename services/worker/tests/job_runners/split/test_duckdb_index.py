@@ -2,12 +2,14 @@
 # Copyright 2023 The HuggingFace Authors.
 
 import os
+import time
 from collections.abc import Callable
 from contextlib import ExitStack
 from dataclasses import replace
 from http import HTTPStatus
 from pathlib import Path
-from typing import Optional
+from threading import Lock
+from typing import Any, Optional
 from unittest.mock import patch
 
 import datasets.config
@@ -31,9 +33,14 @@ from worker.job_runners.config.parquet import ConfigParquetJobRunner
 from worker.job_runners.config.parquet_and_info import ConfigParquetAndInfoJobRunner
 from worker.job_runners.config.parquet_metadata import ConfigParquetMetadataJobRunner
 from worker.job_runners.split.duckdb_index import (
+    ALTER_TABLE_BY_ADDING_SEQUENCE_COLUMN,
     CREATE_INDEX_COMMAND,
+    CREATE_SEQUENCE_COMMAND,
+    CREATE_TABLE_COMMAND,
     CREATE_TABLE_COMMANDS,
+    INSERT_INTO_TABLE_COMMAND,
     SplitDuckDbIndexJobRunner,
+    download_parquet_files,
     get_indexable_columns,
 )
 from worker.resources import LibrariesResource
@@ -537,3 +544,52 @@ def test_table_column_hf_index_id_is_monotonic_increasing(tmp_path: Path) -> Non
         df = con.sql("SELECT * FROM data").to_df()
     assert df["__hf_index_id"].is_monotonic_increasing
     assert df["__hf_index_id"].is_unique
+
+
+def test_download_parquet_files_concurrently(tmp_path: Path) -> None:
+    num_files, max_concurrent_downloads = 6, 3
+    parquet_file_names = [f"{i:04d}.parquet" for i in range(num_files)]
+    running: list[str] = []
+    max_running = 0
+    lock = Lock()
+
+    def fake_hf_hub_download(filename: str, local_dir: Path, **kwargs: Any) -> str:
+        nonlocal max_running
+        with lock:
+            running.append(filename)
+            max_running = max(max_running, len(running))
+        # the first files are the slowest to download
+        file_idx = parquet_file_names.index(Path(filename).name)
+        time.sleep(0.02 * (num_files - file_idx))
+        path = Path(local_dir) / filename
+        path.parent.mkdir(parents=True, exist_ok=True)
+        pq.write_table(pa.Table.from_pydict({"text": [f"text-{file_idx}-{i}" for i in range(10)]}), path)
+        with lock:
+            running.remove(filename)
+        return str(path)
+
+    with patch("worker.job_runners.split.duckdb_index.hf_hub_download", side_effect=fake_hf_hub_download):
+        paths = list(
+            download_parquet_files(
+                dataset="dataset",
+                config="config",
+                split_directory="train",
+                parquet_file_names=parquet_file_names,
+                target_revision="refs/convert/parquet",
+                hf_token=None,
+                duckdb_index_file_directory=tmp_path,
+                max_concurrent_downloads=max_concurrent_downloads,
+            )
+        )
+    assert max_running == max_concurrent_downloads
+    # the files are returned in order, even if the next ones are downloaded first
+    assert paths == [str(tmp_path / "config" / "train" / file_name) for file_name in parquet_file_names]
+
+    # the row indexes follow the order of the files
+    with duckdb.connect(str(tmp_path / "index.duckdb")) as con:
+        for file_idx, path in enumerate(paths):
+            command = CREATE_TABLE_COMMAND if file_idx == 0 else INSERT_INTO_TABLE_COMMAND
+            con.sql(command.format(columns='"text"', source=path))
+        con.sql(CREATE_SEQUENCE_COMMAND + ALTER_TABLE_BY_ADDING_SEQUENCE_COLUMN)
+        df = con.sql("SELECT * FROM data ORDER BY __hf_index_id").to_df()
+    assert list(df["text"]) == [f"text-{file_idx}-{i}" for file_idx in range(num_files) for i in range(10)]